@@ -7,8 +7,27 @@ set -e
 # Author:       Leela Srinivasan
 # Date:         03/10/2025
 
-# Syntax:       find_PVS.sh p***
+# Syntax:       find_PVS.sh [-m seg|vessel|ratio] [-c 3dseg|gmm] [-u 3dunifize|poly] [-t] [-j N] p***
 # Arguments:    Patient identifier
+#               -m|--mode   detection mode: 3dSeg GM within eroded WM (seg, default),
+#                           multi-scale Hessian vesselness within eroded WM (vessel) or
+#                           z-scored T2/T1 ratio within eroded WM (ratio; cutoff PVS_RATIO_Z, default 2;
+#                           PVS_RATIO_INTERSECT=1 keeps only voxels also in the seg mode GM candidates)
+#               -c|--classifier  tissue classification for seg mode: 3dSeg on the whole t1 (3dseg, default)
+#                           or an in-process Gaussian mixture labelled within the eroded masks only (gmm)
+#               -u|--unifize  intensity non-uniformity correction: 3dUnifize -GM (3dunifize, default) or an
+#                           in-process polynomial bias-field fit to the aseg WM (poly, pvs unifize); compare it
+#                           with 3dUnifize on a few processed subjects (pvs unifize check) before using it
+#               -t|--tiled  run mask, overlap and cluster stages in memory-capped z-slabs (pvs tiled);
+#                           cap per stage with PVS_MAX_MEM_MB (default 2048)
+#               -j|--jobs   run the subject through the concurrent stage runner (pvs subject) with up to N
+#                           stages at once; hemisphere chains and t2 alignment then overlap (default 1, this script)
+#               Cluster connectivity and minimum size come from PVS_NN (default 1) and PVS_CLUST_NVOX
+#               (default 2); pick them with pvs sweep
+#               Each run is recorded in the run history (PVS_HISTORY_DB, default ~/.pvs/run_history.sqlite),
+#               with per-stage wall time and peak memory from <subj>/logs/stages.tsv; see pvs history report
+#               Erosion depth comes from PVS_ERODE_MM (default 2); depth stats are written for
+#               PVS_REPORT_DEPTHS (default 1,2,3,4)
 
 # Description:  PVS T1w segmentation-based detection output to volumetric mask and CSV
 # Dependencies: FreeSurfer (recon-all run), AFNI, Python
@@ -17,16 +36,34 @@ set -e
 #====================================================================================================================
 
 function display_usage {
-	echo -e "\033[0;35m++ usage: $0 [-h|--help]  [-l|--list SUBJ_LIST] [SUBJ [SUBJ ...]] ++\033[0m"
+	echo -e "\033[0;35m++ usage: $0 [-h|--help]  [-l|--list SUBJ_LIST] [-m|--mode seg|vessel|ratio] [-c|--classifier 3dseg|gmm] [-u|--unifize 3dunifize|poly] [-t|--tiled] [-j|--jobs N] [SUBJ [SUBJ ...]] ++\033[0m"
 	exit 1
 }
 
 
+#Run one stage, appending its wall time and peak memory to the subject's stage log (pvs history stage)
+function run_stage {
+    local name=$1
+    shift
+    python $scripts_dir/pvs history stage ${stage_log} ${name} -- "$@"
+}
+
+
 subj_list=false
+mode=seg
+classifier=3dseg
+unifize=3dunifize
+tiled=0
+jobs=1
 while [ -n "$1" ]; do
     case "$1" in
     	-h|--help) 		display_usage ;;	
         -l|--list)      subj_list=$2; shift ;; 
+        -m|--mode)      mode=$2; shift ;;
+        -c|--classifier) classifier=$2; shift ;;
+        -u|--unifize)   unifize=$2; shift ;;
+        -t|--tiled)     tiled=1 ;;
+        -j|--jobs)      jobs=$2; shift ;;
 	    *) 				subj=$1; break ;;	
     esac
     shift 	
@@ -46,6 +83,27 @@ else
 fi
 
 
+#Verify detection mode
+if [[ ${mode} != "seg" && ${mode} != "vessel" && ${mode} != "ratio" ]]; then
+    echo -e "\033[0;35m++ Unrecognized detection mode ${mode}; choose seg, vessel or ratio. ++\033[0m"
+    display_usage
+fi
+
+
+#Verify classifier
+if [[ ${classifier} != "3dseg" && ${classifier} != "gmm" ]]; then
+    echo -e "\033[0;35m++ Unrecognized classifier ${classifier}; choose 3dseg or gmm. ++\033[0m"
+    display_usage
+fi
+
+
+#Verify unifize method
+if [[ ${unifize} != "3dunifize" && ${unifize} != "poly" ]]; then
+    echo -e "\033[0;35m++ Unrecognized unifize method ${unifize}; choose 3dunifize or poly. ++\033[0m"
+    display_usage
+fi
+
+
 #Prompt arg request
 if [[ ! ${#subj_arr} -gt 0 ]]; then
 	echo -e "\033[0;35m++ Subject list length is zero; please specify at least one subject to perform batch processing on ++\033[0m"
@@ -57,42 +115,62 @@ fi
 unameOut="$(uname -s)"
 case "${unameOut}" in
     Linux*)     neu_dir="/shares/NEU";;
-    Darwin*)    neu_dir="/Volumes/shares/NEU";;
+    Darwin*)    neu_dir="/Volumes/Shares/NEU";;
     *)          echo -e "\033[0;35m++ Unrecognized OS. Must be either Linux or Mac OS in order to run script.\
 						 Exiting... ++\033[0m"; exit 1
 esac
 
 
 scripts_dir=${neu_dir}/Scripts_and_Parameters/scripts/PVS_scripts
+nn=${PVS_NN:-1}
+clust_nvox=${PVS_CLUST_NVOX:-2}
+erode_mm=${PVS_ERODE_MM:-2}
+report_depths=${PVS_REPORT_DEPTHS:-1,2,3,4}
+ratio_z=${PVS_RATIO_Z:-2}
+ratio_intersect=${PVS_RATIO_INTERSECT:-0}
 pvs_dir=${neu_dir}/Projects/PVS
 deriv_dir="${neu_dir}/Data/derivatives/freesurfer-6.0.0"
 bids_root=${neu_dir}/Data
+export PVS_NEU_DIR=${neu_dir}
+
+
+#Hand off to the concurrent stage runner; it expresses the steps below as a dependency graph
+if [ "$jobs" -gt "1" ]; then
+    runner_args=(-m ${mode} -c ${classifier} -u ${unifize} -j ${jobs})
+    if [ "$tiled" -eq "1" ]; then
+        runner_args+=(-t)
+    fi
+    python $scripts_dir/pvs subject "${runner_args[@]}" "${subj_arr[@]}"
+    exit 0
+fi
 
 
 for subj in "${subj_arr[@]}"; do
 
     
     echo -e "\033[0;35m++ Working on $subj ++\033[0m"
+    subj_start=$SECONDS
     
     
-    #Establish FreeSurfer recon-all directory
-    subj_fs_dir=${deriv_dir}/sub-${subj}_ses-clinical
-    ses='clinical'
-    if [ ! -d $subj_fs_dir ]; then
-        subj_fs_dir=${deriv_dir}/sub-${subj}_ses-altclinical
-        ses='altclinical'
-        if [ ! -d $subj_fs_dir ]; then
-            echo -e "\033[0;35m++ Freesurfer directory not found. Run freesurfer_proc.sh. ++\033[0m"
-            exit 1
-        fi
+    #Session and input paths from the cohort manifest (m_<key> variables; see pvs manifest)
+    eval "$(python $scripts_dir/pvs manifest show ${subj} --shell)"
+    ses=${m_ses}
+    subj_fs_dir=${m_fs_dir}
+    if [ -z "$ses" ]; then
+        echo -e "\033[0;35m++ Freesurfer directory not found. Run freesurfer_proc.sh. ++\033[0m"
+        exit 1
     fi
     
     
-    #Initialize working pvs directory
+    #Initialize working pvs directory; note its size so the history records only what this run writes
     subj_pvs_dir=${pvs_dir}/${subj}
+    bytes_before=$(python $scripts_dir/pvs history size ${subj_pvs_dir})
     if [ ! -d $subj_pvs_dir ]; then
         mkdir -p $subj_pvs_dir
     fi
+    stage_log=${subj_pvs_dir}/logs/stages.tsv
+    mkdir -p ${subj_pvs_dir}/logs
+    rm -f ${stage_log}
     
     
     #Initialize t1 directory
@@ -102,28 +180,26 @@ for subj in "${subj_arr[@]}"; do
     fi
     
     
-    #Check if process complete
-    if [ -d ${subj_pvs_t1_dir}/csv ]; then
-        echo -e "\033[0;35m++ PVS processing complete. Delete to rerun. Exiting... ++\033[0m"
+    #Check if process complete (the marker is only written once every stage has succeeded)
+    if [ -f ${m_complete} ]; then
+        echo -e "\033[0;35m++ PVS processing complete. Delete ${m_complete} to rerun. Exiting... ++\033[0m"
         exit 1
     fi
     
     
-    #Check if research t1 exists
+    #Check if research t1 exists; inputs are linked rather than copied where the filesystem allows (pvs stage)
+    inputs=${subj_pvs_dir}/inputs.json
     use_research=0
-    research_dir=${bids_root}/sub-${subj}/ses-research/anat
-    if [ -d ${research_dir} ]; then
-        for filename in ${research_dir}/*T1w.nii*; do
-            cp ${filename} ${subj_pvs_t1_dir}/$(basename "$filename")
-            use_research=1
-            research_t1=${subj_pvs_t1_dir}/$(basename "$filename")
-        done
+    if [ -n "${m_research_t1_src}" ]; then
+        research_t1=${subj_pvs_t1_dir}/$(basename "${m_research_t1_src}")
+        python $scripts_dir/pvs stage ${m_research_t1_src} ${research_t1} --manifest ${inputs} --role research_t1
+        use_research=1
     fi
     
     
-    #Copy in SurfVol from FreeSurfer recon-all directory
-    if [ -f $subj_fs_dir/SUMA/sub-${subj}_ses-${ses}_SurfVol.nii ]; then
-        cp $subj_fs_dir/SUMA/sub-${subj}_ses-${ses}_SurfVol.nii ${subj_pvs_t1_dir}/sub-${subj}_ses-${ses}_SurfVol.nii
+    #Stage SurfVol from FreeSurfer recon-all directory
+    if [ -f ${m_surfvol_src} ]; then
+        python $scripts_dir/pvs stage ${m_surfvol_src} ${m_surfvol} --manifest ${inputs} --role surfvol
     else
         echo -e "\033[0;35m++ SurfVol not found in FreeSurfer directory. Exiting... ++\033[0m"
         rm -rf $subj_pvs_dir
@@ -134,7 +210,7 @@ for subj in "${subj_arr[@]}"; do
     #Designate t1; align to FS space if needed
     if [ "$use_research" -eq "1" ]; then
         echo -e "\033[0;35m++ Continuing with research t1. ++\033[0m"
-        3dAllineate                                                                         \
+        run_stage align_t1 3dAllineate                                                                         \
              -base              ${subj_pvs_t1_dir}/sub-${subj}_ses-${ses}_SurfVol.nii       \
              -source            ${research_t1}                                                       \
              -prefix            ${subj_pvs_t1_dir}/aligned_t1.nii      
@@ -145,18 +221,31 @@ for subj in "${subj_arr[@]}"; do
     
     
     #Unifize the t1 to increase contrast and separation between GM/WM classification
-    if [ ! -f ${subj_pvs_t1_dir}/unifized_t1.nii ]; then
-        3dUnifize                                                               \
+    if [ ! -f ${subj_pvs_t1_dir}/unifized_t1.nii ] && [ "$unifize" == "poly" ]; then
+        run_stage unifize python $scripts_dir/pvs unifize correct               \
+            ${t1}                                                               \
+            ${subj_pvs_t1_dir}/unifized_t1.nii                                  \
+            --aseg ${m_aseg}
+    elif [ ! -f ${subj_pvs_t1_dir}/unifized_t1.nii ]; then
+        run_stage unifize 3dUnifize                                             \
             -input       ${t1}                                             \
             -GM                                                                 \
             -prefix     ${subj_pvs_t1_dir}/unifized_t1.nii
     fi
     
     
-    #Perform intensity based segmentation on the t1 image
-    if [ ! -d ${subj_pvs_t1_dir}/classification ]; then
+    #Perform intensity based segmentation on the t1 image (not needed for vesselness or plain ratio detection)
+    classes=${subj_pvs_t1_dir}/classification/Classes+orig.HEAD
+    if [ "$classifier" == "gmm" ]; then
+        classes=${subj_pvs_t1_dir}/classification/Classes.nii
+    fi
+    use_classes=0
+    if [ "$mode" == "seg" ] || ([ "$mode" == "ratio" ] && [ "$ratio_intersect" -eq "1" ]); then
+        use_classes=1
+    fi
+    if [ "$use_classes" -eq "1" ] && [ "$classifier" == "3dseg" ] && [ ! -d ${subj_pvs_t1_dir}/classification ]; then
         echo -e "\033[0;35m++ Performing Image Segmentation (CSF/GM/WM) on t1. Check classification in ${subj_pvs_t1_dir}/classification ++\033[0m"
-        3dSeg                                                                   \
+        run_stage segment 3dSeg                                                 \
             -anat       ${subj_pvs_t1_dir}/unifized_t1.nii                 \
             -mask       AUTO                                                    \
             -classes    'CSF ; GM ; WM'                                         \
@@ -170,8 +259,13 @@ for subj in "${subj_arr[@]}"; do
         mkdir -p $masks_dir
     fi
     if [ -z "$(find ${masks_dir} -mindepth 1 -maxdepth 1)" ]; then
-        python $scripts_dir/create_fs_masks.py \
-            "$subj" 
+        if [ "$tiled" -eq "1" ]; then
+            run_stage masks python $scripts_dir/pvs masks \
+                "$subj" --tiled
+        else
+            run_stage masks python $scripts_dir/pvs masks \
+                "$subj" 
+        fi
     fi
     
     
@@ -181,18 +275,21 @@ for subj in "${subj_arr[@]}"; do
         mkdir -p $eroded_masks_dir
     fi
     
+    distance_maps_dir=${subj_pvs_dir}/distance_maps
+    if [ ! -d $distance_maps_dir ]; then
+        mkdir -p $distance_maps_dir
+    fi
     
-    #Erode masks to remove edge cases
+    
+    #Cache one distance-to-boundary map per mask; any erosion depth is then a threshold of it
+    run_stage distance python $scripts_dir/pvs erosion distance ${masks_dir} ${distance_maps_dir}
+    
+    
+    #Erode masks to remove edge cases (delete eroded_masks to re-erode at a new PVS_ERODE_MM)
     if [ -z "$(find ${eroded_masks_dir} -mindepth 1 -maxdepth 1)" ]; then
-        for nifti in "$masks_dir"/*.nii ;do
-            nifti_basename=$(basename ${nifti})
-            struct=${nifti_basename%.*}
-            echo -e "\033[0;35m++ Eroding the ${struct} mask. ++\033[0m"
-            3dmask_tool                                                     \
-                -input   ${nifti}                                           \
-                -prefix  ${eroded_masks_dir}/eroded_${nifti_basename}        \
-                -dilate_input -2 
-        done
+        echo -e "\033[0;35m++ Eroding masks by ${erode_mm} mm. ++\033[0m"
+        run_stage erode python $scripts_dir/pvs erosion erode              \
+            ${masks_dir} ${distance_maps_dir} ${eroded_masks_dir} ${erode_mm}
     fi
                  
                  
@@ -213,6 +310,36 @@ for subj in "${subj_arr[@]}"; do
     fi
     
     
+    #Classify tissue in-process, labelling only the WM masks (un-eroded, so depth stats can go shallower)
+    if [ "$use_classes" -eq "1" ] && [ "$classifier" == "gmm" ] && [ ! -f ${classes} ]; then
+        echo -e "\033[0;35m++ Performing Gaussian mixture classification (CSF/GM/WM) within WM masks. ++\033[0m"
+        mkdir -p ${subj_pvs_t1_dir}/classification
+        run_stage classify python $scripts_dir/pvs tissue classify          \
+            ${subj_pvs_t1_dir}/unifized_t1.nii                              \
+            ${classes}                                                      \
+            ${masks_dir}/*.nii
+    fi
+    
+    
+    #Read t2 in place from bids data folder
+    t2=${m_t2}
+    if [ -f ${t2} ]; then
+        python $scripts_dir/pvs stage ${t2} --manifest ${inputs} --role t2
+    else
+        echo -e "\033[0;35m++ T2w image not found in BIDS anat directory. Exiting... ++\033[0m"
+        exit 1
+    fi
+    
+    
+    #Align the t2 to FS space for clinical validation (and ratio detection)
+    if [ ! -f ${subj_pvs_t1_dir}/aligned_t2.nii ]; then
+        run_stage align_t2 3dAllineate                                                                         \
+             -base              ${subj_pvs_t1_dir}/sub-${subj}_ses-${ses}_SurfVol.nii       \
+             -source            ${t2}                                                       \
+             -prefix            ${subj_pvs_t1_dir}/aligned_t2.nii                                         
+    fi
+    
+    
     #Create overlap masks, clusters and csv files from AFNI txt reports
     if [ -z "$( ls -A ${t1_overlap_masks_dir} )" ]; then
         for nifti in "$masks_dir"/*.nii ; do
@@ -220,65 +347,140 @@ for subj in "${subj_arr[@]}"; do
             struct=${nifti_basename%.*}
                 
                 
-            echo -e "\033[0;35m++ Extracting WM from eroded ${struct} mask. ++\033[0m"
-            3dcalc                                                                \
-                -a ${eroded_masks_dir}/eroded_${nifti_basename}                   \
-                -b ${subj_pvs_t1_dir}/classification/Classes+orig                 \
-                -expr 'step(a)*b'                                                 \
-                -prefix ${t1_overlap_masks_dir}/overlap_${nifti_basename}
+            if [ "$mode" == "vessel" ]; then
+                echo -e "\033[0;35m++ Computing vesselness within eroded ${struct} mask. ++\033[0m"
+                run_stage candidate_${struct} python $scripts_dir/pvs vessel       \
+                    ${subj_pvs_t1_dir}/unifized_t1.nii                            \
+                    ${eroded_masks_dir}/eroded_${nifti_basename}                  \
+                    ${t1_overlap_masks_dir}/vessel_within_${nifti_basename}
+                candidate=${t1_overlap_masks_dir}/vessel_within_${nifti_basename}
+            elif [ "$use_classes" -eq "1" ] && [ "$tiled" -eq "1" ]; then
+                echo -e "\033[0;35m++ Extracting GM within eroded ${struct} mask (tiled). ++\033[0m"
+                run_stage candidate_${struct} python $scripts_dir/pvs tiled overlap \
+                    ${eroded_masks_dir}/eroded_${nifti_basename}                  \
+                    ${classes}                                                    \
+                    ${t1_overlap_masks_dir}/gm_within_${nifti_basename}
+                candidate=${t1_overlap_masks_dir}/gm_within_${nifti_basename}
+            elif [ "$use_classes" -eq "1" ]; then
+                echo -e "\033[0;35m++ Extracting WM from eroded ${struct} mask. ++\033[0m"
+                run_stage overlap_${struct} 3dcalc                                \
+                    -a ${eroded_masks_dir}/eroded_${nifti_basename}               \
+                    -b ${classes}                                                 \
+                    -expr 'step(a)*b'                                             \
+                    -datum byte                                                   \
+                    -prefix ${t1_overlap_masks_dir}/overlap_${nifti_basename}
+                    
+                    
+                #Isolate gm within eroded mask
+                run_stage candidate_${struct} 3dcalc                              \
+                    -a ${t1_overlap_masks_dir}/overlap_${nifti_basename}          \
+                    -expr 'equals(a,2)'                                           \
+                    -datum byte                                                   \
+                    -prefix ${t1_overlap_masks_dir}/gm_within_${nifti_basename}
+                candidate=${t1_overlap_masks_dir}/gm_within_${nifti_basename}
+            fi
+            
+            
+            #Z-scored T2/T1 ratio within the eroded mask, optionally restricted to the GM candidates above
+            if [ "$mode" == "ratio" ]; then
+                echo -e "\033[0;35m++ Computing T2/T1 ratio outliers within eroded ${struct} mask. ++\033[0m"
+                ratio_args=(--z ${ratio_z})
+                if [ "$ratio_intersect" -eq "1" ]; then
+                    ratio_args+=(--within ${candidate})
+                fi
+                run_stage ratio_${struct} python $scripts_dir/pvs ratio            \
+                    ${t1}                                                         \
+                    ${subj_pvs_t1_dir}/aligned_t2.nii                             \
+                    ${eroded_masks_dir}/eroded_${nifti_basename}                  \
+                    ${t1_overlap_masks_dir}/ratio_within_${nifti_basename}        \
+                    "${ratio_args[@]}"
+                candidate=${t1_overlap_masks_dir}/ratio_within_${nifti_basename}
+            fi
+            
+            
+            #Cluster candidate voxels within eroded mask to volumetrically group PVS
+            stages=()
+            if [ "$tiled" -eq "1" ]; then
+                run_stage cluster_${struct} python $scripts_dir/pvs clusters      \
+                    ${candidate}                                                  \
+                    ${t1_clusters_dir}/pvs_within_${nifti_basename}               \
+                    ${t1_csv_dir}/pvs_within_${struct}.csv                        \
+                    --nn ${nn} --min-size ${clust_nvox} --threshold 0.5
+            else
+                run_stage cluster_${struct} 3dClusterize                          \
+                    -inset ${candidate}                                           \
+                    -NN ${nn}                                                     \
+                    -1sided RIGHT 0.5                                             \
+                    -ithr 0                                                       \
+                    -idat 0                                                       \
+                    -clust_nvox ${clust_nvox}                                     \
+                    -pref_map ${t1_clusters_dir}/pvs_within_${nifti_basename}     \
+                    > ${t1_clusters_dir}/pvs_within_${struct}.txt
                 
                 
-            #Isolate gm within eroded mask
-            3dcalc                                                                \
-                -a ${t1_overlap_masks_dir}/overlap_${nifti_basename}              \
-                -expr 'equals(a,2)'                                               \
-                -prefix ${t1_overlap_masks_dir}/gm_within_${nifti_basename}
+                #Convert AFNI text file report to CSV 
+                stages+=("parse ${t1_clusters_dir}/pvs_within_${struct}.txt ${t1_csv_dir}/pvs_within_${struct}.csv")
+                
+                
+                #3dClusterize writes short maps; rewrite at the smallest dtype that holds the cluster count
+                stages+=("archive compact ${t1_clusters_dir}/pvs_within_${nifti_basename}")
+            fi
             
             
-            #Cluster gm classification within eroded mask to volumetrically group PVS
-            3dClusterize                                                          \
-                -inset ${t1_overlap_masks_dir}/gm_within_${nifti_basename}        \
-                -NN 1                                                             \
-                -1sided RIGHT 0.5                                                 \
-                -ithr 0                                                           \
-                -idat 0                                                           \
-                -clust_nvox 2                                                     \
-                -pref_map ${t1_clusters_dir}/pvs_within_${nifti_basename}         \
-                > ${t1_clusters_dir}/pvs_within_${struct}.txt
+            #Write the sparse voxel list next to the cluster map
+            if [ -f ${t1_clusters_dir}/pvs_within_${nifti_basename} ]; then
+                stages+=("sparse convert ${t1_clusters_dir}/pvs_within_${nifti_basename}")
+                
+                
+                #Index this hemisphere's clusters in the cohort cluster database (pvs clusterdb near/query)
+                stages+=("clusterdb add ${subj} --hemi ${struct%%_*} --pvs-root ${pvs_dir}")
+            fi
             
             
-            #Convert AFNI text file report to CSV 
-            python $scripts_dir/afnitxt_to_csv.py                           \
-                ${t1_clusters_dir}/pvs_within_${struct}.txt                        \
-                ${t1_csv_dir}/pvs_within_${struct}.csv                                 
+            #Report WM volume and PVS burden at several erosion depths from the cached distance map
+            if [ "$mode" == "vessel" ] || [ "$mode" == "ratio" ]; then
+                depth_src="${candidate}"
+            else
+                depth_src="${classes} --label 2"
+            fi
+            stages+=("erosion depth-stats ${distance_maps_dir}/distance_${nifti_basename} ${depth_src} ${t1_csv_dir}/depth_stats_${struct}.csv --depths ${report_depths}")
+            
+            
+            #Run the post-cluster stages in one interpreter
+            printf '%s\n' "${stages[@]}" | run_stage post_cluster_${struct} python $scripts_dir/pvs run -
         done
     fi
     
     
-    #Copy t2 from bids data folder
-    anat_dir=${bids_root}/sub-${subj}/ses-${ses}/anat
-    if [ -f ${anat_dir}/sub-${subj}_ses-${ses}_rec-axialized_T2w.nii.gz ]; then
-        cp ${anat_dir}/sub-${subj}_ses-${ses}_rec-axialized_T2w.nii.gz ${subj_pvs_t1_dir}/sub-${subj}_ses-${ses}_rec-axialized_T2w.nii.gz
-    else
-        echo -e "\033[0;35m++ T2w image not found in BIDS anat directory. Exiting... ++\033[0m"
-        exit 1
+    #PVS count and volume for every FreeSurfer label in one pass (PVS_REGION_SEG=wmparc.mgz for lobar WM)
+    if [ ! -f ${t1_csv_dir}/regional_pvs.csv ]; then
+        run_stage regions python $scripts_dir/pvs regions                           \
+            ${t1_clusters_dir}                                                      \
+            ${subj_fs_dir}/mri/${PVS_REGION_SEG:-aseg.mgz}                          \
+            ${t1_csv_dir}/regional_pvs.csv
     fi
-    t2=${subj_pvs_t1_dir}/sub-${subj}_ses-${ses}_rec-axialized_T2w.nii.gz
     
     
-    #Align the t2 to FS space for clinical validation
-    if [ ! -f ${subj_pvs_t1_dir}/aligned_t2.nii ]; then
-        3dAllineate                                                                         \
-             -base              ${subj_pvs_t1_dir}/sub-${subj}_ses-${ses}_SurfVol.nii       \
-             -source            ${t2}                                                       \
-             -prefix            ${subj_pvs_t1_dir}/aligned_t2.nii                                         
+    #Move exams for manual verification
+    find ${subj_pvs_t1_dir} -maxdepth 1 -type f -name '*.nii*' -exec mv {} ${subj_pvs_t1_dir}/clusters \;
+    
+    
+    #Render the cluster overlay montage and refresh the cohort QC index
+    run_stage qc python $scripts_dir/pvs qc ${subj} --pvs-root ${pvs_dir} --workers 1
+    echo -e "\033[0;35m++ Review ${pvs_dir}/summary/qc/${subj}.png (index.html for the cohort), launch output maps from ${t1_clusters_dir} and load csv data from ${t1_csv_dir}. ++\033[0m"
+    
+    
+    #Record wall time, grid size, stage timings and outputs for capacity planning (pvs history report)
+    history_args=(--seconds $((SECONDS-subj_start)) --mode ${mode} --classifier ${classifier}
+                  --bytes-before ${bytes_before} --stages ${stage_log})
+    if [ "$tiled" -eq "1" ]; then
+        history_args+=(--tiled)
     fi
+    python $scripts_dir/pvs history record ${subj} "${history_args[@]}"
     
     
-    #Move exams for manual verification
-    rm ${t2}
-    find ${subj_pvs_t1_dir} -maxdepth 1 -type f -name '*.nii*' -exec mv {} ${subj_pvs_t1_dir}/clusters \;
-    echo -e "\033[0;35m++ Launch output maps from ${t1_clusters_dir} and load csv data from ${t1_csv_dir}. ++\033[0m"
+    #Mark the subject processed; set -e means a failed stage never gets here
+    date "+%Y-%m-%d %H:%M:%S" > ${m_complete}
     
     
 done
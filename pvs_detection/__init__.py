@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Wed Oct 21 13:52:30 2026
+@author: Leela Srinivasan
+
+PVS detection pipeline as an importable package.
+Stage modules are imported on first attribute access (pvs_detection.tiling, pvs_detection.sparse_maps, ...), so
+importing the package itself costs nothing and each `pvs` subcommand only pays for the dependencies of its own
+stage. See cli.py for the command line entry point.
+"""
+
+import importlib
+
+
+MODULES=["afnitxt_to_csv",
+         "archive",
+         "bias_correct",
+         "cli",
+         "cluster_db",
+         "cluster_sweep",
+         "cohort_stats",
+         "compare_mr_intensity",
+         "compile_stats",
+         "create_fs_masks",
+         "erosion",
+         "key_conversion",
+         "longitudinal",
+         "manifest",
+         "pipeline",
+         "profiling",
+         "qc_montage",
+         "ratio_detect",
+         "regional_stats",
+         "run_history",
+         "sparse_maps",
+         "stage_runner",
+         "staging",
+         "stats_service",
+         "template_density",
+         "tiling",
+         "tissue_classify",
+         "validate_pvs",
+         "vesselness",
+         "watch"]
+
+
+def __getattr__(name):
+    if name in MODULES:
+        return importlib.import_module("{}.{}".format(__name__, name))
+    raise AttributeError("module {} has no attribute {}".format(__name__, name))
+
+
+def __dir__():
+    return sorted(list(globals())+MODULES)
@@ -13,10 +13,11 @@ import re
 import pandas as pd
 
 
-def main():
+def main(argv=None):
     
-    f=sys.argv[1]
-    outname=sys.argv[2]
+    argv=sys.argv[1:] if argv is None else argv
+    f=argv[0]
+    outname=argv[1]
     
     if verify_clusters(f):
         df,total_voxels=afnisummary_to_df(f)
@@ -0,0 +1,410 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Wed Nov 11 10:36:04 2026
+@author: Leela Srinivasan
+
+Compact storage for mask, label and cluster outputs.
+compact rewrites a subject's integer-valued maps (WM and eroded masks, overlap/candidate maps, cluster maps,
+Classes) in the smallest dtype that holds them, e.g. float or short masks from AFNI/FreeSurfer become uint8.
+pack moves them into <name>.pack.npz archives for long-term storage: binary maps bit-packed (1 bit per voxel),
+label maps at their compact dtype, both per chunk of z-slices and deflate-compressed. load_image (tiling.py)
+opens an archive whose NIfTI is gone as an ArchivedMap, which the slab readers use like a NiBabel proxy; only the
+chunks a slab touches are decompressed. unpack restores the NIfTIs (AFNI and viewers need them).
+Session runs under <subj>/sessions are included.
+
+Syntax:       pvs archive compact|pack|unpack [--remove] [--pvs-root DIR] SUBJ [SUBJ ...]
+              (compact and pack also take NIfTI paths in place of subjects)
+Dependencies: NumPy, NiBabel
+"""
+
+import os
+import sys
+import glob
+import argparse
+import numpy as np
+import nibabel as nib
+from . import manifest
+from .tiling import DEFAULT_MAX_MEM_MB, plan_slab_depth, slab_bounds, read_slab, open_nifti_writer, write_slab
+
+
+#z-slices per archive chunk, the unit of lazy decompression
+CHUNK_Z=16
+
+#Mask and label outputs of one run, relative to the subject (or session) dir
+PATTERNS=[os.path.join("masks", "*.nii"),
+          os.path.join("eroded_masks", "*.nii"),
+          os.path.join("t1", "overlap_masks", "*.nii"),
+          os.path.join("t1", "clusters", "pvs_within_*.nii"),
+          os.path.join("t1", "clusters", "merged_pvs.nii"),
+          os.path.join("t1", "classification", "Classes.nii")]
+
+
+def main(argv=None):
+
+    args=parse_args(sys.argv[1:] if argv is None else argv)
+    for target in args.targets:
+        if target.endswith((".nii", ".nii.gz")):
+            files, name=[target], target
+        elif args.command=="unpack":
+            files, name=subject_archives(os.path.join(args.pvs_root, target)), target
+        else:
+            files, name=subject_maps(os.path.join(args.pvs_root, target)), target
+
+        before=after=0
+        for f in files:
+            if args.command=="compact":
+                b, a=compact(f)
+            elif args.command=="pack":
+                b, a=pack(f, remove=args.remove)
+            else:
+                b, a=unpack(f, remove=args.remove)
+            before+=b
+            after+=a
+        print("{}: {} maps, {:.1f} MB -> {:.1f} MB.".format(name, len(files), before/2**20, after/2**20))
+
+
+def parse_args(argv):
+    """
+
+    Parameters
+    ----------
+    argv : list
+        command line arguments.
+
+    Returns
+    -------
+    args : argparse.Namespace
+        parsed arguments.
+
+    """
+
+    parser=argparse.ArgumentParser(description="Compact dtypes and bit-packed archives for mask/label outputs.")
+    parser.add_argument("command", choices=["compact", "pack", "unpack"])
+    parser.add_argument("targets", nargs="+", help="subjects (or NIfTI paths for compact/pack)")
+    parser.add_argument("--remove", action="store_true", help="pack: remove each NIfTI once archived; "
+                                                             "unpack: remove each archive once restored")
+    parser.add_argument("--pvs-root", default=manifest.PVS_ROOT, help="PVS project root")
+    return parser.parse_args(argv)
+
+
+def archive_path(nifti):
+    """
+
+    Parameters
+    ----------
+    nifti : str
+        path to a map (.nii or .nii.gz).
+
+    Returns
+    -------
+    str
+        path to its archive.
+
+    """
+
+    base=nifti[:-7] if nifti.endswith(".nii.gz") else os.path.splitext(nifti)[0]
+    return base+".pack.npz"
+
+
+def subject_maps(pvs_dir):
+    """
+
+    Parameters
+    ----------
+    pvs_dir : str
+        path to subject PVS dir.
+
+    Returns
+    -------
+    list
+        mask and label NIfTIs of the primary run and any session runs.
+
+    """
+
+    roots=[pvs_dir]+sorted(glob.glob(os.path.join(pvs_dir, "sessions", "ses-*")))
+    return [f for root in roots for pattern in PATTERNS for f in sorted(glob.glob(os.path.join(root, pattern)))]
+
+
+def subject_archives(pvs_dir):
+    """
+
+    Parameters
+    ----------
+    pvs_dir : str
+        path to subject PVS dir.
+
+    Returns
+    -------
+    list
+        archives of the primary run and any session runs.
+
+    """
+
+    roots=[pvs_dir]+sorted(glob.glob(os.path.join(pvs_dir, "sessions", "ses-*")))
+    return [f for root in roots for pattern in PATTERNS
+            for f in sorted(glob.glob(archive_path(os.path.join(root, pattern))))]
+
+
+def value_range(img, max_mem_mb=DEFAULT_MAX_MEM_MB):
+    """
+
+    Parameters
+    ----------
+    img : nibabel image
+        map proxy.
+    max_mem_mb : int
+        memory cap in MB.
+
+    Returns
+    -------
+    tuple
+        (min, max, integral): value range and whether every value is a whole number.
+
+    """
+
+    shape=img.shape[:3]
+    lo, hi, integral=0.0, 0.0, True
+    for (z0, z1), _ in slab_bounds(0, shape[2], plan_slab_depth(shape[:2], 8, max_mem_mb)):
+        v=read_slab(img, z0, z1)
+        if v.size:
+            lo, hi=min(lo, float(v.min())), max(hi, float(v.max()))
+            integral&=bool(np.all(v==np.round(v)))
+    return lo, hi, integral
+
+
+def compact_dtype(img, max_mem_mb=DEFAULT_MAX_MEM_MB):
+    """
+
+    Parameters
+    ----------
+    img : nibabel image
+        map proxy.
+    max_mem_mb : int
+        memory cap in MB.
+
+    Returns
+    -------
+    numpy dtype or None
+        smallest unsigned dtype holding the map, None if it has fractional or negative values (or a scl_slope,
+        as the quantized distance maps do; those are already stored compactly).
+
+    """
+
+    slope, inter=img.header.get_slope_inter()
+    if slope not in [None, 1.0] or inter not in [None, 0.0]:
+        return None
+    lo, hi, integral=value_range(img, max_mem_mb)
+    if lo<0 or not integral:
+        return None
+    return np.min_scalar_type(int(hi))
+
+
+def compact(nifti, max_mem_mb=DEFAULT_MAX_MEM_MB):
+    """
+
+    Parameters
+    ----------
+    nifti : str
+        map to rewrite in place.
+    max_mem_mb : int
+        memory cap in MB.
+
+    Returns
+    -------
+    tuple
+        bytes on disk before and after.
+
+    """
+
+    before=os.path.getsize(nifti)
+    img=nib.load(nifti)
+    dtype=compact_dtype(img, max_mem_mb)
+    if dtype is None or np.dtype(dtype).itemsize>=img.get_data_dtype().itemsize:
+        return before, before
+
+    shape=img.shape[:3]
+    tmp=nifti+".tmp"+(".gz" if nifti.endswith(".gz") else "")
+    f=open_nifti_writer(tmp, shape, img.affine, dtype)
+    try:
+        for (z0, z1), _ in slab_bounds(0, shape[2], plan_slab_depth(shape[:2], 8, max_mem_mb)):
+            write_slab(f, read_slab(img, z0, z1), dtype)
+    finally:
+        f.close()
+    os.replace(tmp, nifti)
+    return before, os.path.getsize(nifti)
+
+
+def pack(nifti, remove=False, max_mem_mb=DEFAULT_MAX_MEM_MB):
+    """
+
+    Parameters
+    ----------
+    nifti : str
+        map to archive.
+    remove : bool
+        remove the NIfTI once the archive is written.
+    max_mem_mb : int
+        memory cap in MB.
+
+    Raises
+    ------
+    Exception
+        the map has fractional or negative values.
+
+    Returns
+    -------
+    tuple
+        bytes on disk before (NIfTI) and after (archive, plus the NIfTI if kept).
+
+    """
+
+    before=os.path.getsize(nifti)
+    img=nib.load(nifti)
+    shape=img.shape[:3]
+    slope, inter=img.header.get_slope_inter()
+    scaled=slope not in [None, 1.0] or inter not in [None, 0.0]
+    dtype=img.get_data_dtype() if scaled else compact_dtype(img, max_mem_mb)
+    if dtype is None:
+        raise Exception("{} is not a mask or label map. Exiting...".format(nifti))
+    kind="labels" if scaled or value_range(img, max_mem_mb)[1]>1 else "bits"
+
+
+    #Header kept so readers see the original grid, zooms and scaling, at the stored dtype
+    header=img.header.copy()
+    header.set_data_shape(shape)
+    header.set_data_dtype(dtype)
+    arrays={"header": np.frombuffer(header.binaryblock, dtype=np.uint8), "shape": np.array(shape),
+            "kind": np.array(kind), "chunk": np.array(CHUNK_Z)}
+    for i, z0 in enumerate(range(0, shape[2], CHUNK_Z)):
+        z1=min(shape[2], z0+CHUNK_Z)
+        raw=read_slab(img, z0, z1)
+        if scaled:
+            raw=np.round((raw-(inter or 0.0))/(1.0 if slope is None else slope))
+        flat=raw.reshape(shape[0], shape[1], z1-z0).ravel(order="F")
+        arrays["c{:05d}".format(i)]=np.packbits(flat>0) if kind=="bits" else flat.astype(dtype)
+
+    out=archive_path(nifti)
+    tmp=out[:-len(".npz")]+".tmp.npz"
+    np.savez_compressed(tmp, **arrays)
+    os.replace(tmp, out)
+    if remove:
+        os.remove(nifti)
+    return before, os.path.getsize(out)+(0 if remove else before)
+
+
+def unpack(archive, out=None, remove=False):
+    """
+
+    Parameters
+    ----------
+    archive : str
+        <name>.pack.npz.
+    out : str
+        NIfTI to write (default <name>.nii).
+    remove : bool
+        remove the archive once the NIfTI is written.
+
+    Returns
+    -------
+    tuple
+        bytes on disk before (archive) and after (NIfTI, plus the archive if kept).
+
+    """
+
+    before=os.path.getsize(archive)
+    img=ArchivedMap(archive)
+    out=out or archive[:-len(".pack.npz")]+".nii"
+    dtype=img.header.get_data_dtype()
+    slope, _=img.header.get_slope_inter()
+    f=open_nifti_writer(out, img.shape, img.affine, dtype, slope=1.0 if slope is None else slope)
+    try:
+        for i in range(img.n_chunks):
+            write_slab(f, img.chunk_data(i), dtype)
+    finally:
+        f.close()
+    if remove:
+        os.remove(archive)
+    return before, os.path.getsize(out)+(0 if remove else before)
+
+
+class ArchivedMap:
+    """
+    Read-only stand-in for a NiBabel image over a .pack.npz archive: shape, affine, header and dataobj. Indexing
+    dataobj (basic slices and integers, as read_slab and the slice readers do) decompresses only the z chunks it
+    touches; npz members are themselves read on first access.
+    """
+
+    def __init__(self, path):
+        self.path=path
+        self._npz=np.load(path)
+        self.header=nib.Nifti1Header(binaryblock=self._npz["header"].tobytes())
+        self.shape=tuple(int(x) for x in self._npz["shape"])
+        self.affine=self.header.get_best_affine()
+        self.kind=str(self._npz["kind"])
+        self.chunk=int(self._npz["chunk"])
+        self.n_chunks=-(-self.shape[2]//self.chunk)
+        self.dataobj=self
+        self._last=(None, None)
+
+    def get_data_dtype(self):
+        return self.header.get_data_dtype()
+
+    def chunk_data(self, i):
+        """
+
+        Parameters
+        ----------
+        i : int
+            chunk number.
+
+        Returns
+        -------
+        array
+            raw (unscaled) voxels of the chunk, shape (nx, ny, nz).
+
+        """
+
+        #Slice-by-slice readers (mask_bbox, qc_montage) hit the same chunk repeatedly
+        if self._last[0]==i:
+            return self._last[1]
+        nz=min(self.shape[2], (i+1)*self.chunk)-i*self.chunk
+        n=self.shape[0]*self.shape[1]*nz
+        data=self._npz["c{:05d}".format(i)]
+        if self.kind=="bits":
+            data=np.unpackbits(data, count=n).astype(self.get_data_dtype())
+        data=data.reshape((self.shape[0], self.shape[1], nz), order="F")
+        self._last=(i, data)
+        return data
+
+    def __getitem__(self, key):
+        key=key if isinstance(key, tuple) else (key,)
+        if any(k is Ellipsis for k in key):
+            i=[k is Ellipsis for k in key].index(True)
+            key=key[:i]+(slice(None),)*(3-len(key)+1)+key[i+1:]
+        key=key+(slice(None),)*(3-len(key))
+        xs, ys, zs=key[:3]
+
+        z=np.arange(self.shape[2])[zs]
+        zr=np.atleast_1d(z)
+        if len(zr)==0:
+            data=np.zeros(self.shape[:2]+(0,), dtype=self.get_data_dtype())
+        else:
+            c0, c1=int(zr.min())//self.chunk, int(zr.max())//self.chunk+1
+            data=np.concatenate([self.chunk_data(i) for i in range(c0, c1)], axis=2)[:, :, zr-c0*self.chunk]
+        data=data[xs, ys][..., 0] if np.ndim(z)==0 else data[xs, ys]
+        slope, inter=self.header.get_slope_inter()
+        if slope not in [None, 1.0] or inter not in [None, 0.0]:
+            data=data*(1.0 if slope is None else slope)+(inter or 0.0)
+        return data
+
+    def __array__(self, dtype=None):
+        data=self[...]
+        return data if dtype is None else data.astype(dtype)
+
+    def get_fdata(self):
+        return np.asarray(self[...], dtype=np.float64)
+
+
+if __name__ == "__main__":
+    main()
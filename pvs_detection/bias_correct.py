@@ -0,0 +1,432 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Wed Oct 21 09:38:14 2026
+@author: Leela Srinivasan
+
+Lightweight intensity non-uniformity correction, selectable in place of 3dUnifize.
+A smooth bias field is estimated as a low-order 3D polynomial fitted to log intensities of cerebral WM voxels, taken
+from the subject's FreeSurfer aseg (manifest 'aseg') on a strided (downsampled) copy of the t1 and refitted a few
+times with outliers (PVS, lesions, partial volume) dropped. Fitting WM only keeps the real WM/GM contrast out of the
+field. The field is then divided out at full resolution slab by slab and WM is scaled to 1000, as 3dUnifize does,
+so downstream classification sees the same intensity range.
+The polynomial correction is not assumed to be a drop-in for 3dUnifize: `check` runs it on a t1 already unifized
+by 3dUnifize and compares WM level, WM uniformity, GM/WM contrast and voxelwise correlation within the aseg brain,
+failing when they disagree. Check a few subjects before running a cohort with -u poly.
+
+Syntax:       pvs unifize correct T1 OUT --aseg ASEG [--order 3] [--step-mm 4]
+              pvs unifize check T1 UNIFIZED --aseg ASEG [--order 3] [--step-mm 4]
+Dependencies: NumPy, NiBabel
+"""
+
+import sys
+import argparse
+import numpy as np
+import nibabel as nib
+from itertools import product
+from .tiling import DEFAULT_MAX_MEM_MB, plan_slab_depth, slab_bounds, read_slab, open_nifti_writer, write_slab
+
+
+#3dUnifize scales white matter to this value
+WM_TARGET=1000.0
+
+#FreeSurfer aseg labels: cerebral WM (fit region) and cerebral cortex (contrast check)
+WM_LABELS=[2, 41]
+GM_LABELS=[3, 42]
+
+#check fails when GM/WM contrast differs from 3dUnifize's by more than this fraction, or correlation is lower
+CONTRAST_TOL=0.05
+MIN_CORR=0.9
+
+
+def main(argv=None):
+
+    args=parse_args(sys.argv[1:] if argv is None else argv)
+    if args.command=="correct":
+        coefs=estimate_bias(args.t1, args.aseg, order=args.order, step_mm=args.step_mm, n_iter=args.iterations)
+        apply_bias(args.t1, coefs, args.order, args.out)
+        print("Bias-corrected t1 written to {}.".format(args.out))
+
+    elif args.command=="check":
+        check(args.t1, args.unifized, args.aseg, order=args.order, step_mm=args.step_mm, n_iter=args.iterations)
+
+
+def parse_args(argv):
+    """
+
+    Parameters
+    ----------
+    argv : list
+        command line arguments.
+
+    Returns
+    -------
+    args : argparse.Namespace
+        parsed arguments.
+
+    """
+
+    parser=argparse.ArgumentParser(description="Polynomial bias-field correction of a t1.")
+    sub=parser.add_subparsers(dest="command", required=True)
+
+    p=sub.add_parser("correct", help="write the bias-corrected t1")
+    p.add_argument("t1", help="path to t1 nifti")
+    p.add_argument("out", help="path to corrected output (unifized_t1.nii)")
+
+    p2=sub.add_parser("check", help="compare the correction of a t1 with its 3dUnifize output")
+    p2.add_argument("t1", help="path to t1 nifti")
+    p2.add_argument("unifized", help="3dUnifize output of the same t1")
+
+    for q in [p, p2]:
+        q.add_argument("--aseg", required=True, help="FreeSurfer aseg.mgz of the subject (WM labels 2/41)")
+        q.add_argument("--order", type=int, default=3, help="polynomial order of the bias field")
+        q.add_argument("--step-mm", type=float, default=4.0, help="sampling step for the fit in mm")
+        q.add_argument("--iterations", type=int, default=4, help="outlier rejection/refit rounds")
+    return parser.parse_args(argv)
+
+
+def exponents(order):
+    """
+
+    Parameters
+    ----------
+    order : int
+        polynomial order.
+
+    Returns
+    -------
+    list
+        (i, j, k) exponents of every monomial with i+j+k <= order.
+
+    """
+
+    return [e for e in product(range(order+1), repeat=3) if sum(e)<=order]
+
+
+def normalized_coords(idx, n):
+    """
+
+    Parameters
+    ----------
+    idx : array
+        voxel indices along one axis.
+    n : int
+        axis length.
+
+    Returns
+    -------
+    array
+        indices mapped to [-1, 1] for a well-conditioned fit.
+
+    """
+
+    return 2.0*np.asarray(idx, dtype=np.float64)/max(1, n-1)-1.0
+
+
+def design(u, v, w, order):
+    """
+
+    Parameters
+    ----------
+    u, v, w : array
+        normalized coordinates (same length).
+    order : int
+        polynomial order.
+
+    Returns
+    -------
+    array
+        (n, terms) monomial design matrix.
+
+    """
+
+    pu=[np.ones_like(u)]
+    pv=[np.ones_like(v)]
+    pw=[np.ones_like(w)]
+    for _ in range(order):
+        pu.append(pu[-1]*u)
+        pv.append(pv[-1]*v)
+        pw.append(pw[-1]*w)
+    return np.stack([pu[i]*pv[j]*pw[k] for i, j, k in exponents(order)], axis=1)
+
+
+def evaluate(coefs, u, v, w, order):
+    """
+
+    Parameters
+    ----------
+    coefs : array
+        polynomial coefficients.
+    u, v, w : array
+        normalized coordinates along x, y and z (grid axes, not per voxel).
+    order : int
+        polynomial order.
+
+    Returns
+    -------
+    array
+        polynomial on the (len(u), len(v), len(w)) grid, built by broadcasting so no design matrix is formed.
+
+    """
+
+    pu=[np.ones_like(u)]
+    pv=[np.ones_like(v)]
+    pw=[np.ones_like(w)]
+    for _ in range(order):
+        pu.append(pu[-1]*u)
+        pv.append(pv[-1]*v)
+        pw.append(pw[-1]*w)
+
+    out=np.zeros((len(u), len(v), len(w)))
+    for c, (i, j, k) in zip(coefs, exponents(order)):
+        out+=c*pu[i][:, None, None]*pv[j][None, :, None]*pw[k][None, None, :]
+    return out
+
+
+def downsample(t1, step_mm, max_mem_mb=DEFAULT_MAX_MEM_MB):
+    """
+
+    Parameters
+    ----------
+    t1 : str
+        path to t1.
+    step_mm : float
+        sampling step in mm.
+    max_mem_mb : int
+        memory cap in MB.
+
+    Returns
+    -------
+    values : array
+        intensities of the strided grid.
+    ijk : array
+        (n, 3) voxel indices of each value.
+    coords : tuple
+        normalized (u, v, w) coordinates of each value.
+
+    """
+
+    img=nib.load(t1)
+    shape=img.shape[:3]
+    zooms=img.header.get_zooms()[:3]
+    steps=[max(1, int(round(step_mm/z))) for z in zooms]
+    xs=np.arange(0, shape[0], steps[0])
+    ys=np.arange(0, shape[1], steps[1])
+    zs=np.arange(0, shape[2], steps[2])
+
+
+    #Read only the strided planes; each slab read is then strided in-plane
+    values=[]
+    coords=[]
+    depth=plan_slab_depth(shape[:2], 8, max_mem_mb)
+    for (z0, z1), _ in slab_bounds(0, shape[2], depth):
+        zsel=zs[(zs>=z0) & (zs<z1)]
+        if len(zsel)==0:
+            continue
+        slab=read_slab(img, z0, z1)[::steps[0], ::steps[1], zsel-z0].astype(np.float64)
+        gx, gy, gz=np.meshgrid(xs, ys, zsel, indexing="ij")
+        values.append(slab.ravel())
+        coords.append(np.stack([gx.ravel(), gy.ravel(), gz.ravel()], axis=1))
+
+    values=np.concatenate(values)
+    ijk=np.concatenate(coords)
+    uvw=tuple(normalized_coords(ijk[:, a], shape[a]) for a in range(3))
+    return values, ijk, uvw
+
+
+def aseg_labels(aseg, t1, ijk):
+    """
+
+    Parameters
+    ----------
+    aseg : str
+        path to FreeSurfer aseg.mgz.
+    t1 : str
+        path to t1 the indices belong to (FreeSurfer space: SurfVol or a t1 aligned to it).
+    ijk : array
+        (n, 3) t1 voxel indices.
+
+    Returns
+    -------
+    array
+        aseg label at each voxel centre (nearest neighbour through the two affines; 0 outside the aseg).
+
+    """
+
+    seg=nib.load(aseg)
+    labels=np.asarray(seg.dataobj)
+    to_seg=np.linalg.inv(seg.affine)@nib.load(t1).affine
+    s=np.rint(nib.affines.apply_affine(to_seg, ijk)).astype(np.int64)
+    inside=np.all((s>=0) & (s<np.asarray(labels.shape[:3])), axis=1)
+    out=np.zeros(len(ijk), dtype=labels.dtype)
+    out[inside]=labels[tuple(s[inside].T)]
+    return out
+
+
+def estimate_bias(t1, aseg, order=3, step_mm=4.0, n_iter=4):
+    """
+
+    Parameters
+    ----------
+    t1 : str
+        path to t1.
+    aseg : str
+        path to the subject's FreeSurfer aseg.mgz; its cerebral WM is the fit region.
+    order : int
+        polynomial order.
+    step_mm : float
+        sampling step in mm.
+    n_iter : int
+        outlier rejection/refit rounds.
+
+    Raises
+    ------
+    Exception
+        Too few WM voxels (aseg not in the t1's space).
+
+    Returns
+    -------
+    coefs : array
+        polynomial coefficients of log(bias), normalized so WM maps to WM_TARGET.
+
+    """
+
+    values, ijk, (u, v, w)=downsample(t1, step_mm)
+    wm=np.isin(aseg_labels(aseg, t1, ijk), WM_LABELS) & (values>0)
+    if wm.sum()<10*len(exponents(order)):
+        raise Exception("Too few aseg WM voxels in {} to fit a bias field; is {} in its space? Exiting...".format(
+            t1, aseg))
+
+    logv=np.log(values[wm])
+    X=design(u[wm], v[wm], w[wm], order)
+
+
+    #Anatomical WM only; drop voxels far from the fitted field (PVS, lesions, partial volume) and refit
+    sel=np.ones(len(logv), dtype=bool)
+    for _ in range(n_iter):
+        coefs, *_=np.linalg.lstsq(X[sel], logv[sel], rcond=None)
+        resid=logv-X@coefs
+        mode=np.median(resid[sel])
+        spread=1.4826*np.median(np.abs(resid[sel]-mode))
+        sel=np.abs(resid-mode)<=2*max(spread, 1e-6)
+
+    coefs[0]+=mode-np.log(WM_TARGET)
+    return coefs
+
+
+def tissue_summary(values, labels):
+    """
+
+    Parameters
+    ----------
+    values : array
+        unifized intensities at sampled voxels.
+    labels : array
+        aseg labels of the same voxels.
+
+    Returns
+    -------
+    dict
+        wm_median, wm_cv (robust: 1.4826 MAD / median) and gm_wm (cortex median / WM median).
+
+    """
+
+    wm=values[np.isin(labels, WM_LABELS)]
+    gm=values[np.isin(labels, GM_LABELS)]
+    wm_median=float(np.median(wm))
+    return {"wm_median": wm_median, "wm_cv": float(1.4826*np.median(np.abs(wm-wm_median))/wm_median),
+            "gm_wm": float(np.median(gm)/wm_median)}
+
+
+def check(t1, unifized, aseg, order=3, step_mm=4.0, n_iter=4):
+    """
+
+    Parameters
+    ----------
+    t1 : str
+        path to t1.
+    unifized : str
+        3dUnifize output of the same t1 (unifized_t1.nii of a subject run with -u 3dunifize).
+    aseg : str
+        path to the subject's FreeSurfer aseg.mgz.
+    order, step_mm, n_iter :
+        fit options, as estimate_bias.
+
+    Raises
+    ------
+    Exception
+        Grids differ, or the GM/WM contrast differs by more than CONTRAST_TOL or the brain correlation is below
+        MIN_CORR.
+
+    Returns
+    -------
+    dict
+        tissue_summary of both corrections and their correlation within the aseg brain. The polynomial
+        correction is evaluated at the sampled voxels only; nothing is written.
+
+    """
+
+    if nib.load(t1).shape[:3]!=nib.load(unifized).shape[:3]:
+        raise Exception("{} and {} are on different grids. Exiting...".format(t1, unifized))
+    coefs=estimate_bias(t1, aseg, order=order, step_mm=step_mm, n_iter=n_iter)
+    values, ijk, (u, v, w)=downsample(t1, step_mm)
+    ref, _, _=downsample(unifized, step_mm)
+    labels=aseg_labels(aseg, t1, ijk)
+    brain=labels>0
+    poly=values[brain]*np.exp(-design(u[brain], v[brain], w[brain], order)@coefs)
+
+    result={"poly": tissue_summary(poly, labels[brain]), "3dunifize": tissue_summary(ref[brain], labels[brain]),
+            "correlation": float(np.corrcoef(poly, ref[brain])[0, 1])}
+    for method in ["poly", "3dunifize"]:
+        print("{:<10} WM median {:8.1f}  WM CV {:.3f}  GM/WM {:.3f}".format(method, *result[method].values()))
+    print("Brain voxel correlation {:.3f}".format(result["correlation"]))
+
+    contrast=abs(result["poly"]["gm_wm"]/result["3dunifize"]["gm_wm"]-1)
+    if contrast>CONTRAST_TOL or result["correlation"]<MIN_CORR:
+        raise Exception("Polynomial correction of {} disagrees with 3dUnifize (GM/WM off by {:.1%}, correlation "
+                        "{:.3f}); keep -u 3dunifize. Exiting...".format(t1, contrast, result["correlation"]))
+    return result
+
+
+def apply_bias(t1, coefs, order, out, max_mem_mb=DEFAULT_MAX_MEM_MB):
+    """
+
+    Parameters
+    ----------
+    t1 : str
+        path to t1.
+    coefs : array
+        coefficients from estimate_bias.
+    order : int
+        polynomial order.
+    out : str
+        path to corrected output.
+    max_mem_mb : int
+        memory cap in MB.
+
+    Returns
+    -------
+    None.
+
+    """
+
+    img=nib.load(t1)
+    shape=img.shape[:3]
+    u=normalized_coords(np.arange(shape[0]), shape[0])
+    v=normalized_coords(np.arange(shape[1]), shape[1])
+    depth=plan_slab_depth(shape[:2], 24, max_mem_mb)
+
+
+    f=open_nifti_writer(out, shape, img.affine, np.float32)
+    try:
+        for (z0, z1), _ in slab_bounds(0, shape[2], depth):
+            w=normalized_coords(np.arange(z0, z1), shape[2])
+            slab=read_slab(img, z0, z1).astype(np.float32)
+            corrected=slab*np.exp(-evaluate(coefs, u, v, w, order)).astype(np.float32)
+            write_slab(f, np.clip(corrected, 0, None), np.float32)
+    finally:
+        f.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Wed Oct 21 13:52:30 2026
+@author: Leela Srinivasan
+
+Single `pvs` command line for every pipeline stage.
+Each subcommand maps to a stage module whose main() receives the remaining arguments; the module (and with it
+pandas, SciPy, Matplotlib, ...) is only imported when its subcommand runs. `pvs run` reads one subcommand per
+line from a file or stdin and runs them all in this process, so a subject's Python stages share one interpreter
+and import each dependency once. --profile (or PVS_PROFILE) profiles each subcommand; see profiling.py.
+
+Syntax:       pvs [--profile[=cprofile|sample]] SUBCOMMAND [ARGS ...]
+              pvs [--profile[=cprofile|sample]] run [FILE|-]
+
+Dependencies: Python standard library (stage dependencies are loaded per subcommand)
+"""
+
+import os
+import sys
+import time
+import shlex
+import importlib
+
+
+#Subcommand -> (stage module, leading arguments, help)
+COMMANDS={"masks": ("create_fs_masks", [], "FreeSurfer WM masks for a subject (SUBJ [--tiled])"),
+          "clusters": ("tiling", ["cluster"], "cluster a candidate map into a cluster map + CSV"),
+          "parse": ("afnitxt_to_csv", [], "3dClusterize text report -> CSV"),
+          "stats": ("compile_stats", [], "compile cohort stats into the summary spreadsheets"),
+          "compare": ("cohort_stats", [], "bootstrap/permutation HV vs patient comparison"),
+          "clusterdb": ("cluster_db", [], "R-tree indexed cohort cluster database and queries"),
+          "regions": ("regional_stats", [], "per-label PVS count and volume from aseg/wmparc"),
+          "intensity": ("compare_mr_intensity", [], "t2/t1 intensity plots for a subject (SUBJ)"),
+          "keys": ("key_conversion", [], "convert subject names to p-numbers/hv codes"),
+          "manifest": ("manifest", [], "cohort manifest of sessions, paths and input availability"),
+          "tiled": ("tiling", [], "memory-capped binarize, overlap and cluster stages"),
+          "unifize": ("bias_correct", [], "polynomial bias-field correction"),
+          "tissue": ("tissue_classify", [], "Gaussian mixture tissue classification"),
+          "vessel": ("vesselness", [], "Hessian vesselness candidate map"),
+          "ratio": ("ratio_detect", [], "z-scored T2/T1 ratio candidate map"),
+          "erosion": ("erosion", [], "distance maps, erosion and depth stats"),
+          "archive": ("archive", [], "compact dtypes and bit-packed archives for mask/label outputs"),
+          "sparse": ("sparse_maps", [], "sparse voxel lists and verification maps"),
+          "sweep": ("cluster_sweep", [], "sweep cluster connectivity and size thresholds"),
+          "validate": ("validate_pvs", [], "score detections against clinician masks"),
+          "qc": ("qc_montage", [], "cluster overlay montages and an HTML index for QC"),
+          "density": ("template_density", [], "streaming cohort PVS frequency maps in template space"),
+          "stage": ("staging", [], "stage an input by link/clone/verified copy with provenance"),
+          "subject": ("stage_runner", [], "run find_PVS stages concurrently for subject(s)"),
+          "pipeline": ("pipeline", [], "config-driven batch of patients and HVs through one scheduler"),
+          "service": ("stats_service", [], "local HTTP query service over compiled stats and clusters"),
+          "history": ("run_history", [], "run history and batch wall time prediction"),
+          "profile": ("profiling", [], "inspect and compare profiles written by pvs --profile"),
+          "longitudinal": ("longitudinal", [], "process every session and match PVS across sessions"),
+          "watch": ("watch", [], "watch for reconstructed subjects and run find_PVS on them")}
+
+
+def main(argv=None):
+
+    argv=sys.argv[1:] if argv is None else argv
+
+
+    #Set before any stage module imports profiling, and inherited by the stages it launches
+    if len(argv) and argv[0].split("=")[0]=="--profile":
+        os.environ["PVS_PROFILE"]=argv[0].split("=", 1)[1] if "=" in argv[0] else "cprofile"
+        argv=argv[1:]
+    if len(argv)==0 or argv[0] in ["-h", "--help"]:
+        display_usage()
+        return 0 if len(argv) else 1
+
+    if argv[0]=="run":
+        return run_stages(read_stages(argv[1] if len(argv)>1 else "-"))
+    dispatch(argv)
+    return 0
+
+
+def display_usage():
+    """
+    Print subcommands.
+
+    Returns
+    -------
+    None.
+
+    """
+
+    print("usage: pvs [--profile[=cprofile|sample]] SUBCOMMAND [ARGS ...]\n"
+          "       pvs [--profile[=cprofile|sample]] run [FILE|-]\n\nsubcommands:")
+    for name, (_, _, text) in COMMANDS.items():
+        print("  {:<10} {}".format(name, text))
+    print("  {:<10} {}".format("run", "run one subcommand per line from FILE or stdin in one process"))
+
+
+def dispatch(argv):
+    """
+
+    Parameters
+    ----------
+    argv : list
+        subcommand followed by its arguments.
+
+    Raises
+    ------
+    Exception
+        Unrecognized subcommand.
+
+    Returns
+    -------
+    None.
+
+    """
+
+    name=argv[0]
+    if name not in COMMANDS:
+        raise Exception("Unrecognized subcommand {}. Run pvs --help for the list.".format(name))
+    module, lead, _=COMMANDS[name]
+    from .profiling import profiled
+    with profiled(argv):
+        stage=importlib.import_module("{}.{}".format(__package__, module))
+        stage.main(lead+list(argv[1:]))
+
+
+def read_stages(src):
+    """
+
+    Parameters
+    ----------
+    src : str
+        path to a stage list, or '-' for stdin.
+
+    Returns
+    -------
+    list
+        argument lists, one per non-empty, non-comment line (shell quoting rules apply).
+
+    """
+
+    f=sys.stdin if src=="-" else open(src, "r")
+    try:
+        lines=f.read().splitlines()
+    finally:
+        if f is not sys.stdin:
+            f.close()
+    return [shlex.split(line) for line in lines if line.strip() and not line.strip().startswith("#")]
+
+
+def run_stages(stages):
+    """
+
+    Parameters
+    ----------
+    stages : list
+        argument lists, each starting with a subcommand.
+
+    Returns
+    -------
+    int
+        0; the first failing stage raises, so the calling script stops as it would on a failed python call.
+
+    """
+
+    for argv in stages:
+        start=time.perf_counter()
+        dispatch(argv)
+        print("pvs {} finished in {:.1f} s.".format(argv[0], time.perf_counter()-start))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
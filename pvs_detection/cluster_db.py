@@ -0,0 +1,453 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Nov 2 10:21:36 2026
+@author: Leela Srinivasan
+
+Cohort-wide cluster database for spatial and attribute queries.
+Every cluster of every subject's pvs_within_* maps is one row of a SQLite database (PVS_CLUSTER_DB, default
+summary/pvs_clusters.sqlite): subject, group, hemisphere, label, voxels, volume, and its centre of mass and
+bounding box in scanner RAS and in MNI305 (through FreeSurfer's talairach.xfm, as in template_density.py).
+Two R-tree tables index the MNI centroids and bounding boxes, so "clusters within 10 mm of a point" or "clusters
+overlapping a box" only visit nearby rows. Rows are built from the sparse voxel lists with one sort and a few
+reduceat calls per map. A map is only re-read when its modification time changed, so the clustering stage adds
+each subject as it finishes. Coordinates are RAS (not the RAI of the cluster CSVs) at voxel centres.
+
+Syntax:       pvs clusterdb add [--pvs-root DIR] [--hemi left|right] [SUBJ ...]
+              pvs clusterdb near X Y Z [--radius 10] [--box] [filters]
+              pvs clusterdb query [--box X0 X1 Y0 Y1 Z0 Z1] [filters]
+              filters: [--hemi left|right] [--group hv|patient] [--subject SUBJ] [--min-voxels N] [--max-voxels N]
+Dependencies: NumPy, NiBabel, pandas (queries)
+"""
+
+import os
+import sys
+import time
+import sqlite3
+import argparse
+import numpy as np
+import nibabel as nib
+from . import manifest, sparse_maps
+from .template_density import HEMIS, cluster_maps, find_subjects, read_xfm, subject_group, talairach_xfm
+
+
+DEFAULT_DB=os.environ.get("PVS_CLUSTER_DB", os.path.join(manifest.SUMMARY_DIR, "pvs_clusters.sqlite"))
+
+SCHEMA="""
+CREATE TABLE IF NOT EXISTS clusters (
+    cluster_id INTEGER PRIMARY KEY,
+    subject TEXT NOT NULL,
+    grp TEXT,
+    hemi TEXT NOT NULL,
+    label INTEGER,
+    voxels INTEGER,
+    volume_mm3 REAL,
+    cm_x REAL, cm_y REAL, cm_z REAL,
+    mni_x REAL, mni_y REAL, mni_z REAL
+);
+CREATE TABLE IF NOT EXISTS maps (
+    subject TEXT NOT NULL,
+    hemi TEXT NOT NULL,
+    source TEXT,
+    mtime REAL,
+    n_clusters INTEGER,
+    PRIMARY KEY (subject, hemi)
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS cluster_cm USING rtree(id, min_x, max_x, min_y, max_y, min_z, max_z);
+CREATE VIRTUAL TABLE IF NOT EXISTS cluster_bbox USING rtree(id, min_x, max_x, min_y, max_y, min_z, max_z);
+CREATE INDEX IF NOT EXISTS clusters_subject ON clusters(subject, hemi);
+CREATE INDEX IF NOT EXISTS clusters_voxels ON clusters(hemi, voxels);
+"""
+
+#Columns returned by queries
+COLUMNS=["cluster_id", "subject", "grp", "hemi", "label", "voxels", "volume_mm3",
+         "cm_x", "cm_y", "cm_z", "mni_x", "mni_y", "mni_z"]
+
+
+def main(argv=None):
+
+    args=parse_args(sys.argv[1:] if argv is None else argv)
+    con=connect(args.db)
+    try:
+        if args.command=="add":
+            subjects=args.subjects or find_subjects(args.pvs_root)
+            hemis=[args.hemi] if args.hemi else HEMIS
+            added=sum(add_subject(con, subj, args.pvs_root, hemis, force=args.force)
+                      for subj in subjects)
+            print("Added or refreshed {} maps; {} clusters in {}.".format(
+                added, con.execute("SELECT COUNT(*) FROM clusters").fetchone()[0], args.db))
+            return
+
+        start=time.perf_counter()
+        filters=dict(hemi=args.hemi, group=args.group, subject=args.subject,
+                     min_voxels=args.min_voxels, max_voxels=args.max_voxels)
+        if args.command=="near":
+            df=clusters_near(con, (args.x, args.y, args.z), args.radius, use_bbox=args.box, **filters)
+        else:
+            df=query_clusters(con, box=args.box, **filters)
+        elapsed=1000*(time.perf_counter()-start)
+        if args.out:
+            df.to_csv(args.out, index=False)
+        else:
+            print(df.to_string(index=False))
+        print("{} clusters from {} subjects in {:.1f} ms.".format(len(df), df["subject"].nunique(), elapsed))
+    finally:
+        con.close()
+
+
+def parse_args(argv):
+    """
+
+    Parameters
+    ----------
+    argv : list
+        command line arguments.
+
+    Returns
+    -------
+    args : argparse.Namespace
+        parsed arguments.
+
+    """
+
+    parser=argparse.ArgumentParser(description="R-tree indexed cohort cluster database.")
+    parser.add_argument("--db", default=DEFAULT_DB, help="path to cluster database")
+    sub=parser.add_subparsers(dest="command", required=True)
+
+    p=sub.add_parser("add", help="add or refresh subjects' clusters (unchanged maps are skipped)")
+    p.add_argument("subjects", nargs="*", help="subjects to add (default: all with cluster maps)")
+    p.add_argument("--pvs-root", default=manifest.PVS_ROOT, help="PVS project root")
+    p.add_argument("--hemi", default=None, choices=HEMIS, help="only this hemisphere's map")
+    p.add_argument("--force", action="store_true", help="re-read maps even if unchanged")
+
+    for name, text in [("near", "clusters with an MNI centroid (or box, --box) within --radius mm of a point"),
+                       ("query", "clusters by attribute, optionally overlapping an MNI box")]:
+        p=sub.add_parser(name, help=text)
+        if name=="near":
+            p.add_argument("x", type=float)
+            p.add_argument("y", type=float)
+            p.add_argument("z", type=float)
+            p.add_argument("--radius", type=float, default=10.0, help="mm")
+            p.add_argument("--box", action="store_true", help="match on bounding box distance, not centroid")
+        else:
+            p.add_argument("--box", type=float, nargs=6, default=None,
+                           metavar=("X0", "X1", "Y0", "Y1", "Z0", "Z1"), help="MNI box the cluster must overlap")
+        p.add_argument("--hemi", default=None, choices=HEMIS)
+        p.add_argument("--group", default=None, choices=["hv", "patient"])
+        p.add_argument("--subject", default=None)
+        p.add_argument("--min-voxels", type=int, default=None)
+        p.add_argument("--max-voxels", type=int, default=None)
+        p.add_argument("--out", default=None, help="write CSV instead of printing")
+    return parser.parse_args(argv)
+
+
+def connect(db=DEFAULT_DB):
+    """
+
+    Parameters
+    ----------
+    db : str
+        path to cluster database; created with its schema on first use.
+
+    Returns
+    -------
+    sqlite3.Connection
+        open connection.
+
+    """
+
+    os.makedirs(os.path.dirname(os.path.abspath(db)), exist_ok=True)
+    con=sqlite3.connect(db, timeout=60)
+    con.executescript(SCHEMA)
+    return con
+
+
+def cluster_rows(sp, xfm=None):
+    """
+
+    Parameters
+    ----------
+    sp : SparseMap
+        cluster map.
+    xfm : array
+        4x4 scanner RAS to MNI305 matrix, or None.
+
+    Returns
+    -------
+    dict
+        per-cluster arrays: label, voxels, volume_mm3, cm (n, 3) RAS, and with xfm mni (n, 3), lo and hi (n, 3)
+        MNI bounding box of the voxel centres.
+
+    """
+
+    order=np.argsort(sp.label, kind="stable")
+    labels, starts, counts=np.unique(sp.label[order], return_index=True, return_counts=True)
+    ijk=np.stack(np.unravel_index(sp.index[order], sp.shape[:3], order="F"), axis=1)
+    ras=nib.affines.apply_affine(np.asarray(sp.affine), ijk)
+    rows={"label": labels.astype(np.int64),
+          "voxels": counts.astype(np.int64),
+          "volume_mm3": counts*abs(np.linalg.det(np.asarray(sp.affine)[:3, :3])),
+          "cm": np.add.reduceat(ras, starts, axis=0)/counts[:, None] if len(labels) else np.zeros((0, 3))}
+    if xfm is not None and len(labels):
+        mni=nib.affines.apply_affine(xfm, ras)
+        rows["mni"]=np.add.reduceat(mni, starts, axis=0)/counts[:, None]
+        rows["lo"]=np.minimum.reduceat(mni, starts, axis=0)
+        rows["hi"]=np.maximum.reduceat(mni, starts, axis=0)
+    return rows
+
+
+def map_mtime(f):
+    """
+
+    Parameters
+    ----------
+    f : str
+        cluster map path.
+
+    Returns
+    -------
+    float
+        newest modification time of the NIfTI and its sparse companion.
+
+    """
+
+    return max(os.path.getmtime(g) for g in [f, sparse_maps.sparse_path(f)] if os.path.exists(g))
+
+
+def add_subject(con, subj, pvs_root, hemis=HEMIS, force=False):
+    """
+
+    Parameters
+    ----------
+    con : sqlite3.Connection
+        open cluster database.
+    subj : str
+        p-number or hv code.
+    pvs_root : str
+        PVS project root.
+    hemis : list
+        hemispheres to add.
+    force : bool
+        re-read maps whose modification time is unchanged.
+
+    Returns
+    -------
+    int
+        maps (re)loaded; each replaces that subject and hemisphere's earlier rows in one transaction.
+
+    """
+
+    try:
+        xfm=read_xfm(talairach_xfm(subj))
+    except Exception as e:
+        xfm=None
+        print("{} Its clusters are stored without MNI coordinates or R-tree entries.".format(e))
+
+    added=0
+    for f in cluster_maps(os.path.join(pvs_root, subj)):
+        hemi=[h for h in HEMIS if "_{}_".format(h) in "_"+os.path.basename(f)][0]
+        if hemi not in hemis:
+            continue
+        mtime=map_mtime(f)
+        known=con.execute("SELECT mtime FROM maps WHERE subject=? AND hemi=?", (subj, hemi)).fetchone()
+        if known and known[0]==mtime and not force:
+            continue
+
+        rows=cluster_rows(sparse_maps.load_or_build(f), xfm)
+        with con:
+            insert_map(con, subj, subject_group(subj), hemi, rows, f, mtime)
+        added+=1
+    return added
+
+
+def insert_map(con, subj, group, hemi, rows, source, mtime):
+    """
+
+    Parameters
+    ----------
+    con : sqlite3.Connection
+        open cluster database (inside the caller's transaction).
+    subj : str
+        subject.
+    group : str
+        hv or patient.
+    hemi : str
+        left/right.
+    rows : dict
+        cluster_rows of the map.
+    source : str
+        cluster map path.
+    mtime : float
+        map modification time (see map_mtime).
+
+    Returns
+    -------
+    None. Replaces the subject and hemisphere's earlier rows.
+
+    """
+
+    delete_map(con, subj, hemi)
+    for i in range(len(rows["label"])):
+        mni=rows["mni"][i].tolist() if "mni" in rows else [None, None, None]
+        cid=con.execute("INSERT INTO clusters (subject, grp, hemi, label, voxels, volume_mm3, cm_x, cm_y, cm_z, "
+                        "mni_x, mni_y, mni_z) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                        [subj, group, hemi, int(rows["label"][i]), int(rows["voxels"][i]),
+                         float(rows["volume_mm3"][i])]+rows["cm"][i].tolist()+mni).lastrowid
+        if "mni" in rows:
+            x, y, z=mni
+            con.execute("INSERT INTO cluster_cm VALUES (?, ?, ?, ?, ?, ?, ?)", (cid, x, x, y, y, z, z))
+            lo, hi=rows["lo"][i], rows["hi"][i]
+            con.execute("INSERT INTO cluster_bbox VALUES (?, ?, ?, ?, ?, ?, ?)",
+                        (cid, lo[0], hi[0], lo[1], hi[1], lo[2], hi[2]))
+    con.execute("INSERT OR REPLACE INTO maps VALUES (?, ?, ?, ?, ?)", (subj, hemi, source, mtime, len(rows["label"])))
+
+
+def delete_map(con, subj, hemi):
+    """
+
+    Parameters
+    ----------
+    con : sqlite3.Connection
+        open cluster database (inside the caller's transaction).
+    subj : str
+        subject.
+    hemi : str
+        left/right.
+
+    Returns
+    -------
+    None.
+
+    """
+
+    ids="SELECT cluster_id FROM clusters WHERE subject=? AND hemi=?"
+    for table in ["cluster_cm", "cluster_bbox"]:
+        con.execute("DELETE FROM {} WHERE id IN ({})".format(table, ids), (subj, hemi))
+    con.execute("DELETE FROM clusters WHERE subject=? AND hemi=?", (subj, hemi))
+    con.execute("DELETE FROM maps WHERE subject=? AND hemi=?", (subj, hemi))
+
+
+def attribute_filters(hemi=None, group=None, subject=None, min_voxels=None, max_voxels=None):
+    """
+
+    Parameters
+    ----------
+    hemi, group, subject : str
+        exact matches (None for any).
+    min_voxels, max_voxels : int
+        inclusive size bounds (None for unbounded).
+
+    Returns
+    -------
+    clauses : list
+        SQL conditions on the clusters table (alias c).
+    params : list
+        their parameters.
+
+    """
+
+    clauses=[]
+    params=[]
+    for column, op, value in [("hemi", "=", hemi), ("grp", "=", group), ("subject", "=", subject),
+                              ("voxels", ">=", min_voxels), ("voxels", "<=", max_voxels)]:
+        if value is not None:
+            clauses.append("c.{} {} ?".format(column, op))
+            params.append(value)
+    return clauses, params
+
+
+def run_query(con, sql, params):
+    """
+
+    Parameters
+    ----------
+    con : sqlite3.Connection
+        open cluster database.
+    sql : str
+        query selecting COLUMNS.
+    params : list
+        its parameters.
+
+    Returns
+    -------
+    df : df
+        result rows.
+
+    """
+
+    import pandas as pd
+    return pd.DataFrame(con.execute(sql, params).fetchall(), columns=COLUMNS)
+
+
+def query_clusters(con, box=None, **filters):
+    """
+
+    Parameters
+    ----------
+    con : sqlite3.Connection
+        open cluster database.
+    box : list
+        optional MNI box (x0, x1, y0, y1, z0, z1); clusters whose bounding box overlaps it.
+    **filters
+        hemi, group, subject, min_voxels, max_voxels (see attribute_filters).
+
+    Returns
+    -------
+    df : df
+        matching clusters, largest first.
+
+    """
+
+    clauses, params=attribute_filters(**filters)
+    select="SELECT {} FROM clusters c".format(", ".join("c."+col for col in COLUMNS))
+    if box is not None:
+        select+=" JOIN cluster_bbox b ON b.id=c.cluster_id"
+        clauses=["b.max_x>=? AND b.min_x<=? AND b.max_y>=? AND b.min_y<=? AND b.max_z>=? AND b.min_z<=?"]+clauses
+        params=list(box)+params
+    where=" WHERE "+" AND ".join(clauses) if clauses else ""
+    return run_query(con, select+where+" ORDER BY c.voxels DESC", params)
+
+
+def clusters_near(con, point, radius=10.0, use_bbox=False, **filters):
+    """
+
+    Parameters
+    ----------
+    con : sqlite3.Connection
+        open cluster database.
+    point : tuple
+        MNI (x, y, z).
+    radius : float
+        distance in mm.
+    use_bbox : bool
+        distance to the cluster's bounding box instead of its centroid.
+    **filters
+        hemi, group, subject, min_voxels, max_voxels (see attribute_filters).
+
+    Returns
+    -------
+    df : df
+        matching clusters with 'distance_mm', nearest first. The R-tree narrows to the cube around the point;
+        the exact distance is then applied to those rows only.
+
+    """
+
+    x, y, z=point
+    table="cluster_bbox" if use_bbox else "cluster_cm"
+    clauses, params=attribute_filters(**filters)
+    sql="SELECT {}, r.min_x, r.max_x, r.min_y, r.max_y, r.min_z, r.max_z FROM {} r JOIN clusters c " \
+        "ON c.cluster_id=r.id WHERE r.max_x>=? AND r.min_x<=? AND r.max_y>=? AND r.min_y<=? AND r.max_z>=? " \
+        "AND r.min_z<=?".format(", ".join("c."+col for col in COLUMNS), table)
+    sql+="".join(" AND "+c for c in clauses)
+    rows=con.execute(sql, [x-radius, x+radius, y-radius, y+radius, z-radius, z+radius]+params).fetchall()
+
+    import pandas as pd
+    df=pd.DataFrame([r[:len(COLUMNS)] for r in rows], columns=COLUMNS)
+    boxes=np.asarray([r[len(COLUMNS):] for r in rows], dtype=float).reshape(-1, 3, 2)
+    gap=np.maximum(np.maximum(boxes[:, :, 0]-np.asarray(point), np.asarray(point)-boxes[:, :, 1]), 0)
+    df["distance_mm"]=np.sqrt((gap**2).sum(axis=1))
+    return df[df["distance_mm"]<=radius].sort_values("distance_mm").reset_index(drop=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Tue Oct 20 09:05:33 2026
+@author: Leela Srinivasan
+
+One-pass sweep over 3dClusterize connectivity (-NN), minimum cluster size (-clust_nvox) and the maximum cluster
+size used by compile_stats.filter_df. Each subject's candidate maps are labelled once per connectivity level;
+counts and volumes for every min/max size pair then come from one bincount of the component sizes.
+Output is a long subject x parameter table in summary/cluster_sweep.csv.
+
+Syntax:       pvs sweep [--pvs-root DIR] [--nn 1,2,3] [--min-sizes ...] [--max-sizes ...] [SUBJ ...]
+Dependencies: NumPy, SciPy, pandas, NiBabel
+"""
+
+import os
+import sys
+import argparse
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from .tiling import component_sizes
+from . import manifest
+
+
+HEMIS=["left", "right"]
+
+
+def main(argv=None):
+
+    args=parse_args(sys.argv[1:] if argv is None else argv)
+    nn_levels=[int(x) for x in args.nn.split(",")]
+    min_sizes=[int(x) for x in args.min_sizes.split(",")]
+    max_sizes=[int(x) for x in args.max_sizes.split(",")]
+    subjects=args.subjects or find_subjects(args.pvs_root)
+
+    df=sweep_cohort(args.pvs_root, subjects, nn_levels, min_sizes, max_sizes, workers=args.workers)
+    out=args.out or os.path.join(args.pvs_root, "summary", "cluster_sweep.csv")
+    df.to_csv(out, index=False)
+    print("Saving {} sweep rows for {} subjects to {}.".format(len(df), len(subjects), out))
+
+
+def parse_args(argv):
+    """
+
+    Parameters
+    ----------
+    argv : list
+        command line arguments.
+
+    Returns
+    -------
+    args : argparse.Namespace
+        parsed arguments.
+
+    """
+
+    parser=argparse.ArgumentParser(description="Sweep cluster connectivity and size thresholds in one pass.")
+    parser.add_argument("subjects", nargs="*", help="subjects to sweep (default: all with overlap masks)")
+    parser.add_argument("--pvs-root", default=manifest.PVS_ROOT, help="PVS project root")
+    parser.add_argument("--nn", default="1,2,3", help="comma separated -NN levels")
+    parser.add_argument("--min-sizes", default="1,2,3,4,5,6,8,10", help="comma separated minimum sizes in voxels")
+    parser.add_argument("--max-sizes", default="100,200,300,500,750,1000", help="comma separated maximum sizes")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="number of worker processes")
+    parser.add_argument("--out", default=None, help="output CSV (default summary/cluster_sweep.csv)")
+    return parser.parse_args(argv)
+
+
+def candidate_path(pvs_dir, hemi):
+    """
+
+    Parameters
+    ----------
+    pvs_dir : str
+        path to subject PVS dir.
+    hemi : str
+        left/right.
+
+    Returns
+    -------
+    str or None
+        candidate map the subject was clustered from: T2/T1 ratio (ratio mode, also when intersected with the
+        GM map), vesselness (vessel mode) or GM-within-WM (seg mode).
+
+    """
+
+    overlap_dir=os.path.join(pvs_dir, "t1", "overlap_masks")
+    for prefix in ["ratio_within", "vessel_within", "gm_within"]:
+        f=os.path.join(overlap_dir, "{}_{}_cerebral_white_matter.nii".format(prefix, hemi))
+        if os.path.exists(f):
+            return f
+    return None
+
+
+def find_subjects(pvs_root):
+    """
+
+    Parameters
+    ----------
+    pvs_root : str
+        PVS project root.
+
+    Returns
+    -------
+    list
+        subjects with at least one candidate map.
+
+    """
+
+    return sorted(s for s in os.listdir(pvs_root)
+                  if any(candidate_path(os.path.join(pvs_root, s), hemi) for hemi in HEMIS))
+
+
+def sweep_cohort(pvs_root, subjects, nn_levels, min_sizes, max_sizes, workers=1):
+    """
+
+    Parameters
+    ----------
+    pvs_root : str
+        PVS project root.
+    subjects : list
+        subjects to sweep.
+    nn_levels : list
+        connectivity levels.
+    min_sizes : list
+        minimum cluster sizes.
+    max_sizes : list
+        maximum cluster sizes.
+    workers : int
+        number of worker processes.
+
+    Returns
+    -------
+    df : df
+        one row per subject, hemisphere and parameter combination.
+
+    """
+
+    jobs=[(subj, os.path.join(pvs_root, subj), nn_levels, min_sizes, max_sizes) for subj in subjects]
+    with ProcessPoolExecutor(max_workers=max(1, workers)) as pool:
+        frames=[df for df in pool.map(sweep_subject, jobs) if len(df)]
+    if len(frames)==0:
+        return pd.DataFrame()
+    return pd.concat(frames, ignore_index=True)
+
+
+def sweep_subject(job):
+    """
+
+    Parameters
+    ----------
+    job : tuple
+        (subj, pvs_dir, nn_levels, min_sizes, max_sizes).
+
+    Returns
+    -------
+    df : df
+        sweep rows for one subject.
+
+    """
+
+    subj, pvs_dir, nn_levels, min_sizes, max_sizes=job
+    frames=[]
+    for hemi in HEMIS:
+        f=candidate_path(pvs_dir, hemi)
+        if f is None:
+            continue
+        for nn in nn_levels:
+            df=size_grid(component_sizes(f, nn=nn), min_sizes, max_sizes)
+            df.insert(0, "nn", nn)
+            df.insert(0, "hemi", hemi)
+            df.insert(0, "pnum", subj)
+            frames.append(df)
+    if len(frames)==0:
+        return pd.DataFrame()
+    return pd.concat(frames, ignore_index=True)
+
+
+def size_grid(sizes, min_sizes, max_sizes):
+    """
+    Counts and volumes for every (min, max) size pair from one bincount: with h[s] clusters of size s,
+    cumulative sums of h and s*h give any size window as a difference of two entries.
+
+    Parameters
+    ----------
+    sizes : array
+        voxels per connected component.
+    min_sizes : list
+        minimum cluster sizes (-clust_nvox).
+    max_sizes : list
+        maximum cluster sizes (filter_df).
+
+    Returns
+    -------
+    df : df
+        'min_size', 'max_size', 'count', 'volume', 'mean_volume', and 'dropped' where, as in filter_df,
+        a cluster larger than max_size excludes the subject.
+
+    """
+
+    sizes=np.asarray(sizes, dtype=np.int64)
+    top=max([int(sizes.max()) if len(sizes) else 0]+list(max_sizes)+list(min_sizes))
+    hist=np.bincount(sizes, minlength=top+1)
+    n_cum=np.cumsum(hist)
+    v_cum=np.cumsum(hist*np.arange(top+1))
+    largest=int(sizes.max()) if len(sizes) else 0
+
+    lo=np.repeat(np.asarray(min_sizes), len(max_sizes))
+    hi=np.tile(np.asarray(max_sizes), len(min_sizes))
+    below=np.maximum(lo-1, 0)
+    count=np.where(hi>=lo, n_cum[hi]-n_cum[below], 0)
+    volume=np.where(hi>=lo, v_cum[hi]-v_cum[below], 0)
+
+    #filter_df drops the subject when its largest surviving cluster exceeds the maximum
+    dropped=(largest>hi) & (largest>=lo)
+    return pd.DataFrame({"min_size": lo,
+                         "max_size": hi,
+                         "count": count,
+                         "volume": volume,
+                         "mean_volume": np.divide(volume, count, out=np.zeros(len(count)), where=count>0),
+                         "dropped": dropped})
+
+
+if __name__ == "__main__":
+    main()
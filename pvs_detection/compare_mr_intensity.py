@@ -5,37 +5,41 @@ Created on Wed May 28 15:46:35 2025
 @author: Leela Srinivasan
 
 Compare t2/t1 voxel intensity ranges in detected PVS structures, clinician determined PVS structures, and eroded WM hemispheric masks.
-Dependencies: AFNI, Matplotlib
+Intensities are gathered in memory-capped z-slabs (see tiling.py) rather than through 3dcalc .1D round trips;
+cluster and clinician maps are read through their sparse voxel lists (see sparse_maps.py).
+The gathered arrays hold only the voxels inside each mask. The old .1D dumps were whole-volume vectors with zeros
+outside the mask, so the plots no longer carry a pile of points at the origin and calc_ratios returns one flag per
+masked voxel rather than one per grid voxel (the zeros were already left out of its mean and standard deviation).
+Dependencies: Matplotlib, NiBabel
 """
 
 import os
 import sys
-import subprocess
-import numpy as np
 import matplotlib.pyplot as plt
-from scipy.stats import zscore
+from . import manifest, ratio_detect, sparse_maps
+from .tiling import gather_tiled
+from .profiling import timed
     
 
-def main():
-    subj=sys.argv[1]
+def main(argv=None):
+    subj=(sys.argv[1:] if argv is None else argv)[0]
     pvs_dir, t1, t2=init(subj)
     for hemi in ["left", "right"]:
         
         
-        #Generate and read 1d files, check for clinician drawn ROI mask and read
-        mask=generate_1d(pvs_dir, hemi, t1, t2)
-        t1_pvs, t2_pvs, t1_wm, t2_wm=read_1d(pvs_dir, hemi)    
+        #Gather intensities, check for clinician drawn ROI mask and gather
+        mask, t1_pvs, t2_pvs, t1_wm, t2_wm=extract_intensities(pvs_dir, hemi, t1, t2)
         manual_exists, t1_man, t2_man=manual_validation(pvs_dir, hemi, mask, t1, t2)
         
         
-        #Plot with or without manual validation mask / clear 1D hemi files from dir
+        #Plot with or without manual validation mask
         if manual_exists:
             plot_intensities_with_validation(pvs_dir, t1_pvs, t2_pvs, t1_wm, t2_wm, t1_man, t2_man, hemi, subj)
         else:
             plot_intensities(pvs_dir, t1_pvs, t2_pvs, t1_wm, t2_wm, hemi, subj)   
-        clear_1d(pvs_dir,hemi)
         
         
+@timed
 def init(subj):
     """
 
@@ -54,8 +58,7 @@ def init(subj):
         path to t2 nifti.
 
     """
-    pvs_base='/Volumes/Shares/NEU/Projects/PVS/'
-    pvs_dir=os.path.join(pvs_base, subj)
+    pvs_dir=manifest.lookup(subj)["pvs_dir"]
     
     t1=os.path.join(pvs_dir, "t1", "clusters", "aligned_t1.nii")
     t2=os.path.join(pvs_dir, "t1", "clusters", "aligned_t2.nii")
@@ -63,122 +66,28 @@ def init(subj):
     return pvs_dir, t1, t2
     
 
-def run_3dcalc(a, b, o):
-    """
-
-    Parameters
-    ----------
-    a : str
-        path to input dataset 1.
-    b : str
-        path to input dataset 2.
-    o : str
-        path to output dataset.
-
-    Returns
-    -------
-    None.
-
-    """
-    
-    cmd="3dcalc -a {} -b {} -expr 'a*step(b)' -prefix {}"
-    cmd=cmd.format(a,b,o)
-    subprocess.run(cmd, shell=True)
-    
-    
-def read_1d(pvs_dir, hemi):
-    """
-
-    Parameters
-    ----------
-    pvs_dir : str
-        path to subject PVS dir..
-    hemi : str
-        left/right.
-
-    Returns
-    -------
-    t1_pvs : array
-        intensity values for detected PVS areas from the t1.
-    t2_pvs : array
-        intensity values for detected PVS areas from the t2.
-    t1_wm : array
-        intensity values for the eroded mask from the t1.
-    t2_wm : array
-        intensity values for the eroded mask from the t2.
-
-    """
-    
-    
-    clust_dir=os.path.join(pvs_dir, "t1", "clusters")
-    
-    f1=os.path.join(clust_dir, "t1_{}_pvs.1D".format(hemi))
-    t1_pvs = np.genfromtxt(f1)
-    
-    f2=os.path.join(clust_dir, "t2_{}_pvs.1D".format(hemi))
-    t2_pvs = np.genfromtxt(f2)
-    
-    f3=os.path.join(clust_dir,"{}wm_t1_intensities.1D".format(hemi))
-    t1_wm=np.genfromtxt(f3)
-                        
-    f4=os.path.join(clust_dir,"{}wm_t2_intensities.1D".format(hemi))
-    t2_wm=np.genfromtxt(f4)
-    
-    return t1_pvs, t2_pvs, t1_wm, t2_wm
-
-
 def calc_ratios(t1_wm, t2_wm):
     """
 
     Parameters
     ----------
     t1_wm : array
-        intensity values for the eroded mask from the t1.
+        intensity values at the eroded mask's voxels from the t1.
     t2_wm : array
-        intensity values for the eroded mask from the t2.
+        intensity values at the eroded mask's voxels from the t2.
 
     Returns
     -------
-    None. Saves to txt file.
+    array
+        1 where the T2/T1 ratio is a z>2 outlier within the mask, else 0, one entry per masked voxel (the old
+        whole-volume output padded the outside of the mask with 0); see ratio_detect.py for the volumetric mode.
 
     """
     
-    ratios=np.divide(t2_wm, t1_wm, out=np.zeros_like(t2_wm), where=t1_wm!=0)
-    ratios[ratios==0]=np.nan
-    z=zscore(ratios, nan_policy="omit")
-    binary_1D=np.array(z>2, dtype=int)
-    
-    o='/Volumes/Shares/NEU/Projects/PVS/p38/t1/clusters/o.txt'
-    np.savetxt(o, binary_1D, fmt='%d', newline='\n')
+    return ratio_detect.ratio_outliers(t1_wm, t2_wm, z=2)
 
     
 
-def clear_1d(pvs_dir, hemi):
-    """
-
-    Parameters
-    ----------
-    pvs_dir : str
-        path to subject PVS dir.
-
-    Returns
-    -------
-    None. Clears 1D files from dir.
-
-    """
-    
-    print("Clearing temporary 1D files...")
-    clust_dir=os.path.join(pvs_dir, "t1", "clusters")
-    for res in ["t1", "t2"]:
-        f_list=["{}_{}_pvs.1D".format(res, hemi),
-                "{}wm_{}_intensities.1D".format(hemi, res),
-                "{}_manual_{}.1D".format(res,hemi)]
-        
-        for f in f_list:
-            if f in os.listdir(clust_dir):
-                os.remove(os.path.join(clust_dir, f))
-        
-        
 def create_verification_nii(clust_dir):
     """
 
@@ -193,13 +102,10 @@ def create_verification_nii(clust_dir):
 
     """
     
-    os.chdir(clust_dir)
-    cmd1='3dcalc -a pvs_within_left_cerebral_white_matter.nii -b pvs_within_right_cerebral_white_matter.nii -expr "step(a)+step(b)" -prefix pvs_both.nii'
-    subprocess.run(cmd1, shell=True)
-    cmd2='3dcalc -a pvs_both.nii -b manpvs.nii -expr "step(a)+2*(step(b))" -prefix merged_pvs.nii'
-    subprocess.run(cmd2, shell=True)
+    sparse_maps.create_verification_map(clust_dir)
     
     
+@timed
 def manual_validation(pvs_dir, hemi, mask, t1, t2):
     """
 
@@ -220,10 +126,10 @@ def manual_validation(pvs_dir, hemi, mask, t1, t2):
     -------
     bool
         True/False to plot manual validation markers.
-    TYPE
-        Manual markers on t1 in 1d format or None if n/a.
-    TYPE
-        Manual markers on t2 in 1d format or None if n/a.
+    array
+        t1 intensities at the manual marker voxels inside the eroded mask only, or None if n/a.
+    array
+        t2 intensities at the manual marker voxels inside the eroded mask only, or None if n/a.
 
     """
     
@@ -233,23 +139,17 @@ def manual_validation(pvs_dir, hemi, mask, t1, t2):
     if "manpvs.nii" in os.listdir(clust_dir):
         
         #Restrict to one hemi's eroded interior
-        o1=os.path.join(pvs_dir, "t1", "clusters", "manual_{}.nii".format(hemi))
-        run_3dcalc(manual_mask, mask, o1)
-        
-        o2=os.path.join(pvs_dir, "t1", "clusters", "t1_manual_{}.1D".format(hemi))
-        run_3dcalc(t1, o1, o2)
-        
-        o3=os.path.join(pvs_dir, "t1", "clusters", "t2_manual_{}.1D".format(hemi))
-        run_3dcalc(t2, o1, o3)
-        
-        t1_man_1d = np.genfromtxt(o2)
-        t2_man_1d = np.genfromtxt(o3)
+        manual=sparse_maps.load_or_build(manual_mask)
+        index=manual.index[sparse_maps.gather(mask, manual.index, manual.shape)>0]
+        t1_man_1d=sparse_maps.gather(t1, index, manual.shape)
+        t2_man_1d=sparse_maps.gather(t2, index, manual.shape)
         
         create_verification_nii(clust_dir)
         return True, t1_man_1d, t2_man_1d
     return False, None, None
         
     
+@timed
 def plot_intensities(pvs_dir, t1_pvs, t2_pvs, t1_wm, t2_wm, hemi, subj):
     """
 
@@ -282,6 +182,7 @@ def plot_intensities(pvs_dir, t1_pvs, t2_pvs, t1_wm, t2_wm, hemi, subj):
     print("Saving plot to subject's PVS clusters directory.")
     
     
+@timed
 def plot_intensities_with_validation(pvs_dir, t1_pvs, t2_pvs, t1_wm, t2_wm, t1_man, t2_man, hemi, subj):
     """
 
@@ -317,7 +218,8 @@ def plot_intensities_with_validation(pvs_dir, t1_pvs, t2_pvs, t1_wm, t2_wm, t1_m
     print("Saving plot to subject's PVS clusters directory.")
   
     
-def generate_1d(pvs_dir, hemi, t1, t2):
+@timed
+def extract_intensities(pvs_dir, hemi, t1, t2):
     """
 
     Parameters
@@ -335,24 +237,27 @@ def generate_1d(pvs_dir, hemi, t1, t2):
     -------
     mask : str
         path to eroded wm hemispheric mask.
+    t1_pvs : array
+        intensity values at detected PVS voxels only from the t1.
+    t2_pvs : array
+        intensity values at detected PVS voxels only from the t2.
+    t1_wm : array
+        intensity values at the eroded mask's voxels only from the t1 (no zero padding outside the mask).
+    t2_wm : array
+        intensity values at the eroded mask's voxels only from the t2 (no zero padding outside the mask).
 
     """
     
     mask=os.path.join(pvs_dir, "eroded_masks", "eroded_{}_cerebral_white_matter.nii".format(hemi))
-    o1=os.path.join(pvs_dir, "t1", "clusters", "{}wm_t1_intensities.1D".format(hemi))
-    o2=os.path.join(pvs_dir, "t1", "clusters", "{}wm_t2_intensities.1D".format(hemi))
-    
-    run_3dcalc(t1, mask, o1)
-    run_3dcalc(t2, mask, o2)
+    t1_wm=gather_tiled(t1, mask)
+    t2_wm=gather_tiled(t2, mask)
     
     pvs=os.path.join(pvs_dir, "t1", "clusters", "pvs_within_{}_cerebral_white_matter.nii".format(hemi))
-    o3=os.path.join(pvs_dir, "t1", "clusters", "t1_{}_pvs.1D".format(hemi))
-    o4=os.path.join(pvs_dir, "t1", "clusters", "t2_{}_pvs.1D".format(hemi))
-    
-    run_3dcalc(t1, pvs, o3)
-    run_3dcalc(t2, pvs, o4)
+    clusters=sparse_maps.load_or_build(pvs)
+    t1_pvs=sparse_maps.gather(t1, clusters.index, clusters.shape)
+    t2_pvs=sparse_maps.gather(t2, clusters.index, clusters.shape)
     
-    return mask
+    return mask, t1_pvs, t2_pvs, t1_wm, t2_wm
     
       
 if __name__ == "__main__":
@@ -13,13 +13,22 @@ import subprocess
 import pandas as pd
 from datetime import datetime
 from dateutil.relativedelta import relativedelta
+from .regional_stats import region_group_stats
+from . import manifest
+from .profiling import timed
+from . import stats_service
 
 
-def main(): 
+#Subjects whose largest cluster exceeds this many voxels are dropped; pick it with cluster_sweep.py
+MAX_PVS_VOLUME=int(os.environ.get("PVS_MAX_CLUSTER_VOX", 500))
+
+
+def main(argv=None): 
     integrate_pvs_excel()
     write_hv_excel()
     
 
+@timed
 def compute_binary_volume(eroded_mask_dir):
     """
     Compute the volume of binary eroded white matter volumetric masks.
@@ -45,6 +54,7 @@ def compute_binary_volume(eroded_mask_dir):
             
 
 
+@timed
 def add_wm_volumes(ind, subj, df):
     """
 
@@ -68,7 +78,7 @@ def add_wm_volumes(ind, subj, df):
     """
     
     #Run 3dOverlap to calculate binary volumes
-    eroded_mask_dir="/Volumes/Shares/NEU/Projects/PVS/{}/eroded_masks".format(subj)
+    eroded_mask_dir=os.path.join(manifest.PVS_ROOT, subj, "eroded_masks")
     if not os.path.exists(eroded_mask_dir):
         return df #Return unedited
     
@@ -93,6 +103,39 @@ def add_wm_volumes(ind, subj, df):
     return df
         
 
+@timed
+def add_regional_stats(ind, subj, df):
+    """
+
+    Add basal ganglia, centrum semiovale etc. PVS counts/volumes from the subject's regional_pvs.csv
+    (regional_stats.py)
+
+
+    Parameters
+    ----------
+    ind : int
+        row number corresponding to subject.
+    subj : str
+        p***.
+    df : df
+        summary df.
+
+    Returns
+    -------
+    df : df
+        updated summary df.
+
+    """
+    
+    f=os.path.join(manifest.PVS_ROOT, subj, "t1", "csv", "regional_pvs.csv")
+    if not os.path.exists(f):
+        return df #Return unedited
+    
+    for colname, value in region_group_stats(pd.read_csv(f)).items():
+        df.loc[ind, colname]=value
+    return df
+
+
 def filter_df(df):
     """
     
@@ -113,11 +156,12 @@ def filter_df(df):
     """
     
     
-    if df.loc[0, "#Volume"]>500:
+    if df.loc[0, "#Volume"]>MAX_PVS_VOLUME:
         return True, df
-    return False, df[df["#Volume"] <= 500 ]
+    return False, df[df["#Volume"] <= MAX_PVS_VOLUME ]
 
 
+@timed
 def key_to_list():
     """
 
@@ -128,7 +172,7 @@ def key_to_list():
 
     """
     
-    fp='/Volumes/Shares/NEU/Scripts_and_Parameters/14N0061_key'
+    fp=manifest.KEY_FILE
     try:
         with open(fp, "r") as file:
             key_list = file.read().splitlines()
@@ -209,6 +253,7 @@ def convert_str_to_datetime(date):
     return date_obj
 
 
+@timed
 def find_date_from_readme(mri_folder):
     """
     
@@ -268,6 +313,7 @@ def hyphenate_date(date):
     return None
 
     
+@timed
 def get_mri_acq_date(subj):
     """
     
@@ -287,8 +333,8 @@ def get_mri_acq_date(subj):
     """
     
     
-    mri_default_dir='/Volumes/Shares/NEU/Raw_Data/Multicontrast_MRI/Patients/'
-    mri_alt_dir='/Volumes/Shares/NEU/Raw_Data/Other_MRI/Patients/'
+    mri_default_dir=os.path.join(manifest.NEU_DIR, "Raw_Data", "Multicontrast_MRI", "Patients")
+    mri_alt_dir=os.path.join(manifest.NEU_DIR, "Raw_Data", "Other_MRI", "Patients")
     name=subj_to_name(subj)
 
     
@@ -311,6 +357,7 @@ def get_mri_acq_date(subj):
     return None, None
         
     
+@timed
 def read_subj_csvs(subj):
     """
     Read and compute summary stats for PVS data, if pipeline has been run on subj
@@ -326,7 +373,7 @@ def read_subj_csvs(subj):
         statistics list with PVS count, volume, and average volume for each hemi.
 
     """
-    pvs_root='/Volumes/Shares/NEU/Projects/PVS/'
+    pvs_root=manifest.PVS_ROOT
     csv_dir=os.path.join(pvs_root,subj,'t1', 'csv')
     if os.path.exists(csv_dir):
         
@@ -358,6 +405,7 @@ def read_subj_csvs(subj):
     return None
            
 
+@timed
 def read_pvs_excel():
     """
     Read raw excel, convert format and create new cols.
@@ -383,23 +431,31 @@ def read_pvs_excel():
     return pvs_df
     
 
+@timed
 def create_hv_df():
 
     
     cols=["Left WM Volume", "Right WM Volume", "Left PVS Count", "Left PVS Volume", "Left PVS Mean Volume", "Right PVS Count", "Right PVS Volume", "Right PVS Mean Volume"]
-    hv_df=pd.DataFrame(columns=cols)
-    pvs_root='/Volumes/Shares/NEU/Projects/PVS/'
-    
-    
-    for hv in os.listdir(pvs_root):
-        if 'hv' in hv:
-            stats=read_subj_csvs(hv)
-            if stats:
-                ind=len(hv_df)
-                for i in range(0,6):
-                    hv_df.loc[ind, cols[i+2]]=stats[i]
-                hv_df=add_wm_volumes(ind,hv,hv_df)
+    hv_df=pd.DataFrame(columns=["pnum"]+cols)
+    con=stats_service.connect()
+    
+    
+    #HV cohort from the manifest (hvs.txt before one is built) rather than matching dir names
+    for hv in manifest.group_subjects("hv"):
+        stats=read_subj_csvs(hv)
+        if stats:
+            ind=len(hv_df)
+            hv_df.loc[ind, "pnum"]=hv
+            for i in range(0,6):
+                hv_df.loc[ind, cols[i+2]]=stats[i]
+            hv_df=add_wm_volumes(ind,hv,hv_df)
+            hv_df=add_regional_stats(ind,hv,hv_df)
+            
+            
+            #Push the row to the query service store (stats_service.py) as soon as it is complete
+            stats_service.update_subject(con, hv, "hv", hv_df.loc[ind])
             
+    con.close()
     return hv_df
         
         
@@ -407,7 +463,7 @@ def write_hv_excel():
     
     
     hv_df=create_hv_df()
-    summary_dir='/Volumes/Shares/NEU/Projects/PVS/summary'
+    summary_dir=manifest.SUMMARY_DIR
     hv_df.to_excel(os.path.join(summary_dir, 'hv_stats.xlsx'))
     
     
@@ -431,6 +487,7 @@ def age_at_mri(dob, mri_date):
     return relativedelta(mri_date, dob).years
 
   
+@timed
 def update_date_info(ind, df, subj):
     """
 
@@ -463,6 +520,7 @@ def update_date_info(ind, df, subj):
     return df
 
         
+@timed
 def integrate_pvs_excel():
     """
 
@@ -473,6 +531,7 @@ def integrate_pvs_excel():
     new_cols=["Left WM Volume", "Right WM Volume", "Left PVS Count", "Left PVS Volume", "Left PVS Mean Volume", "Right PVS Count", "Right PVS Volume", "Right PVS Mean Volume"]
     for new_col in new_cols:
         pvs_df[new_col]=""
+    con=stats_service.connect()
         
     
     #Iterate through subjects, creating list of all possible lowercase names
@@ -490,10 +549,13 @@ def integrate_pvs_excel():
             if stat_list:
                for i in range(0,6):
                    pvs_df.loc[ind, new_cols[i+2]]=stat_list[i]
+               pvs_df=add_regional_stats(ind, subj, pvs_df)
+               stats_service.update_subject(con, subj, manifest.lookup(subj)["group"], pvs_df.loc[ind])
+    con.close()
         
         
     #Push to excel sheets
-    summary_dir='/Volumes/Shares/NEU/Projects/PVS/summary'
+    summary_dir=manifest.SUMMARY_DIR
     pvs_df.to_excel(os.path.join(summary_dir, 'integrated_pvs_project.xlsx'))
     subset_df=pvs_df[pvs_df["Left PVS Count"] != ""]
     subset_df.to_excel(os.path.join(summary_dir, 'subset_pvs_project.xlsx'))
@@ -6,6 +6,8 @@ Created on Mon Mar 3 16:11:24 2025
 
 Description: Pull desired segmentations from FreeSurfer, convert to nifti format and perform hemispheric merge.
 Output to working PVS directory.
+With --tiled, masks are binarized from aseg.mgz in memory-capped z-slabs (see tiling.py) instead of mri_binarize/mri_convert.
+With --session SES, masks come from that FreeSurfer session into its session run (see longitudinal.py).
 
 Dependencies: FreeSurfer (recon-all run), AFNI/SUMA
 
@@ -15,20 +17,26 @@ import sys
 import os
 import shutil
 import subprocess
+from .tiling import binarize_tiled
+from . import manifest
 
 
-def main():
+def main(argv=None):
     
     #Read args
-    subj=sys.argv[1]
+    argv=sys.argv[1:] if argv is None else argv
+    subj=argv[0]
     
     
     #Set internal paths
-    pvs_dir="/Volumes/Shares/NEU/Projects/PVS/{}".format(subj)
-    pvs_masks_dir=os.path.join(pvs_dir, "masks")
+    if "--session" in argv[1:]:
+        paths=manifest.session_paths(subj, argv[argv.index("--session")+1])
+        pvs_masks_dir, fs_mri_dir=paths["masks"], paths["fs_mri"]
+    else:
+        pvs_masks_dir=manifest.lookup(subj)["masks"]
+        session, fs_subj_dir, fs_mri_dir=set_freesurfer_paths(subj)
     if not os.path.exists(pvs_masks_dir):
         raise Exception("PVS Project Masks Directory does not exist. Exiting...")
-    session, fs_subj_dir, fs_mri_dir=set_freesurfer_paths(subj)
     
     
     """
@@ -38,7 +46,10 @@ def main():
     fs_colorlut=[(2, "left_cerebral_white_matter"),
                  (41, "right_cerebral_white_matter")]
     
-    binarize_and_convert_masks(fs_mri_dir, pvs_masks_dir, fs_colorlut)
+    if "--tiled" in argv[1:]:
+        binarize_masks_tiled(fs_mri_dir, pvs_masks_dir, fs_colorlut)
+    else:
+        binarize_and_convert_masks(fs_mri_dir, pvs_masks_dir, fs_colorlut)
     
   
 def set_freesurfer_paths(subj):
@@ -65,17 +76,11 @@ def set_freesurfer_paths(subj):
 
     """
 
-    fs_dir="/Volumes/Shares/NEU/Data/derivatives/freesurfer-6.0.0/"
-    if os.path.exists(os.path.join(fs_dir, "sub-{}_ses-clinical".format(subj))):
-        session="ses-clinical"
-    elif os.path.exists(os.path.join(fs_dir, "sub-{}_ses-altclinical".format(subj))):
-        session="ses-altclinical"
-    else:
+    #Session and paths from the cohort manifest (see manifest.py)
+    paths=manifest.lookup(subj)
+    if not paths["ses"]:
         raise Exception("Subject Freesurfer directory not found. Exiting...")
-    
-    fs_subj_dir=os.path.join(fs_dir, "sub-{}_{}".format(subj, session))
-    fs_mri_dir=os.path.join(fs_subj_dir, "mri")
-    return session, fs_subj_dir, fs_mri_dir
+    return "ses-{}".format(paths["ses"]), paths["fs_dir"], paths["fs_mri"]
     
 
 def binarize_and_convert_masks(fs_mri_dir, wdir, matches):
@@ -106,14 +111,40 @@ def binarize_and_convert_masks(fs_mri_dir, wdir, matches):
             cmd1=cmd1.format(match, label)
             subprocess.run(cmd1, shell=True)
             
-            #Convert the mask to nifti format
-            cmd2 = "mri_convert {}.mgz {}.nii"
+            #Convert the mask to nifti format (uchar rather than mri_binarize's int)
+            cmd2 = "mri_convert -odt uchar {}.mgz {}.nii"
             cmd2=cmd2.format(label, label)
             subprocess.run(cmd2, shell=True)
             
             #Remove/move mask files
             os.remove(os.path.join(fs_mri_dir, "{}.mgz".format(label)))
             shutil.move(os.path.join(fs_mri_dir, "{}.nii".format(label)),os.path.join(wdir, "{}.nii".format(label)))
+
+
+def binarize_masks_tiled(fs_mri_dir, wdir, matches):
+    """
+
+    Parameters
+    ----------
+    fs_mri_dir : str
+        path to subject's FreeSurfer mri subdir.
+    wdir : str
+        working directory (in this case, pvs Project dir).
+    matches : list
+        list of ordered pairs.
+        Refer to https://surfer.nmr.mgh.harvard.edu/fswiki/FsTutorial/AnatomicalROI/FreeSurferColorLUT
+
+    Returns
+    -------
+    None.
+
+    """
+    
+    aseg=os.path.join(fs_mri_dir, "aseg.mgz")
+    for match, label in matches:
+        out=os.path.join(wdir, "{}.nii".format(label))
+        if not os.path.exists(out):
+            binarize_tiled(aseg, [match], out)
         
         
 if __name__ == "__main__":
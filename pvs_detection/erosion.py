@@ -0,0 +1,339 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Tue Oct 20 11:47:12 2026
+@author: Leela Srinivasan
+
+Distance-map based erosion of the FreeSurfer WM masks.
+One Euclidean distance-to-boundary map (mm) is computed and cached per mask; eroding to any depth, including
+fractional mm, is then a threshold of that map (voxels deeper than the depth survive). Depth sensitivity stats
+(WM volume, PVS count/volume per depth) come from the same maps without new AFNI passes.
+The Euclidean threshold approximates the previous '3dmask_tool -dilate_input -2' rather than reproducing it. Two
+face-connected erosion steps keep a voxel whose nearest background voxel is (1,1,1) away (3 steps), while the
+distance map puts it at sqrt(3) = 1.73 mm and a 2 mm erosion removes it. The Euclidean distance never exceeds the
+step count, so on a 1 mm grid the eroded masks are a subset of the AFNI ones, smaller only next to concave corners
+and one-voxel holes of the mask.
+Maps are stored as uint16 with a 0.01 mm scl_slope.
+
+Syntax:       pvs erosion distance MASKS_DIR DIST_DIR [--mask NAME.nii ...]
+              pvs erosion erode MASKS_DIR DIST_DIR ERODED_DIR DEPTH_MM [--mask NAME.nii ...]
+              pvs erosion depth-stats DIST_MAP CANDIDATE OUT_CSV [--depths 1,2,3,4] [--label 2]
+
+Dependencies: NumPy, SciPy, NiBabel, pandas
+"""
+
+import os
+import sys
+import argparse
+import numpy as np
+import pandas as pd
+import nibabel as nib
+from scipy.ndimage import distance_transform_edt
+from .tiling import DEFAULT_MAX_MEM_MB, plan_slab_depth, slab_bounds, read_slab, open_nifti_writer, write_slab, \
+    mask_bbox, component_sizes, load_image
+
+
+#Distance maps are quantized to this many mm per integer step
+DIST_QUANTUM=0.01
+
+
+def main(argv=None):
+
+    args=parse_args(sys.argv[1:] if argv is None else argv)
+    if args.command=="distance":
+        for f in list_masks(args.masks_dir, args.mask):
+            out=distance_path(args.dist_dir, f)
+            if not is_current(out, f):
+                print("Computing distance map for {}.".format(os.path.basename(f)))
+                distance_map(f, out)
+
+    elif args.command=="erode":
+        for f in list_masks(args.masks_dir, args.mask):
+            out=os.path.join(args.eroded_dir, "eroded_{}".format(os.path.basename(f)))
+            nvox=erode(distance_path(args.dist_dir, f), args.depth, out)
+            print("Eroded {} to {} mm: {} voxels.".format(os.path.basename(f), args.depth, nvox))
+
+    elif args.command=="depth-stats":
+        depths=[float(x) for x in args.depths.split(",")]
+        df=depth_stats(args.dist_map, args.candidate, depths, label=args.label, nn=args.nn,
+                       min_size=args.min_size, max_size=args.max_size)
+        df.to_csv(args.out, index=False)
+
+
+def parse_args(argv):
+    """
+
+    Parameters
+    ----------
+    argv : list
+        command line arguments.
+
+    Returns
+    -------
+    args : argparse.Namespace
+        parsed arguments.
+
+    """
+
+    parser=argparse.ArgumentParser(description="Distance-map based erosion of WM masks.")
+    sub=parser.add_subparsers(dest="command", required=True)
+
+    p=sub.add_parser("distance", help="compute/cache distance maps for every mask")
+    p.add_argument("masks_dir")
+    p.add_argument("dist_dir")
+    p.add_argument("--mask", action="append", default=None, help="only this mask file name (repeatable)")
+
+    p=sub.add_parser("erode", help="threshold cached distance maps into eroded masks")
+    p.add_argument("masks_dir")
+    p.add_argument("dist_dir")
+    p.add_argument("eroded_dir")
+    p.add_argument("depth", type=float, help="erosion depth in mm")
+    p.add_argument("--mask", action="append", default=None, help="only this mask file name (repeatable)")
+
+    p=sub.add_parser("depth-stats", help="WM volume and PVS clusters at several depths")
+    p.add_argument("dist_map")
+    p.add_argument("candidate", help="candidate map, or 3dSeg Classes with --label")
+    p.add_argument("out")
+    p.add_argument("--depths", default="1,2,3,4", help="comma separated depths in mm")
+    p.add_argument("--label", type=int, default=None, help="class value to cluster (GM=2 for Classes)")
+    p.add_argument("--nn", type=int, default=int(os.environ.get("PVS_NN", 1)))
+    p.add_argument("--min-size", type=int, default=int(os.environ.get("PVS_CLUST_NVOX", 2)))
+    p.add_argument("--max-size", type=int, default=int(os.environ.get("PVS_MAX_CLUSTER_VOX", 500)))
+    return parser.parse_args(argv)
+
+
+def list_masks(masks_dir, names=None):
+    """
+
+    Parameters
+    ----------
+    masks_dir : str
+        dir of binary FreeSurfer masks.
+    names : list
+        mask file names to keep (default all), so hemispheres can be processed independently.
+
+    Returns
+    -------
+    list
+        paths to *.nii masks.
+
+    """
+
+    return sorted(os.path.join(masks_dir, f) for f in os.listdir(masks_dir)
+                  if f.endswith(".nii") and (names is None or f in names))
+
+
+def distance_path(dist_dir, mask):
+    """
+
+    Parameters
+    ----------
+    dist_dir : str
+        distance map cache dir.
+    mask : str
+        path to mask.
+
+    Returns
+    -------
+    str
+        path to the mask's cached distance map.
+
+    """
+
+    return os.path.join(dist_dir, "distance_{}".format(os.path.basename(mask)))
+
+
+def is_current(out, src):
+    """
+
+    Parameters
+    ----------
+    out : str
+        derived file.
+    src : str
+        source file.
+
+    Returns
+    -------
+    bool
+        True if out exists and is at least as new as src.
+
+    """
+
+    return os.path.exists(out) and os.path.getmtime(out)>=os.path.getmtime(src)
+
+
+def distance_map(mask, out):
+    """
+
+    Parameters
+    ----------
+    mask : str
+        path to binary mask.
+    out : str
+        path to output distance map (mm to the nearest voxel outside the mask, 0 outside).
+
+    Returns
+    -------
+    None.
+
+    """
+
+    img=load_image(mask)
+    shape=img.shape[:3]
+    zooms=tuple(float(z) for z in img.header.get_zooms()[:3])
+
+
+    #Only the mask bounding box (+1 voxel of background) is transformed and held in memory
+    bbox=mask_bbox(mask, 1)
+    if bbox is None:
+        bbox=[(0, 0), (0, 0), (0, 0)]
+    (x0, x1), (y0, y1), (z0, z1)=bbox
+    dist=np.zeros((x1-x0, y1-y0, z1-z0), dtype=np.uint16)
+    if dist.size:
+        crop=read_slab(img, z0, z1, (x0, x1), (y0, y1))>0
+        d=distance_transform_edt(crop, sampling=zooms)
+        dist=np.minimum(np.round(d/DIST_QUANTUM), np.iinfo(np.uint16).max).astype(np.uint16)
+
+
+    f=open_nifti_writer(out, shape, img.affine, np.uint16, slope=DIST_QUANTUM)
+    try:
+        for z in range(shape[2]):
+            plane=np.zeros(shape[:2]+(1,), dtype=np.uint16)
+            if z0<=z<z1:
+                plane[x0:x1, y0:y1, 0]=dist[:, :, z-z0]
+            write_slab(f, plane, np.uint16)
+    finally:
+        f.close()
+
+
+def erode(dist_map, depth, out, max_mem_mb=DEFAULT_MAX_MEM_MB):
+    """
+
+    Parameters
+    ----------
+    dist_map : str
+        path to cached distance map.
+    depth : float
+        erosion depth in mm; voxels deeper than this survive. On a 1 mm grid, 2 approximates the previous
+        '3dmask_tool -dilate_input -2' (see the module docstring).
+    out : str
+        path to output uint8 eroded mask.
+    max_mem_mb : int
+        memory cap in MB.
+
+    Returns
+    -------
+    nvox : int
+        voxels in the eroded mask.
+
+    """
+
+    img=nib.load(dist_map)
+    shape=img.shape[:3]
+    depth_plan=plan_slab_depth(shape[:2], 8, max_mem_mb)
+    nvox=0
+    f=open_nifti_writer(out, shape, img.affine, np.uint8)
+    try:
+        for (z0, z1), _ in slab_bounds(0, shape[2], depth_plan):
+            m=read_slab(img, z0, z1)>depth_cutoff(depth)
+            nvox+=int(m.sum())
+            write_slab(f, m, np.uint8)
+    finally:
+        f.close()
+    return nvox
+
+
+def depth_cutoff(depth):
+    """
+
+    Parameters
+    ----------
+    depth : float
+        erosion depth in mm.
+
+    Returns
+    -------
+    float
+        cutoff on the quantized distance map; half a quantum above depth so exact distances (e.g. 2.00 mm)
+        are removed regardless of float rounding in the stored slope.
+
+    """
+
+    return depth+DIST_QUANTUM/2
+
+
+def eroded_volumes(dist_map, depths, max_mem_mb=DEFAULT_MAX_MEM_MB):
+    """
+
+    Parameters
+    ----------
+    dist_map : str
+        path to cached distance map.
+    depths : list
+        erosion depths in mm.
+    max_mem_mb : int
+        memory cap in MB.
+
+    Returns
+    -------
+    array
+        voxels surviving each depth, from one histogram of the quantized distances.
+
+    """
+
+    img=nib.load(dist_map)
+    shape=img.shape[:3]
+    hist=np.zeros(np.iinfo(np.uint16).max+1, dtype=np.int64)
+    for (z0, z1), _ in slab_bounds(0, shape[2], plan_slab_depth(shape[:2], 16, max_mem_mb)):
+        q=np.round(read_slab(img, z0, z1)/DIST_QUANTUM).astype(np.int64)
+        hist+=np.bincount(q[q>0], minlength=len(hist))
+
+    above=np.cumsum(hist[::-1])[::-1]
+    cut=np.floor(np.asarray(depths)/DIST_QUANTUM+0.5).astype(np.int64)+1
+    return above[np.clip(cut, 0, len(hist)-1)]
+
+
+def depth_stats(dist_map, candidate, depths, label=None, nn=1, min_size=2, max_size=500):
+    """
+
+    Parameters
+    ----------
+    dist_map : str
+        path to cached distance map for one hemisphere.
+    candidate : str
+        path to the candidate map, or 3dSeg Classes when label is given. A candidate already restricted to an
+        eroded mask only supports depths at or beyond that erosion.
+    depths : list
+        erosion depths in mm.
+    label : int
+        class value to cluster, if candidate is a label volume.
+    nn : int
+        AFNI neighbourhood.
+    min_size : int
+        minimum cluster size in voxels.
+    max_size : int
+        clusters above this are counted as in compile_stats.filter_df (subject flagged).
+
+    Returns
+    -------
+    df : df
+        per depth: WM voxels, PVS count, PVS volume and whether the largest cluster exceeds max_size.
+
+    """
+
+    wm=eroded_volumes(dist_map, depths)
+    rows=[]
+    for depth, wm_vox in zip(depths, wm):
+        sizes=component_sizes(candidate, nn=nn, within=dist_map, within_min=depth_cutoff(depth), label=label)
+        sizes=sizes[sizes>=min_size]
+        rows.append({"depth_mm": depth,
+                     "WM Volume": int(wm_vox),
+                     "PVS Count": int((sizes<=max_size).sum()),
+                     "PVS Volume": int(sizes[sizes<=max_size].sum()),
+                     "Exceeds Max": bool(len(sizes) and sizes.max()>max_size)})
+    return pd.DataFrame(rows)
+
+
+if __name__ == "__main__":
+    main()
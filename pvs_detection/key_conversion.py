@@ -9,16 +9,17 @@ Convert patient and HV names to p-numbers/hv codes.
 
 import os
 import pandas as pd
+from . import manifest
 
 
-def main():
+def main(argv=None):
     
     df=read_raw_pvs()
     key_list=read_key()
 
     pnums=[]
     missing=[]
-    odir='/Volumes/Shares/NEU/Projects/PVS/summary/'
+    odir=manifest.SUMMARY_DIR
     extract_hvs(key_list, odir)
 
 
@@ -74,7 +75,7 @@ def read_key():
 
     """
     
-    key_fp="/Volumes/Shares/NEU/Scripts_and_Parameters/14N0061_key"
+    key_fp=manifest.KEY_FILE
     try:
         with open(key_fp, "r") as file:
             key_list = file.read().splitlines()
@@ -0,0 +1,476 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Nov 9 11:18:52 2026
+@author: Leela Srinivasan
+
+Cross-session PVS correspondence.
+The primary run (t1/) uses the research t1 when there is one and the preferred FreeSurfer session otherwise; every
+other available session is processed here under <pvs_dir>/sessions/ses-<ses>: the clinical SurfVol when the
+primary used the research t1 (same FreeSurfer space, so the primary's masks are shared), and re-scans in other
+FreeSurfer sessions (own masks, SurfVol registered to the primary's with 3dAllineate; the matrix is kept in
+xfm/ and reused). Session runs of the whole cohort share one stage limit, as pvs pipeline does.
+
+Clusters are then matched per hemisphere in the primary's space: centroid candidates from a KD-tree within
+--max-dist mm plus voxel overlap pairs (session voxels mapped onto the primary grid), ranked by Dice then
+distance and kept where both clusters are each other's best. Matched clusters are persistent; unmatched ones are
+new (only in the later session) or vanished (only in the earlier). Sessions are ordered by BIDS scans.tsv
+acquisition time where known, else the primary run comes first.
+
+Syntax:       pvs longitudinal run [-m seg|vessel|ratio] [-c 3dseg|gmm] [-u 3dunifize|poly] [-t] [-j N] [SUBJ ...]
+              pvs longitudinal match [--max-dist MM] [--workers N] [--out CSV] [SUBJ ...]
+              (no SUBJ: every processed subject in the manifest with more than one session)
+Dependencies: NumPy, SciPy, pandas, NiBabel, AFNI
+"""
+
+import os
+import sys
+import asyncio
+import argparse
+import numpy as np
+import pandas as pd
+import nibabel as nib
+from scipy.spatial import cKDTree
+from concurrent.futures import ProcessPoolExecutor
+from . import manifest, sparse_maps, staging
+from .cluster_db import cluster_rows
+from .template_density import cluster_maps
+from .stage_runner import Stage, build_subject_graph, run_graph, report
+
+
+#AFNI matrices are in DICOM (RAI) coordinates; NIfTI world coordinates are RAS
+RAI=np.diag([-1.0, -1.0, 1.0, 1.0])
+
+
+def main(argv=None):
+
+    args=parse_args(sys.argv[1:] if argv is None else argv)
+    subjects=args.subjects or multi_session_subjects()
+
+    if args.command=="run":
+        statuses=asyncio.run(run_sessions(subjects, jobs=args.jobs, subject_jobs=args.subject_jobs, mode=args.mode,
+                                          classifier=args.classifier, unifize=args.unifize, tiled=args.tiled))
+        failed=["{} ses-{}".format(subj, ses) for (subj, ses), status in statuses.items() if status=="failed"]
+        print("++ {} session runs, {} failed ++".format(len(statuses), len(failed)))
+        if failed:
+            raise Exception("Session runs failed: {}. See their logs. Exiting...".format(", ".join(failed)))
+
+    elif args.command=="match":
+        df=match_cohort(subjects, max_dist=args.max_dist, workers=args.workers)
+        out=args.out or os.path.join(manifest.SUMMARY_DIR, "longitudinal.csv")
+        df.to_csv(out, index=False)
+        print("Saving cohort longitudinal table to {}.".format(out))
+
+
+def parse_args(argv):
+    """
+
+    Parameters
+    ----------
+    argv : list
+        command line arguments.
+
+    Returns
+    -------
+    args : argparse.Namespace
+        parsed arguments.
+
+    """
+
+    parser=argparse.ArgumentParser(description="Process every session and match PVS clusters across them.")
+    sub=parser.add_subparsers(dest="command", required=True)
+
+    p=sub.add_parser("run", help="process the sessions the primary run didn't use")
+    p.add_argument("subjects", nargs="*", help="subjects (default: processed subjects with more than one session)")
+    p.add_argument("-m", "--mode", default="seg", choices=["seg", "vessel", "ratio"])
+    p.add_argument("-c", "--classifier", default="3dseg", choices=["3dseg", "gmm"])
+    p.add_argument("-u", "--unifize", default="3dunifize", choices=["3dunifize", "poly"])
+    p.add_argument("-t", "--tiled", action="store_true")
+    p.add_argument("-j", "--jobs", type=int, default=4, help="stages at once across all session runs")
+    p.add_argument("--subject-jobs", type=int, default=2, help="session runs in flight")
+
+    p=sub.add_parser("match", help="match clusters across sessions and report persistent/new/vanished PVS")
+    p.add_argument("subjects", nargs="*", help="subjects (default: processed subjects with more than one session)")
+    p.add_argument("--max-dist", type=float, default=3.0, help="centroid match radius in mm")
+    p.add_argument("--workers", type=int, default=os.cpu_count(), help="subjects matched in parallel")
+    p.add_argument("--out", default=None, help="cohort CSV (default summary/longitudinal.csv)")
+    return parser.parse_args(argv)
+
+
+def extra_sessions(row):
+    """
+
+    Parameters
+    ----------
+    row : dict
+        manifest row.
+
+    Returns
+    -------
+    list
+        FreeSurfer sessions not used by the primary run: the other sessions, and the primary session itself when
+        the primary run used the research t1.
+
+    """
+
+    sessions=(row["sessions"] or "").split()
+    return [ses for ses in sessions if ses!=row["ses"] or row["has_research_t1"]]
+
+
+def multi_session_subjects():
+    """
+
+    Returns
+    -------
+    list
+        processed subjects in the manifest with at least one extra session.
+
+    """
+
+    if not os.path.exists(manifest.MANIFEST):
+        return []
+    rows=[manifest.lookup(subj) for subj in manifest.read_manifest()["subj"]]
+    return [row["subj"] for row in rows if row["processed"] and extra_sessions(row)]
+
+
+def prepare_session(paths):
+    """
+
+    Parameters
+    ----------
+    paths : dict
+        from manifest.session_paths.
+
+    Raises
+    ------
+    Exception
+        SurfVol or T2w missing for the session.
+
+    Returns
+    -------
+    None. Output dirs made and the session SurfVol staged (see staging.py).
+
+    """
+
+    for key in ["t1_dir", "masks", "eroded", "distance", "logs", "overlap", "clusters", "csv"]:
+        os.makedirs(paths[key], exist_ok=True)
+    inputs=staging.load_manifest(paths["inputs"])
+    if not os.path.exists(paths["surfvol_src"]):
+        raise Exception("SurfVol not found in FreeSurfer directory. Exiting...")
+    inputs["surfvol"]=staging.stage_file(paths["surfvol_src"], paths["surfvol"], inputs.get("surfvol"))
+    if not os.path.exists(paths["t2"]):
+        raise Exception("T2w image not found in BIDS anat directory. Exiting...")
+    inputs["t2"]=staging.in_place(paths["t2"], inputs.get("t2"))
+    staging.save_manifest(paths["inputs"], inputs)
+
+
+def session_graph(paths, **options):
+    """
+
+    Parameters
+    ----------
+    paths : dict
+        from manifest.session_paths.
+    **options :
+        detection options, as stage_runner.build_subject_graph.
+
+    Returns
+    -------
+    list
+        the subject stage graph for the session, plus its registration to the primary SurfVol when it is in
+        another FreeSurfer space (skipped once the matrix exists); the completion marker also waits on it.
+
+    """
+
+    stages=build_subject_graph(paths, **options)
+    if paths["xfm"]:
+        complete=stages.pop()
+        xfm_dir=os.path.dirname(paths["xfm"])
+        os.makedirs(xfm_dir, exist_ok=True)
+        stages.append(Stage("coregister", ["3dAllineate", "-base", paths["primary_surfvol"],
+                                           "-source", paths["surfvol_src"], "-1Dmatrix_save", paths["xfm"],
+                                           "-prefix", os.path.join(xfm_dir, "surfvol_in_primary.nii")],
+                            outputs=(paths["xfm"],)))
+        stages.append(complete._replace(deps=complete.deps+("coregister",)))
+    return stages
+
+
+async def run_sessions(subjects, jobs=4, subject_jobs=2, **options):
+    """
+
+    Parameters
+    ----------
+    subjects : list
+        subjects whose extra sessions are processed.
+    jobs : int
+        stages allowed to run at once across all session runs.
+    subject_jobs : int
+        session runs in flight at once.
+    **options :
+        detection options, as stage_runner.build_subject_graph.
+
+    Returns
+    -------
+    dict
+        (subject, session) -> done, skipped (already processed) or failed.
+
+    """
+
+    limit=asyncio.Semaphore(max(1, jobs))
+    slots=asyncio.Semaphore(max(1, subject_jobs))
+    loop=asyncio.get_running_loop()
+
+    async def run(subj, ses):
+        async with slots:
+            paths=manifest.session_paths(subj, ses)
+            if os.path.exists(paths["complete"]):
+                return "skipped"
+            print("++ Working on {} ses-{} ++".format(subj, ses))
+            try:
+                await loop.run_in_executor(None, prepare_session, paths)
+                stages=session_graph(paths, **options)
+            except Exception as e:
+                print("++ {} ses-{}: {} ++".format(subj, ses, e))
+                return "failed"
+            results=await run_graph(stages, paths["logs"], jobs=jobs, limit=limit)
+            report(results)
+            return "failed" if any(result[0]=="failed" for result in results.values()) else "done"
+
+    runs=[(subj, ses) for subj in subjects for ses in extra_sessions(manifest.lookup(subj))]
+    statuses=await asyncio.gather(*[run(subj, ses) for subj, ses in runs])
+    return dict(zip(runs, statuses))
+
+
+def read_afni_xfm(path):
+    """
+
+    Parameters
+    ----------
+    path : str
+        3dAllineate -1Dmatrix_save output (base to source, DICOM coordinates).
+
+    Returns
+    -------
+    array
+        4x4 matrix taking session (source) RAS to primary (base) RAS.
+
+    """
+
+    values=np.loadtxt(path, comments="#").ravel()[-12:]
+    base_to_source=np.vstack([values.reshape(3, 4), [0, 0, 0, 1]])
+    return RAI @ np.linalg.inv(base_to_source) @ RAI
+
+
+def resample_labels(sp, shape, affine, xfm=None):
+    """
+
+    Parameters
+    ----------
+    sp : SparseMap
+        session cluster map.
+    shape, affine :
+        primary grid.
+    xfm : array
+        4x4 session RAS to primary RAS, None for the identity.
+
+    Returns
+    -------
+    SparseMap
+        sp's voxels moved to their nearest primary voxel (first label wins where several land together).
+
+    """
+
+    if xfm is None and tuple(sp.shape[:3])==tuple(shape[:3]) and np.allclose(sp.affine, affine):
+        return sp
+    ijk=np.stack(np.unravel_index(sp.index, sp.shape[:3], order="F"), axis=1)
+    world=nib.affines.apply_affine(np.asarray(sp.affine), ijk)
+    if xfm is not None:
+        world=nib.affines.apply_affine(xfm, world)
+    dst=np.rint(nib.affines.apply_affine(np.linalg.inv(affine), world)).astype(np.int64)
+    inside=np.all((dst>=0) & (dst<np.asarray(shape[:3])), axis=1)
+    index=np.ravel_multi_index(tuple(dst[inside].T), shape[:3], order="F")
+    index, first=np.unique(index, return_index=True)
+    return sparse_maps.SparseMap(tuple(shape), affine, index, sp.label[inside][first])
+
+
+def match_clusters(a, b, xfm=None, max_dist=3.0):
+    """
+
+    Parameters
+    ----------
+    a : SparseMap
+        primary cluster map.
+    b : SparseMap
+        session cluster map.
+    xfm : array
+        4x4 session RAS to primary RAS, None when both share a FreeSurfer space.
+    max_dist : float
+        centroid match radius in mm.
+
+    Returns
+    -------
+    matches : df
+        one row per matched pair: labels, voxel counts, centroid distance (mm) and Dice on the primary grid.
+    unmatched_a, unmatched_b : array
+        labels left unmatched in a and in b.
+
+    """
+
+    ra, rb=cluster_rows(a), cluster_rows(b)
+    cm_a, cm_b=ra["cm"], rb["cm"]
+    if xfm is not None and len(cm_b):
+        cm_b=nib.affines.apply_affine(xfm, cm_b)
+
+
+    #Candidates: overlapping clusters, and nearest centroids within max_dist
+    pairs, counts=sparse_maps.label_overlap(a, resample_labels(b, a.shape, np.asarray(a.affine), xfm))
+    ia=np.searchsorted(ra["label"], pairs[:, 0])
+    ib=np.searchsorted(rb["label"], pairs[:, 1])
+    shared=counts.astype(float)
+    if len(cm_a) and len(cm_b):
+        dist, nearest=cKDTree(cm_a).query(cm_b, k=1, distance_upper_bound=max_dist)
+        near=np.isfinite(dist)
+        ia=np.concatenate([ia, nearest[near]])
+        ib=np.concatenate([ib, np.flatnonzero(near)])
+        shared=np.concatenate([shared, np.zeros(near.sum())])
+    ia, ib=ia.astype(np.int64), ib.astype(np.int64)
+
+
+    #Best candidate per cluster, by Dice then distance, kept where it's mutual
+    key=ia*max(len(cm_b), 1)+ib
+    order=np.lexsort((-shared, key))
+    first=np.r_[True, key[order][1:]!=key[order][:-1]] if len(key) else np.zeros(0, dtype=bool)
+    ia, ib, shared=ia[order][first], ib[order][first], shared[order][first]
+    dice=2*shared/(ra["voxels"][ia]+rb["voxels"][ib]) if len(ia) else np.zeros(0)
+    dist=np.linalg.norm(cm_a[ia]-cm_b[ib], axis=1) if len(ia) else np.zeros(0)
+    order=np.lexsort((dist, -dice))
+    ia, ib, dice, dist=ia[order], ib[order], dice[order], dist[order]
+    best_a=np.zeros(len(ia), dtype=bool)
+    best_a[np.unique(ia, return_index=True)[1]]=True
+    best_b=np.zeros(len(ib), dtype=bool)
+    best_b[np.unique(ib, return_index=True)[1]]=True
+    keep=best_a & best_b
+
+    matches=pd.DataFrame({"label_a": ra["label"][ia[keep]], "label_b": rb["label"][ib[keep]],
+                          "voxels_a": ra["voxels"][ia[keep]], "voxels_b": rb["voxels"][ib[keep]],
+                          "distance_mm": dist[keep], "dice": dice[keep]})
+    unmatched_a=np.setdiff1d(ra["label"], matches["label_a"].to_numpy())
+    unmatched_b=np.setdiff1d(rb["label"], matches["label_b"].to_numpy())
+    return matches, unmatched_a, unmatched_b
+
+
+def session_time(subj, ses):
+    """
+
+    Parameters
+    ----------
+    subj : str
+        p-number or hv code.
+    ses : str
+        BIDS session (clinical, altclinical or research).
+
+    Returns
+    -------
+    Timestamp or None
+        earliest acq_time in the session's BIDS scans.tsv, if recorded.
+
+    """
+
+    scans=os.path.join(manifest.BIDS_ROOT, "sub-{}".format(subj), "ses-{}".format(ses),
+                       "sub-{}_ses-{}_scans.tsv".format(subj, ses))
+    if not os.path.exists(scans):
+        return None
+    times=pd.to_datetime(pd.read_csv(scans, sep="\t").get("acq_time"), errors="coerce")
+    return None if times is None or times.isna().all() else times.min()
+
+
+def match_subject(subj, max_dist=3.0):
+    """
+
+    Parameters
+    ----------
+    subj : str
+        p-number or hv code.
+    max_dist : float
+        centroid match radius in mm.
+
+    Returns
+    -------
+    list
+        one summary dict per (session pair, hemisphere). Per-cluster matches are written to
+        <pvs_dir>/t1/csv/longitudinal_matches.csv.
+
+    """
+
+    row=manifest.lookup(subj)
+    primary="research" if row["has_research_t1"] else row["ses"]
+    summary=[]
+    details=[]
+    for ses in extra_sessions(row):
+        paths=manifest.session_paths(subj, ses)
+        xfm=None
+        if paths["xfm"]:
+            if not os.path.exists(paths["xfm"]):
+                print("Skipping {} ses-{}: no registration to the primary run yet.".format(subj, ses))
+                continue
+            xfm=read_afni_xfm(paths["xfm"])
+
+
+        #Earlier session first; new/vanished are relative to that order
+        t_primary, t_session=session_time(subj, primary), session_time(subj, ses)
+        swap=t_primary is not None and t_session is not None and t_session<t_primary
+        pairs={os.path.basename(f): f for f in cluster_maps(row["pvs_dir"])}
+        for f in cluster_maps(paths["pvs_dir"]):
+            name=os.path.basename(f)
+            if name not in pairs:
+                continue
+            a=sparse_maps.load_or_build(pairs[name])
+            b=sparse_maps.load_or_build(f)
+            matches, only_a, only_b=match_clusters(a, b, xfm, max_dist=max_dist)
+            hemi=name.split("_")[2]
+            earlier, later=(ses, primary) if swap else (primary, ses)
+            summary.append({"Subject": subj, "Hemisphere": hemi, "Earlier": earlier, "Later": later,
+                            "Earlier Clusters": len(matches)+len(only_a if not swap else only_b),
+                            "Later Clusters": len(matches)+len(only_b if not swap else only_a),
+                            "Persistent": len(matches),
+                            "New": len(only_a if swap else only_b),
+                            "Vanished": len(only_b if swap else only_a),
+                            "Median Match Distance": matches["distance_mm"].median() if len(matches) else np.nan,
+                            "Mean Match Dice": matches["dice"].mean() if len(matches) else np.nan})
+            matches.insert(0, "hemisphere", hemi)
+            matches.insert(0, "session", ses)
+            details.append(matches)
+
+    if details:
+        pd.concat(details, ignore_index=True).rename(columns={"label_a": "label_{}".format(primary),
+                                                              "label_b": "label_session"}).to_csv(
+            os.path.join(row["csv"], "longitudinal_matches.csv"), index=False)
+    return summary
+
+
+def match_cohort(subjects, max_dist=3.0, workers=1):
+    """
+
+    Parameters
+    ----------
+    subjects : list
+        subjects with session runs.
+    max_dist : float
+        centroid match radius in mm.
+    workers : int
+        subjects matched in parallel.
+
+    Returns
+    -------
+    df : df
+        one row per subject, session pair and hemisphere.
+
+    """
+
+    with ProcessPoolExecutor(max_workers=max(1, workers)) as pool:
+        rows=[r for result in pool.map(match_subject, subjects, [max_dist]*len(subjects)) for r in result]
+    return pd.DataFrame(rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,451 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Tue Nov 3 09:27:45 2026
+@author: Leela Srinivasan
+
+Cohort manifest: session, inputs, outputs and availability for every subject, resolved in one scan.
+The FreeSurfer derivatives dir is listed once for sessions (clinical preferred over altclinical, every session
+kept in 'sessions'); the BIDS research anat dirs, axialized T2w, SurfVol, aseg and talairach.xfm are probed once
+per subject; each subject's group (hv or patient) comes from the cohort lists (summary/pnums.txt and hvs.txt,
+or pipeline.ini's [cohort] section). The result is written to summary/manifest.csv. Stages look subjects up
+there (lookup) instead of probing the share, and only fall back to probing for a subject the manifest doesn't
+list yet. Roots come from one place: PVS_NEU_DIR, else /shares/NEU on Linux and /Volumes/Shares/NEU on macOS;
+find_PVS.sh exports its root as PVS_NEU_DIR.
+
+Syntax:       pvs manifest build [--subjects FILE] [SUBJ ...]   (subjects given are refreshed in place)
+              pvs manifest show SUBJ [--shell]
+              pvs manifest plan [--subjects FILE]                 (subjects with all inputs and no outputs yet)
+Dependencies: pandas
+"""
+
+import os
+import sys
+import glob
+import shlex
+import argparse
+import platform
+
+
+#Share root, overridable for other mounts or local test trees
+NEU_DIR=os.environ.get("PVS_NEU_DIR", "/shares/NEU" if platform.system()=="Linux" else "/Volumes/Shares/NEU")
+BIDS_ROOT=os.path.join(NEU_DIR, "Data")
+FS_ROOT=os.path.join(BIDS_ROOT, "derivatives", "freesurfer-6.0.0")
+PVS_ROOT=os.path.join(NEU_DIR, "Projects", "PVS")
+SUMMARY_DIR=os.path.join(PVS_ROOT, "summary")
+MANIFEST=os.path.join(SUMMARY_DIR, "manifest.csv")
+KEY_FILE=os.path.join(NEU_DIR, "Scripts_and_Parameters", "14N0061_key")
+
+#Preferred FreeSurfer session first
+SESSIONS=["clinical", "altclinical"]
+
+#Cohort subject lists (one per line, as key_conversion.py writes them); pipeline.ini's [cohort] section overrides
+COHORT_LISTS={"patient": os.path.join(SUMMARY_DIR, "pnums.txt"), "hv": os.path.join(SUMMARY_DIR, "hvs.txt")}
+
+#Availability flags, each the existence of one path; processed is the marker written once every stage succeeded
+FLAGS={"has_fs": "fs_dir", "has_surfvol": "surfvol_src", "has_aseg": "aseg", "has_talairach": "talairach",
+       "has_research_t1": "research_t1_src", "has_t2": "t2", "has_clusters": "clusters", "processed": "complete"}
+
+#Manifest rows parsed by lookup
+_cache={}
+
+
+def main(argv=None):
+
+    args=parse_args(sys.argv[1:] if argv is None else argv)
+    subjects=list(args.subjects)
+    if getattr(args, "subject_list", None):
+        with open(args.subject_list, "r") as f:
+            subjects+=[line.strip() for line in f if line.strip()]
+
+    if args.command=="build":
+        df=build_manifest(subjects or None, args.manifest)
+        print("Manifest of {} subjects ({} ready to process) written to {}.".format(
+            len(df), int(df["ready"].sum()), args.manifest))
+
+    elif args.command=="show":
+        row=lookup(subjects[0], args.manifest)
+        for key, value in row.items():
+            if args.shell:
+                print("m_{}={}".format(key, shlex.quote("" if value is None else str(int(value) if
+                                                                                        isinstance(value, bool)
+                                                                                        else value))))
+            else:
+                print("{:<16} {}".format(key, "" if value is None else value))
+
+    elif args.command=="plan":
+        for subj in plan_subjects(subjects or None, args.manifest):
+            print(subj)
+
+
+def parse_args(argv):
+    """
+
+    Parameters
+    ----------
+    argv : list
+        command line arguments.
+
+    Returns
+    -------
+    args : argparse.Namespace
+        parsed arguments.
+
+    """
+
+    parser=argparse.ArgumentParser(description="Cohort manifest of sessions, paths and input availability.")
+    parser.add_argument("--manifest", default=MANIFEST, help="manifest CSV")
+    sub=parser.add_subparsers(dest="command", required=True)
+
+    p=sub.add_parser("build", help="scan the roots and write the manifest")
+    p.add_argument("subjects", nargs="*", help="subjects to refresh (default: every FreeSurfer subject)")
+    p.add_argument("--subjects", dest="subject_list", default=None, help="file with one subject per line")
+
+    p=sub.add_parser("show", help="print one subject's row")
+    p.add_argument("subjects", nargs=1)
+    p.add_argument("--shell", action="store_true", help="as m_<key>=value lines for eval in bash")
+
+    p=sub.add_parser("plan", help="list subjects with every input and no outputs")
+    p.add_argument("subjects", nargs="*", help="candidates (default: every subject in the manifest)")
+    p.add_argument("--subjects", dest="subject_list", default=None, help="file with one subject per line")
+    return parser.parse_args(argv)
+
+
+def subject_paths(subj, ses, research_t1=None, fs_root=FS_ROOT, bids_root=BIDS_ROOT, pvs_root=PVS_ROOT):
+    """
+
+    Parameters
+    ----------
+    subj : str
+        p-number or hv code.
+    ses : str
+        clinical/altclinical, or None without a FreeSurfer dir.
+    research_t1 : str
+        research t1 in BIDS, if any.
+    fs_root, bids_root, pvs_root : str
+        roots (default the share's; pvs watch --test points them at a local tree).
+
+    Returns
+    -------
+    dict
+        every input and output path the pipeline derives for the subject (no filesystem access).
+
+    """
+
+    pvs_dir=os.path.join(pvs_root, subj)
+    t1_dir=os.path.join(pvs_dir, "t1")
+    fs_dir=os.path.join(fs_root, "sub-{}_ses-{}".format(subj, ses)) if ses else None
+    stem="sub-{}_ses-{}".format(subj, ses)
+    anat=os.path.join(bids_root, "sub-{}".format(subj), "ses-{}".format(ses), "anat")
+    return {"subj": subj,
+            "ses": ses,
+            "bids_root": bids_root,
+            "fs_dir": fs_dir,
+            "fs_mri": os.path.join(fs_dir, "mri") if ses else None,
+            "aseg": os.path.join(fs_dir, "mri", "aseg.mgz") if ses else None,
+            "talairach": os.path.join(fs_dir, "mri", "transforms", "talairach.xfm") if ses else None,
+            "surfvol_src": os.path.join(fs_dir, "SUMA", "{}_SurfVol.nii".format(stem)) if ses else None,
+            "research_t1_src": research_t1,
+            "t2": os.path.join(anat, "{}_rec-axialized_T2w.nii.gz".format(stem)) if ses else None,
+            "pvs_dir": pvs_dir,
+            "t1_dir": t1_dir,
+            "masks": os.path.join(pvs_dir, "masks"),
+            "eroded": os.path.join(pvs_dir, "eroded_masks"),
+            "distance": os.path.join(pvs_dir, "distance_maps"),
+            "logs": os.path.join(pvs_dir, "logs"),
+            "inputs": os.path.join(pvs_dir, "inputs.json"),
+            "complete": os.path.join(pvs_dir, "complete"),
+            "overlap": os.path.join(t1_dir, "overlap_masks"),
+            "clusters": os.path.join(t1_dir, "clusters"),
+            "csv": os.path.join(t1_dir, "csv"),
+            "classification": os.path.join(t1_dir, "classification"),
+            "surfvol": os.path.join(t1_dir, "{}_SurfVol.nii".format(stem)) if ses else None}
+
+
+def fs_sessions(fs_root=FS_ROOT):
+    """
+
+    Parameters
+    ----------
+    fs_root : str
+        FreeSurfer derivatives root.
+
+    Returns
+    -------
+    dict
+        subject -> FreeSurfer sessions present, preferred first, from one listing of the derivatives dir.
+
+    """
+
+    found={}
+    for d in os.listdir(fs_root) if os.path.isdir(fs_root) else []:
+        if not d.startswith("sub-"):
+            continue
+        for ses in SESSIONS:
+            if d.endswith("_ses-{}".format(ses)):
+                found.setdefault(d[len("sub-"):-len("_ses-{}".format(ses))], []).append(ses)
+    return {subj: sorted(sessions, key=SESSIONS.index) for subj, sessions in found.items()}
+
+
+def read_subject_list(path):
+    """
+
+    Parameters
+    ----------
+    path : str
+        subject list, one per line.
+
+    Returns
+    -------
+    list
+        subjects ([] if the list doesn't exist).
+
+    """
+
+    if not os.path.isfile(path):
+        return []
+    with open(path, "r") as f:
+        return [line.strip() for line in f if line.strip()]
+
+
+def cohort_groups(lists=COHORT_LISTS):
+    """
+
+    Parameters
+    ----------
+    lists : dict
+        group -> subject list file.
+
+    Returns
+    -------
+    dict
+        subject -> group, for every subject on one of the lists.
+
+    """
+
+    return {subj: group for group, path in lists.items() for subj in read_subject_list(path)}
+
+
+def resolve_subject(subj, sessions=None, groups=None):
+    """
+
+    Parameters
+    ----------
+    subj : str
+        p-number or hv code.
+    sessions : dict
+        output of fs_sessions (probed for this subject if None).
+    groups : dict
+        subject -> group, from the cohort lists (cohort_groups if None).
+
+    Returns
+    -------
+    dict
+        subject_paths for the preferred session plus 'sessions' (every FreeSurfer session, space separated),
+        'group' (None for a subject on no cohort list), the availability flags and 'ready' (every input
+        present, not processed).
+
+    """
+
+    if sessions is None:
+        sessions={subj: [ses for ses in SESSIONS
+                         if os.path.isdir(os.path.join(FS_ROOT, "sub-{}_ses-{}".format(subj, ses)))]}
+    found=sessions.get(subj) or [None]
+    research=sorted(glob.glob(os.path.join(BIDS_ROOT, "sub-{}".format(subj), "ses-research", "anat", "*T1w.nii*")))
+    row=subject_paths(subj, found[0], research[-1] if research else None)
+    row["sessions"]=" ".join(ses for ses in found if ses)
+    row["group"]=(cohort_groups() if groups is None else groups).get(subj)
+    for flag, key in FLAGS.items():
+        row[flag]=bool(row[key]) and os.path.exists(row[key])
+    row["ready"]=row["has_surfvol"] and row["has_t2"] and not row["processed"]
+    return row
+
+
+def session_paths(subj, ses):
+    """
+
+    Parameters
+    ----------
+    subj : str
+        p-number or hv code.
+    ses : str
+        FreeSurfer session processed in addition to the subject's primary run (see longitudinal.py).
+
+    Returns
+    -------
+    dict
+        subject_paths for ses with the outputs under <pvs_dir>/sessions/ses-<ses>, plus 'session', 'research_t1'
+        (None: the session's own t1 is used), 'primary_surfvol' and 'xfm' (session to primary affine, None when
+        the primary run is in the same FreeSurfer space, i.e. it used the research t1 of this session; the
+        primary's masks are then shared).
+
+    """
+
+    primary=lookup(subj)
+    base=os.path.join(primary["pvs_dir"], "sessions", "ses-{}".format(ses))
+    paths=subject_paths(subj, ses)
+    shared=ses==primary["ses"]
+    for key in ["t1_dir", "masks", "eroded", "distance", "logs", "inputs", "complete", "overlap", "clusters", "csv",
+                "classification", "surfvol"]:
+        if not (shared and key in ["masks", "eroded", "distance"]):
+            paths[key]=paths[key].replace(primary["pvs_dir"], base, 1)
+    paths.update({"pvs_dir": base, "session": ses, "research_t1": None, "primary_surfvol": primary["surfvol_src"],
+                  "xfm": None if shared else os.path.join(base, "xfm", "session_to_primary.aff12.1D")})
+    return paths
+
+
+def build_manifest(subjects=None, manifest=MANIFEST, groups=None):
+    """
+
+    Parameters
+    ----------
+    subjects : list
+        subjects to (re)resolve; None for every FreeSurfer subject (a full rebuild).
+    manifest : str
+        manifest CSV; rows of other subjects are kept when subjects are given.
+    groups : dict
+        subject -> group, e.g. from pipeline.ini's [cohort] lists; cohort_groups (COHORT_LISTS) if None.
+
+    Returns
+    -------
+    df : df
+        the manifest as written.
+
+    """
+
+    import pandas as pd
+    sessions=fs_sessions()
+    groups=cohort_groups() if groups is None else groups
+    rows=[resolve_subject(subj, sessions, groups) for subj in (subjects if subjects else sorted(sessions))]
+    df=pd.DataFrame(rows)
+    if subjects and os.path.exists(manifest):
+        old=read_manifest(manifest)
+        df=pd.concat([old[~old["subj"].isin(subjects)], df], ignore_index=True).sort_values("subj")
+    for flag in list(FLAGS)+["ready"]:
+        df[flag]=df[flag].astype(int)
+
+    os.makedirs(os.path.dirname(os.path.abspath(manifest)), exist_ok=True)
+    tmp=manifest+".tmp"
+    df.to_csv(tmp, index=False)
+    os.replace(tmp, manifest)
+    _cache.pop(manifest, None)
+    return df
+
+
+def read_manifest(manifest=MANIFEST):
+    """
+
+    Parameters
+    ----------
+    manifest : str
+        manifest CSV.
+
+    Returns
+    -------
+    df : df
+        manifest with paths as strings ('' where not applicable).
+
+    """
+
+    import pandas as pd
+    return pd.read_csv(manifest, dtype=str, keep_default_na=False)
+
+
+def lookup(subj, manifest=MANIFEST):
+    """
+
+    Parameters
+    ----------
+    subj : str
+        p-number or hv code.
+    manifest : str
+        manifest CSV; parsed once per process (and again if it changes).
+
+    Returns
+    -------
+    dict
+        the subject's manifest row: paths (None where not applicable), flags as bools. Subjects missing from
+        the manifest (or without one) are resolved by probing, as resolve_subject does.
+
+    """
+
+    if os.path.exists(manifest):
+        mtime=os.path.getmtime(manifest)
+        if manifest not in _cache or _cache[manifest][0]!=mtime:
+            df=read_manifest(manifest)
+            _cache[manifest]=(mtime, {r["subj"]: r for r in df.to_dict("records")})
+        row=_cache[manifest][1].get(subj)
+        if row is not None:
+            row=dict(row)
+            for key, value in row.items():
+                if key in FLAGS or key=="ready":
+                    row[key]=value=="1"
+                elif value=="":
+                    row[key]=None
+
+
+            #Manifests written before a path was added lack its column
+            for key, value in subject_paths(subj, row["ses"], row["research_t1_src"]).items():
+                row.setdefault(key, value)
+            return row
+    return resolve_subject(subj)
+
+
+def group_subjects(group, manifest=MANIFEST):
+    """
+
+    Parameters
+    ----------
+    group : str
+        hv or patient.
+    manifest : str
+        manifest CSV.
+
+    Returns
+    -------
+    list
+        the group's subjects in the manifest (groups come from the cohort lists; see build_manifest), or on the
+        group's cohort list (COHORT_LISTS) when there is no manifest yet.
+
+    """
+
+    if not os.path.exists(manifest):
+        return [subj for subj, g in cohort_groups().items() if g==group]
+    df=read_manifest(manifest)
+    return list(df.loc[df["group"]==group, "subj"])
+
+
+def plan_subjects(subjects=None, manifest=MANIFEST):
+    """
+
+    Parameters
+    ----------
+    subjects : list
+        candidates; None for every subject in the manifest.
+    manifest : str
+        manifest CSV.
+
+    Returns
+    -------
+    list
+        candidates that are ready (SurfVol and T2w present, no completion marker), in the given order. Skipped
+        subjects are reported on stderr with the input they lack.
+
+    """
+
+    if subjects is None:
+        subjects=list(read_manifest(manifest)["subj"]) if os.path.exists(manifest) else sorted(fs_sessions())
+    ready=[]
+    for subj in subjects:
+        row=lookup(subj, manifest)
+        if row["ready"]:
+            ready.append(subj)
+            continue
+        missing=[flag[len("has_"):] for flag in ["has_fs", "has_surfvol", "has_t2"] if not row[flag]]
+        reason="already processed" if row["processed"] else "missing "+", ".join(missing)
+        print("Skipping {}: {}.".format(subj, reason), file=sys.stderr)
+    return ready
+
+
+if __name__ == "__main__":
+    main()
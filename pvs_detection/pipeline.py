@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Thu Nov 5 14:02:31 2026
+@author: Leela Srinivasan
+
+Config-driven batch: one entry point for patients and HVs.
+An INI file (see pipeline.ini) gives the share root, the cohort lists, the detection parameters (exported as the
+PVS_* variables the stages read) and the run options. The cohort's manifest rows are refreshed, subjects missing
+inputs or already processed are dropped (see manifest.py), and the rest run as one mixed batch through
+stage_runner.run_batch: every subject's stage graph shares the same stage limit, so HVs and patients fill each
+other's idle capacity rather than running as two passes. The [before] steps (keys, which writes the cohort lists)
+run first and the cohort steps (stats, compare, density, ...) once at the end.
+
+Syntax:       pvs pipeline CONFIG [--dry-run]
+Dependencies: FreeSurfer (recon-all run), AFNI
+"""
+
+import os
+import sys
+import asyncio
+import argparse
+import subprocess
+import configparser
+from . import manifest
+from .run_history import DEFAULT_DB
+from .stage_runner import pvs_cmd, run_batch
+
+
+#Used for anything the config leaves out; params are exported as PVS_<KEY>
+DEFAULTS={"paths": {"neu_dir": ""},
+          "cohort": {},
+          "params": {},
+          "run": {"mode": "seg", "classifier": "3dseg", "unifize": "3dunifize", "tiled": "no", "jobs": "4",
+                  "subject_jobs": "2", "history": DEFAULT_DB},
+          "before": {"steps": ""},
+          "after": {"steps": "stats compare density validate qc"}}
+
+
+def main(argv=None):
+
+    argv=sys.argv[1:] if argv is None else argv
+    args=parse_args(argv)
+    config=load_config(args.config)
+
+
+    #Export roots and parameters; manifest roots are fixed at import, so a new root means a fresh interpreter
+    os.environ.update(config_env(config))
+    if os.environ.get("PVS_NEU_DIR", manifest.NEU_DIR)!=manifest.NEU_DIR:
+        os.execv(sys.executable, pvs_cmd("pipeline", *argv))
+
+
+    #Steps that produce the cohort lists, then the cohort, refreshed in the manifest and filtered to subjects that
+    #can run
+    for step in config["before"]["steps"].split():
+        print("++ Running pvs {} ++".format(step))
+        subprocess.run(pvs_cmd(step), check=True)
+    cohort=read_cohort(config)
+    subjects=list(dict.fromkeys(subj for group in cohort.values() for subj in group))
+    if not subjects:
+        raise Exception("No subjects in the [cohort] section of {}. Exiting...".format(args.config))
+    groups={subj: group for group, members in cohort.items() for subj in members}
+    manifest.build_manifest(subjects, groups=groups)
+    ready=manifest.plan_subjects(subjects)
+    for group, members in cohort.items():
+        print("++ {}: {} of {} ready ++".format(group, sum(subj in ready for subj in members), len(members)))
+    if args.dry_run:
+        for subj in ready:
+            print(subj)
+        return
+
+
+    #One mixed batch under a shared stage limit, then the cohort steps
+    run=config["run"]
+    statuses=asyncio.run(run_batch(ready, jobs=run.getint("jobs"), subject_jobs=run.getint("subject_jobs"),
+                                   history=run["history"], mode=run["mode"], classifier=run["classifier"],
+                                   unifize=run["unifize"], tiled=run.getboolean("tiled")))
+    for step in config["after"]["steps"].split():
+        print("++ Running pvs {} ++".format(step))
+        subprocess.run(pvs_cmd(step), check=True)
+
+    failed=[subj for subj, status in statuses.items() if status=="failed"]
+    print("++ {} of {} subjects processed ++".format(len(statuses)-len(failed), len(statuses)))
+    if failed:
+        raise Exception("PVS processing failed for {}. See each subject's logs. Exiting...".format(", ".join(failed)))
+
+
+def parse_args(argv):
+    """
+
+    Parameters
+    ----------
+    argv : list
+        command line arguments.
+
+    Returns
+    -------
+    args : argparse.Namespace
+        parsed arguments.
+
+    """
+
+    parser=argparse.ArgumentParser(description="Run the patient and HV cohorts as one batch from a config file.")
+    parser.add_argument("config", help="pipeline INI file (see pipeline.ini)")
+    parser.add_argument("--dry-run", action="store_true", help="refresh the manifest and list ready subjects only")
+    return parser.parse_args(argv)
+
+
+def load_config(path):
+    """
+
+    Parameters
+    ----------
+    path : str
+        INI file.
+
+    Raises
+    ------
+    Exception
+        Config missing, or an unknown detection option.
+
+    Returns
+    -------
+    config : configparser.ConfigParser
+        config over DEFAULTS.
+
+    """
+
+    if not os.path.exists(path):
+        raise Exception("Config {} not found. Exiting...".format(path))
+    config=configparser.ConfigParser()
+    config.read_dict(DEFAULTS)
+    config.read(path)
+
+    run=config["run"]
+    for key, choices in [("mode", ["seg", "vessel", "ratio"]), ("classifier", ["3dseg", "gmm"]),
+                         ("unifize", ["3dunifize", "poly"])]:
+        if run[key] not in choices:
+            raise Exception("Unrecognized {} {}; choose {}. Exiting...".format(key, run[key], " or ".join(choices)))
+    return config
+
+
+def config_env(config):
+    """
+
+    Parameters
+    ----------
+    config : configparser.ConfigParser
+        from load_config.
+
+    Returns
+    -------
+    dict
+        PVS_NEU_DIR (if set) and PVS_<KEY> for every [params] entry.
+
+    """
+
+    env={"PVS_{}".format(key.upper()): value for key, value in config["params"].items()}
+    if config["paths"]["neu_dir"]:
+        env["PVS_NEU_DIR"]=config["paths"]["neu_dir"]
+    return env
+
+
+def read_cohort(config):
+    """
+
+    Parameters
+    ----------
+    config : configparser.ConfigParser
+        from load_config.
+
+    Returns
+    -------
+    dict
+        group (hv, patient) -> subjects. Each [cohort] entry is a subject list file (one per line; relative paths
+        are under the PVS project root) or, if no such file exists, whitespace-separated subjects.
+
+    """
+
+    cohort={}
+    for group, value in config["cohort"].items():
+        path=os.path.join(manifest.PVS_ROOT, value)
+        if os.path.isfile(path):
+            cohort[group]=manifest.read_subject_list(path)
+        else:
+            cohort[group]=value.split()
+    return cohort
+
+
+if __name__ == "__main__":
+    main()
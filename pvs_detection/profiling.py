@@ -0,0 +1,286 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Thu Nov 12 09:18:52 2026
+@author: Leela Srinivasan
+
+Opt-in function-level profiling of the Python stages.
+Off unless PVS_PROFILE is set (or `pvs --profile[=MODE] SUBCOMMAND ...`, which sets it for the stage and any
+stages it launches). Each profiled subcommand writes, under PVS_PROFILE_DIR (default ~/.pvs/profiles):
+    <stamp>_<cmd>.prof       cProfile stats (MODE=cprofile, the default), loadable with pstats/snakeviz
+    <stamp>_<cmd>.collapsed  sampled stacks, one 'frame;frame;... count' line each, for flamegraph.pl/speedscope
+    <stamp>_<cmd>.csv        calls, total and max seconds of every @timed function
+    <stamp>_<cmd>.txt        the top functions by cumulative time and the @timed counters
+MODE=sample skips cProfile and only samples the main thread's stack (every PVS_PROFILE_INTERVAL s, default
+0.005), cheap enough for production runs. @timed is applied to the known hot spots (key lookups, MRI date
+listdirs, per-subject CSV reads and DataFrame writes, intensity gathers); with profiling off it returns the
+function unchanged.
+
+Syntax:       pvs --profile[=cprofile|sample] SUBCOMMAND [ARGS ...]
+              pvs profile show PROFILE [--top N] [--sort cumulative|tottime|ncalls]
+              pvs profile compare OLD.csv NEW.csv
+Dependencies: Python standard library
+"""
+
+import os
+import sys
+import csv
+import time
+import pstats
+import argparse
+import cProfile
+import threading
+import functools
+from collections import Counter
+from contextlib import contextmanager
+
+
+MODE=os.environ.get("PVS_PROFILE", "").lower()
+MODE={"1": "cprofile", "true": "cprofile", "yes": "cprofile", "0": "", "false": "", "no": ""}.get(MODE, MODE)
+PROFILE_DIR=os.environ.get("PVS_PROFILE_DIR", os.path.join(os.path.expanduser("~"), ".pvs", "profiles"))
+INTERVAL=float(os.environ.get("PVS_PROFILE_INTERVAL", 0.005))
+
+#Function -> [calls, total seconds, max seconds], filled by @timed
+counters={}
+
+
+def main(argv=None):
+
+    args=parse_args(sys.argv[1:] if argv is None else argv)
+    if args.command=="show":
+        stats=pstats.Stats(args.profile)
+        stats.strip_dirs().sort_stats(args.sort).print_stats(args.top)
+    else:
+        print(compare_counters(read_counters(args.old), read_counters(args.new)))
+
+
+def parse_args(argv):
+    """
+
+    Parameters
+    ----------
+    argv : list
+        command line arguments.
+
+    Returns
+    -------
+    args : argparse.Namespace
+        parsed arguments.
+
+    """
+
+    parser=argparse.ArgumentParser(description="Inspect profiles written by pvs --profile.")
+    sub=parser.add_subparsers(dest="command", required=True)
+
+    p=sub.add_parser("show", help="top functions of a .prof file")
+    p.add_argument("profile", help="path to <stamp>_<cmd>.prof")
+    p.add_argument("--top", type=int, default=30, help="number of functions to list")
+    p.add_argument("--sort", default="cumulative", choices=["cumulative", "tottime", "ncalls"])
+
+    p=sub.add_parser("compare", help="@timed counters of two runs, largest change first")
+    p.add_argument("old", help="baseline <stamp>_<cmd>.csv")
+    p.add_argument("new", help="run to check <stamp>_<cmd>.csv")
+    return parser.parse_args(argv)
+
+
+def timed(func):
+    """
+
+    Parameters
+    ----------
+    func : function
+        hot function to count.
+
+    Returns
+    -------
+    function
+        func itself when profiling is off; otherwise a wrapper adding its calls and wall time to counters.
+
+    """
+
+    if not MODE:
+        return func
+    name="{}.{}".format(func.__module__.split(".")[-1], func.__qualname__)
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        start=time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            elapsed=time.perf_counter()-start
+            c=counters.setdefault(name, [0, 0.0, 0.0])
+            c[0]+=1
+            c[1]+=elapsed
+            c[2]=max(c[2], elapsed)
+    return wrapper
+
+
+class StackSampler(threading.Thread):
+    """
+    Samples one thread's Python stack at a fixed interval and counts each distinct stack, root first.
+    """
+
+    def __init__(self, thread_id, interval=INTERVAL):
+        super().__init__(daemon=True)
+        self.thread_id=thread_id
+        self.interval=interval
+        self.stacks=Counter()
+        self._stop_event=threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            frame=sys._current_frames().get(self.thread_id)
+            stack=[]
+            while frame is not None:
+                code=frame.f_code
+                stack.append("{}:{}".format(os.path.basename(code.co_filename), code.co_name))
+                frame=frame.f_back
+            if stack:
+                self.stacks[";".join(reversed(stack))]+=1
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+
+@contextmanager
+def profiled(argv, mode=None, out_dir=None):
+    """
+
+    Parameters
+    ----------
+    argv : list
+        subcommand and arguments being run (named in the artifacts).
+    mode : str
+        'cprofile' or 'sample' (default PVS_PROFILE); profiling is skipped when empty.
+    out_dir : str
+        artifact dir (default PVS_PROFILE_DIR).
+
+    Yields
+    ------
+    None.
+
+    """
+
+    mode=MODE if mode is None else mode
+    if not mode:
+        yield
+        return
+    if mode not in ["cprofile", "sample"]:
+        raise Exception("Unrecognized profile mode {}; choose cprofile or sample. Exiting...".format(mode))
+
+    sampler=StackSampler(threading.get_ident())
+    profiler=cProfile.Profile() if mode=="cprofile" else None
+    counters.clear()
+    start=time.perf_counter()
+    sampler.start()
+    if profiler:
+        profiler.enable()
+    try:
+        yield
+    finally:
+        if profiler:
+            profiler.disable()
+        sampler.stop()
+        prefix=write_artifacts(argv, out_dir or PROFILE_DIR, profiler, sampler.stacks, time.perf_counter()-start)
+        print("Profile of pvs {} written to {}.*".format(argv[0], prefix), file=sys.stderr)
+
+
+def write_artifacts(argv, out_dir, profiler, stacks, seconds):
+    """
+
+    Parameters
+    ----------
+    argv : list
+        subcommand and arguments.
+    out_dir : str
+        artifact dir.
+    profiler : cProfile.Profile or None
+        finished profiler (sample mode has none).
+    stacks : Counter
+        collapsed stack -> samples.
+    seconds : float
+        wall time of the subcommand.
+
+    Returns
+    -------
+    prefix : str
+        path shared by the artifacts, without extension.
+
+    """
+
+    os.makedirs(out_dir, exist_ok=True)
+    prefix=os.path.join(out_dir, "{}_{}_{}".format(time.strftime("%Y%m%d-%H%M%S"), argv[0], os.getpid()))
+
+    with open(prefix+".collapsed", "w") as f:
+        for stack, n in stacks.most_common():
+            f.write("{} {}\n".format(stack, n))
+
+    with open(prefix+".csv", "w", newline="") as f:
+        writer=csv.writer(f)
+        writer.writerow(["function", "calls", "total_s", "max_s"])
+        for name, (calls, total, peak) in sorted(counters.items(), key=lambda kv: -kv[1][1]):
+            writer.writerow([name, calls, "{:.6f}".format(total), "{:.6f}".format(peak)])
+
+    with open(prefix+".txt", "w") as f:
+        f.write("pvs {}\nwall {:.3f} s, {} stack samples\n\n".format(" ".join(argv), seconds, sum(stacks.values())))
+        if counters:
+            f.write("{:<50} {:>8} {:>10} {:>10}\n".format("@timed", "calls", "total_s", "max_s"))
+            for name, (calls, total, peak) in sorted(counters.items(), key=lambda kv: -kv[1][1]):
+                f.write("{:<50} {:>8} {:>10.3f} {:>10.3f}\n".format(name, calls, total, peak))
+            f.write("\n")
+        if profiler:
+            profiler.dump_stats(prefix+".prof")
+            stats=pstats.Stats(profiler, stream=f)
+            stats.strip_dirs().sort_stats("cumulative").print_stats(40)
+    return prefix
+
+
+def read_counters(path):
+    """
+
+    Parameters
+    ----------
+    path : str
+        <stamp>_<cmd>.csv.
+
+    Returns
+    -------
+    dict
+        function -> (calls, total seconds).
+
+    """
+
+    with open(path, "r", newline="") as f:
+        return {row["function"]: (int(row["calls"]), float(row["total_s"])) for row in csv.DictReader(f)}
+
+
+def compare_counters(old, new):
+    """
+
+    Parameters
+    ----------
+    old : dict
+        baseline counters from read_counters.
+    new : dict
+        counters to check.
+
+    Returns
+    -------
+    str
+        table of calls and seconds per function, largest change in total seconds first.
+
+    """
+
+    names=sorted(set(old)|set(new), key=lambda n: -abs(new.get(n, (0, 0.0))[1]-old.get(n, (0, 0.0))[1]))
+    lines=["{:<50} {:>8} {:>8} {:>10} {:>10} {:>10}".format("function", "calls", "calls", "old_s", "new_s",
+                                                           "change_s")]
+    for name in names:
+        (c0, t0), (c1, t1)=old.get(name, (0, 0.0)), new.get(name, (0, 0.0))
+        lines.append("{:<50} {:>8} {:>8} {:>10.3f} {:>10.3f} {:>+10.3f}".format(name, c0, c1, t0, t1, t1-t0))
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,362 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Fri Oct 30 09:48:12 2026
+@author: Leela Srinivasan
+
+QC montages of the cluster maps for cohort review.
+Per subject, the axial slices holding the most cluster voxels (counted from the sparse voxel lists) are read one
+z-slice at a time from the t1 (aligned_t1, else the SurfVol) and aligned_t2. The clusters are blended over both
+as RGB arrays, and all panels are tiled into one PNG with array reshapes (no figure per slice, Agg only).
+Subjects are rendered in a process pool and skipped while their PNG is newer than its inputs.
+summary/qc/qc_summary.csv keeps the per-subject cluster counts and slices, and summary/qc/index.html links every
+montage.
+
+Syntax:       pvs qc [--pvs-root DIR] [--out-dir DIR] [--slices 12] [--cols 4] [--workers N] [--force] [SUBJ ...]
+Dependencies: NumPy, NiBabel, pandas, Matplotlib
+"""
+
+import os
+import sys
+import glob
+import html
+import argparse
+import numpy as np
+import pandas as pd
+import matplotlib
+matplotlib.use("Agg")
+from matplotlib import image
+from concurrent.futures import ProcessPoolExecutor
+from . import manifest, sparse_maps
+from .tiling import load_image
+from .template_density import cluster_maps, find_subjects
+
+
+#Overlay colours (RGB in [0, 1]) and opacity, per hemisphere map
+COLOURS=[(1.0, 0.15, 0.1), (1.0, 0.8, 0.0)]
+ALPHA=0.7
+
+#Percentiles of the in-brain intensities mapped to black and white
+WINDOW=(1, 99)
+
+#Minimum distance between chosen slices, so neighbouring slices of one dense region aren't all picked
+MIN_GAP=2
+
+
+def main(argv=None):
+
+    args=parse_args(sys.argv[1:] if argv is None else argv)
+    out_dir=args.out_dir or os.path.join(args.pvs_root, "summary", "qc")
+    subjects=args.subjects or find_subjects(args.pvs_root)
+    df=render_cohort(args.pvs_root, subjects, out_dir, n_slices=args.slices, cols=args.cols,
+                     workers=args.workers, force=args.force)
+    write_index(out_dir, df)
+    print("QC montages for {} subjects in {}; open index.html.".format(len(subjects), out_dir))
+
+
+def parse_args(argv):
+    """
+
+    Parameters
+    ----------
+    argv : list
+        command line arguments.
+
+    Returns
+    -------
+    args : argparse.Namespace
+        parsed arguments.
+
+    """
+
+    parser=argparse.ArgumentParser(description="Cluster overlay montages and an HTML index for QC.")
+    parser.add_argument("subjects", nargs="*", help="subjects to render (default: all with cluster maps)")
+    parser.add_argument("--pvs-root", default=manifest.PVS_ROOT, help="PVS project root")
+    parser.add_argument("--out-dir", default=None, help="montage dir (default <pvs-root>/summary/qc)")
+    parser.add_argument("--slices", type=int, default=12, help="axial slices per montage")
+    parser.add_argument("--cols", type=int, default=4, help="slices per montage row")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="number of worker processes")
+    parser.add_argument("--force", action="store_true", help="re-render montages that are up to date")
+    return parser.parse_args(argv)
+
+
+def backgrounds(clust_dir):
+    """
+
+    Parameters
+    ----------
+    clust_dir : str
+        subject cluster dir (find_PVS.sh moves the t1-level niftis there).
+
+    Returns
+    -------
+    list
+        t1 (aligned_t1.nii, else the SurfVol) and aligned_t2.nii paths that exist.
+
+    """
+
+    t1=[os.path.join(clust_dir, "aligned_t1.nii")]+sorted(glob.glob(os.path.join(clust_dir, "*_SurfVol.nii")))
+    t1=[f for f in t1 if os.path.exists(f)][:1]
+    t2=[f for f in [os.path.join(clust_dir, "aligned_t2.nii")] if os.path.exists(f)]
+    return t1+t2
+
+
+def choose_slices(maps, n_slices):
+    """
+
+    Parameters
+    ----------
+    maps : list
+        SparseMap cluster maps on one grid.
+    n_slices : int
+        slices to choose.
+
+    Returns
+    -------
+    array
+        axial slice indices in ascending order: the densest slices at least MIN_GAP apart, padded with evenly
+        spaced slices when too few slices hold clusters.
+
+    """
+
+    nx, ny, nz=maps[0].shape[:3]
+    counts=np.zeros(nz, dtype=np.int64)
+    for sp in maps:
+        counts+=np.bincount(sp.index//(nx*ny), minlength=nz)[:nz]
+
+    chosen=[]
+    for z in np.argsort(-counts, kind="stable"):
+        if counts[z]==0 or len(chosen)==n_slices:
+            break
+        if all(abs(int(z)-c)>=MIN_GAP for c in chosen):
+            chosen.append(int(z))
+    for z in np.linspace(0, nz-1, n_slices+2)[1:-1].astype(int):
+        if len(chosen)==n_slices:
+            break
+        if z not in chosen:
+            chosen.append(int(z))
+    return np.sort(np.asarray(chosen, dtype=np.int64))
+
+
+def read_slices(img, slices):
+    """
+
+    Parameters
+    ----------
+    img : nibabel image
+        proxy image.
+    slices : array
+        axial slice indices.
+
+    Returns
+    -------
+    array
+        (n, nx, ny) float32 stack; only these slices are read from disk.
+
+    """
+
+    stack=np.empty((len(slices),)+img.shape[:2], dtype=np.float32)
+    for i, z in enumerate(slices):
+        sl=img.dataobj[..., int(z)]
+        stack[i]=np.asarray(sl[..., 0] if np.ndim(sl)>2 else sl)
+    return stack
+
+
+def overlay(stack, labels):
+    """
+
+    Parameters
+    ----------
+    stack : array
+        (n, nx, ny) intensities.
+    labels : array
+        (n, nx, ny) 0 outside clusters, else the 1-based index of the map (colour) the voxel belongs to.
+
+    Returns
+    -------
+    array
+        (n, ny, nx, 3) RGB in [0, 1], rotated so anterior is up.
+
+    """
+
+    inside=stack[stack>0]
+    lo, hi=np.percentile(inside, WINDOW) if len(inside) else (0.0, 1.0)
+    grey=np.clip((stack-lo)/max(hi-lo, 1e-6), 0, 1)
+    rgb=np.repeat(grey[..., None], 3, axis=-1)
+    for i, colour in enumerate(COLOURS):
+        m=labels==i+1
+        rgb[m]=(1-ALPHA)*rgb[m]+ALPHA*np.asarray(colour)
+    return rgb.transpose(0, 2, 1, 3)[:, ::-1]
+
+
+def tile(panels, cols):
+    """
+
+    Parameters
+    ----------
+    panels : array
+        (n, h, w, 3) images.
+    cols : int
+        panels per row.
+
+    Returns
+    -------
+    array
+        (rows*h, cols*w, 3) montage; missing cells are black.
+
+    """
+
+    n, h, w, c=panels.shape
+    rows=-(-n//cols)
+    grid=np.zeros((rows*cols, h, w, c), dtype=panels.dtype)
+    grid[:n]=panels
+    return grid.reshape(rows, cols, h, w, c).transpose(0, 2, 1, 3, 4).reshape(rows*h, cols*w, c)
+
+
+def render_subject(job):
+    """
+
+    Parameters
+    ----------
+    job : tuple
+        (subj, pvs_dir, out_dir, n_slices, cols, force).
+
+    Returns
+    -------
+    dict
+        qc_summary.csv row: subject, montage, slices, cluster counts and voxels per hemisphere, status
+        (rendered/up to date/no maps/error message).
+
+    """
+
+    subj, pvs_dir, out_dir, n_slices, cols, force=job
+    png=os.path.join(out_dir, "{}.png".format(subj))
+    row={"Subject": subj, "Montage": os.path.basename(png), "Slices": "", "Status": ""}
+    try:
+        maps=cluster_maps(pvs_dir)
+        images=backgrounds(os.path.join(pvs_dir, "t1", "clusters"))
+        if len(maps)==0 or len(images)==0:
+            row["Status"]="no maps"
+            return row
+        sparse=[sparse_maps.load_or_build(f) for f in maps]
+        for f, sp in zip(maps, sparse):
+            hemi="Left" if "left" in os.path.basename(f) else "Right"
+            row["{} Clusters".format(hemi)]=len(np.unique(sp.label))
+            row["{} Voxels".format(hemi)]=len(sp.index)
+        slices=choose_slices(sparse, n_slices)
+        row["Slices"]=" ".join(str(z) for z in slices)
+
+        inputs=maps+[sparse_maps.sparse_path(f) for f in maps]+images
+        stamp=max(os.path.getmtime(f) for f in inputs if os.path.exists(f))
+        if not force and os.path.exists(png) and os.path.getmtime(png)>=stamp:
+            row["Status"]="up to date"
+            return row
+
+
+        #Cluster label stack on the chosen slices, straight from the sparse voxel lists
+        nx, ny, _=sparse[0].shape[:3]
+        labels=np.zeros((len(slices), nx, ny), dtype=np.uint8)
+        pos=np.full(sparse[0].shape[2], -1, dtype=np.int64)
+        pos[slices]=np.arange(len(slices))
+        for i, sp in enumerate(sparse):
+            x, y, z=np.unravel_index(sp.index, sp.shape[:3], order="F")
+            keep=pos[z]>=0
+            labels[pos[z[keep]], x[keep], y[keep]]=i+1
+
+
+        #One column of panels per background, side by side for each slice
+        panels=[]
+        for f in images:
+            img=load_image(f)
+            if img.shape[:3]!=tuple(sparse[0].shape[:3]):
+                continue
+            panels.append(overlay(read_slices(img, slices), labels))
+        cells=np.concatenate(panels, axis=2)
+        image.imsave(png, tile(cells, cols))
+        row["Status"]="rendered"
+    except Exception as e:
+        row["Status"]="error: {}".format(e)
+    return row
+
+
+def render_cohort(pvs_root, subjects, out_dir, n_slices=12, cols=4, workers=1, force=False):
+    """
+
+    Parameters
+    ----------
+    pvs_root : str
+        PVS project root.
+    subjects : list
+        subjects to render.
+    out_dir : str
+        montage dir.
+    n_slices : int
+        axial slices per montage.
+    cols : int
+        slices per montage row.
+    workers : int
+        number of worker processes.
+    force : bool
+        re-render montages that are up to date.
+
+    Returns
+    -------
+    df : df
+        qc_summary.csv after merging these subjects' rows over any earlier ones.
+
+    """
+
+    os.makedirs(out_dir, exist_ok=True)
+    jobs=[(subj, os.path.join(pvs_root, subj), out_dir, n_slices, cols, force) for subj in subjects]
+    with ProcessPoolExecutor(max_workers=max(1, workers)) as pool:
+        rows=list(pool.map(render_subject, jobs))
+
+    summary=os.path.join(out_dir, "qc_summary.csv")
+    df=pd.DataFrame(rows)
+    if os.path.exists(summary):
+        old=pd.read_csv(summary, dtype={"Subject": str, "Slices": str})
+        df=pd.concat([old[~old["Subject"].isin(df["Subject"])], df], ignore_index=True)
+    df=df.sort_values("Subject").reset_index(drop=True)
+    df.to_csv(summary, index=False)
+    for status, n in df["Status"].value_counts().items():
+        print("{}: {}".format(status, n))
+    return df
+
+
+def write_index(out_dir, df):
+    """
+
+    Parameters
+    ----------
+    out_dir : str
+        montage dir.
+    df : df
+        qc_summary.csv.
+
+    Returns
+    -------
+    None. Writes index.html: one row per subject with its counts, slices and montage (click for full size).
+
+    """
+
+    columns=[c for c in ["Left Clusters", "Right Clusters", "Left Voxels", "Right Voxels"] if c in df]
+    lines=["<!DOCTYPE html>", "<html><head><meta charset='utf-8'><title>PVS QC</title>",
+           "<style>body{font-family:sans-serif;background:#111;color:#ddd} td{vertical-align:top;padding:6px}"
+           " img{max-width:900px} a{color:#8cf}</style></head><body>",
+           "<h2>PVS cluster QC ({} subjects)</h2>".format(len(df)),
+           "<p>Left clusters in red, right in orange; t1 then t2 for each slice.</p><table>"]
+    for _, row in df.iterrows():
+        subj=html.escape(str(row["Subject"]))
+        stats="<br>".join("{}: {}".format(c, "" if pd.isna(row[c]) else int(row[c])) for c in columns)
+        cell=html.escape(str(row["Status"]))
+        if os.path.exists(os.path.join(out_dir, str(row["Montage"]))):
+            cell="<a href='{0}'><img src='{0}' loading='lazy'></a>".format(html.escape(str(row["Montage"])))
+        lines.append("<tr id='{0}'><td><b>{0}</b><br>{1}<br>slices: {2}</td><td>{3}</td></tr>".format(
+            subj, stats, html.escape("" if pd.isna(row["Slices"]) else str(row["Slices"])), cell))
+    lines.append("</table></body></html>")
+    with open(os.path.join(out_dir, "index.html"), "w") as f:
+        f.write("\n".join(lines))
+
+
+if __name__ == "__main__":
+    main()
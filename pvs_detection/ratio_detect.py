@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Tue Oct 27 09:36:51 2026
+@author: Leela Srinivasan
+
+Alternative PVS detection mode: voxelwise T2/T1 ratio, z-scored within an eroded WM mask.
+PVS are bright on T2 and dark on T1, so their ratio sits in the upper tail of the WM distribution. The aligned
+t1/t2 are read in z-slabs twice: one pass accumulates the mean and standard deviation of the ratio over the mask,
+the second writes voxels with z above the cutoff (default 2, as in compare_mr_intensity.calc_ratios) as a binary
+candidate map on the mask grid. It feeds pvs clusters/3dClusterize and afnitxt_to_csv.py exactly like
+gm_within_*.nii, and can be restricted to a T1-based candidate map (--within) so only voxels both contrasts agree
+on are kept.
+
+Syntax:       pvs ratio T1 T2 MASK OUT [--z 2] [--within CANDIDATE] [--zmap-out ZMAP]
+Dependencies: NumPy, NiBabel
+"""
+
+import sys
+import argparse
+import numpy as np
+import nibabel as nib
+from .tiling import DEFAULT_MAX_MEM_MB, plan_slab_depth, slab_bounds, read_slab, open_nifti_writer, write_slab, \
+    load_image
+
+
+#Approximate bytes held per slab voxel (t1, t2, ratio, mask, candidate)
+BYTES_PER_VOXEL=24
+
+
+def main(argv=None):
+
+    args=parse_args(sys.argv[1:] if argv is None else argv)
+    nvox=detect_ratio(args.t1, args.t2, args.mask, args.out, z=args.z, within=args.within,
+                      max_mem_mb=args.max_mem, zmap_out=args.zmap_out)
+    print("T2/T1 ratio candidate voxels for {}: {}.".format(args.mask, nvox))
+
+
+def parse_args(argv):
+    """
+
+    Parameters
+    ----------
+    argv : list
+        command line arguments.
+
+    Returns
+    -------
+    args : argparse.Namespace
+        parsed arguments.
+
+    """
+
+    parser=argparse.ArgumentParser(description="Z-scored T2/T1 ratio PVS candidates within an eroded WM mask.")
+    parser.add_argument("t1", help="path to t1 nifti")
+    parser.add_argument("t2", help="path to t2 nifti aligned to the t1 grid")
+    parser.add_argument("mask", help="path to eroded WM mask on the same grid")
+    parser.add_argument("out", help="path to output binary candidate nifti")
+    parser.add_argument("--z", type=float, default=2.0, help="z-score cutoff for the ratio")
+    parser.add_argument("--within", default=None, help="optional T1-based candidate map to intersect with")
+    parser.add_argument("--max-mem", type=int, default=DEFAULT_MAX_MEM_MB, help="memory cap in MB")
+    parser.add_argument("--zmap-out", default=None, help="optional path for the float z-score map")
+    return parser.parse_args(argv)
+
+
+def ratio_outliers(t1, t2, z=2.0):
+    """
+
+    Parameters
+    ----------
+    t1 : array
+        t1 intensities.
+    t2 : array
+        t2 intensities at the same voxels.
+    z : float
+        z-score cutoff.
+
+    Returns
+    -------
+    array
+        1 where the T2/T1 ratio is more than z standard deviations above the mean, else 0. Voxels with a zero
+        t1 or t2 are left out of the mean and standard deviation and are never flagged.
+
+    """
+
+    t1=np.asarray(t1, dtype=np.float64)
+    t2=np.asarray(t2, dtype=np.float64)
+    ratios=np.divide(t2, t1, out=np.zeros_like(t2), where=t1!=0)
+    valid=ratios!=0
+    if valid.sum()<2:
+        return np.zeros(len(ratios), dtype=int)
+    mean=ratios[valid].mean()
+    std=ratios[valid].std()
+    return np.array(valid & ((ratios-mean)>z*std), dtype=int)
+
+
+def slab_ratios(t1_img, t2_img, mask_img, z0, z1):
+    """
+
+    Parameters
+    ----------
+    t1_img, t2_img, mask_img : nibabel image
+        proxy images on the same grid.
+    z0 : int
+        first slice.
+    z1 : int
+        one past the last slice.
+
+    Returns
+    -------
+    ratios : array
+        float64 T2/T1 ratio over the slab, 0 outside the valid voxels.
+    valid : array
+        voxels inside the mask with non-zero t1 and t2.
+
+    """
+
+    m=read_slab(mask_img, z0, z1)>0
+    t1=read_slab(t1_img, z0, z1).astype(np.float64)
+    t2=read_slab(t2_img, z0, z1).astype(np.float64)
+    ratios=np.divide(t2, t1, out=np.zeros_like(t2), where=m & (t1!=0))
+    return ratios, ratios!=0
+
+
+def detect_ratio(t1, t2, mask, out, z=2.0, within=None, max_mem_mb=DEFAULT_MAX_MEM_MB, zmap_out=None):
+    """
+
+    Parameters
+    ----------
+    t1 : str
+        path to t1.
+    t2 : str
+        path to t2 aligned to the t1 grid.
+    mask : str
+        path to eroded WM mask.
+    out : str
+        path to output uint8 candidate map.
+    z : float
+        z-score cutoff.
+    within : str
+        optional candidate map; only voxels > 0 in it are kept.
+    max_mem_mb : int
+        memory cap in MB.
+    zmap_out : str
+        optional path for the float32 z-score map (0 outside the mask).
+
+    Raises
+    ------
+    Exception
+        inputs are not on the same grid.
+
+    Returns
+    -------
+    nvox : int
+        number of candidate voxels.
+
+    """
+
+    mask_img=load_image(mask)
+    shape=mask_img.shape[:3]
+    imgs=[nib.load(t1), nib.load(t2)]+([load_image(within)] if within else [])
+    for f, img in zip([t1, t2, within], imgs):
+        if img.shape[:3]!=shape:
+            raise Exception("{} {} and mask {} are on different grids. Exiting...".format(f, img.shape, shape))
+    t1_img, t2_img=imgs[:2]
+    depth=plan_slab_depth(shape[:2], BYTES_PER_VOXEL, max_mem_mb)
+
+
+    #First pass: ratio moments over the mask; slabs without mask voxels are skipped in the second pass
+    n=0
+    total=0.0
+    total_sq=0.0
+    occupied=[]
+    for (z0, z1), _ in slab_bounds(0, shape[2], depth):
+        ratios, valid=slab_ratios(t1_img, t2_img, mask_img, z0, z1)
+        r=ratios[valid]
+        occupied.append(len(r)>0)
+        n+=len(r)
+        total+=r.sum()
+        total_sq+=(r*r).sum()
+    mean=total/n if n else 0.0
+    std=np.sqrt(max(total_sq/n-mean*mean, 0.0)) if n else 0.0
+
+
+    #Second pass: threshold the z-scored ratio slab by slab
+    nvox=0
+    f=open_nifti_writer(out, shape, mask_img.affine, np.uint8)
+    fz=open_nifti_writer(zmap_out, shape, mask_img.affine, np.float32) if zmap_out else None
+    try:
+        for ((z0, z1), _), has_mask in zip(slab_bounds(0, shape[2], depth), occupied):
+            if not has_mask or std==0:
+                empty=np.zeros(shape[:2]+(z1-z0,), dtype=np.uint8)
+                write_slab(f, empty, np.uint8)
+                if fz:
+                    write_slab(fz, empty, np.float32)
+                continue
+            ratios, valid=slab_ratios(t1_img, t2_img, mask_img, z0, z1)
+            zs=np.where(valid, (ratios-mean)/std, 0.0)
+            cand=valid & (zs>z)
+            if within:
+                cand&=read_slab(imgs[2], z0, z1)>0
+            nvox+=int(cand.sum())
+            write_slab(f, cand, np.uint8)
+            if fz:
+                write_slab(fz, zs, np.float32)
+    finally:
+        f.close()
+        if fz:
+            fz.close()
+    return nvox
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 26 10:22:48 2026
+@author: Leela Srinivasan
+
+Regional PVS counts for every FreeSurfer label in one pass.
+Cluster voxels (sparse lists of the pvs_within_* maps) are looked up in aseg.mgz (or wmparc.mgz for lobar WM).
+One bincount over cluster_rank * n_labels + label_rank gives the full cluster x label contingency table. From it
+each cluster is assigned to its majority label, and per-label PVS count (clusters assigned) and volume (voxels
+inside the label) follow for all labels at once. Only the bounding box of the clusters is read from the
+segmentation.
+
+Syntax:       pvs regions CLUST_DIR SEG OUT_CSV
+Dependencies: NumPy, NiBabel, pandas
+"""
+
+import os
+import sys
+import argparse
+import numpy as np
+import pandas as pd
+import nibabel as nib
+from . import sparse_maps
+from .tiling import read_slab
+
+
+HEMIS=["left", "right"]
+
+#Label sets summed into compile_stats columns; cerebral WM covers both aseg (2/41) and wmparc (3xxx/4xxx/5001-2)
+REGION_GROUPS={"Basal Ganglia": [11, 12, 13, 26, 50, 51, 52, 58],
+               "Centrum Semiovale": [2, 41, 5001, 5002]+list(range(3001, 3036))+list(range(4001, 4036)),
+               "Thalamus": [10, 49],
+               "Hippocampus": [17, 53],
+               "Brainstem": [16]}
+
+#aseg names, used when FreeSurferColorLUT.txt isn't available
+ASEG_NAMES={0: "Unknown", 2: "Left-Cerebral-White-Matter", 3: "Left-Cerebral-Cortex", 4: "Left-Lateral-Ventricle",
+            5: "Left-Inf-Lat-Vent", 7: "Left-Cerebellum-White-Matter", 8: "Left-Cerebellum-Cortex",
+            10: "Left-Thalamus", 11: "Left-Caudate", 12: "Left-Putamen", 13: "Left-Pallidum",
+            14: "3rd-Ventricle", 15: "4th-Ventricle", 16: "Brain-Stem", 17: "Left-Hippocampus",
+            18: "Left-Amygdala", 24: "CSF", 26: "Left-Accumbens-area", 28: "Left-VentralDC", 30: "Left-vessel",
+            31: "Left-choroid-plexus", 41: "Right-Cerebral-White-Matter", 42: "Right-Cerebral-Cortex",
+            43: "Right-Lateral-Ventricle", 44: "Right-Inf-Lat-Vent", 46: "Right-Cerebellum-White-Matter",
+            47: "Right-Cerebellum-Cortex", 49: "Right-Thalamus", 50: "Right-Caudate", 51: "Right-Putamen",
+            52: "Right-Pallidum", 53: "Right-Hippocampus", 54: "Right-Amygdala", 58: "Right-Accumbens-area",
+            60: "Right-VentralDC", 62: "Right-vessel", 63: "Right-choroid-plexus", 72: "5th-Ventricle",
+            77: "WM-hypointensities", 85: "Optic-Chiasm", 251: "CC_Posterior", 252: "CC_Mid_Posterior",
+            253: "CC_Central", 254: "CC_Mid_Anterior", 255: "CC_Anterior", 5001: "Left-UnsegmentedWhiteMatter",
+            5002: "Right-UnsegmentedWhiteMatter"}
+
+
+def main(argv=None):
+
+    args=parse_args(sys.argv[1:] if argv is None else argv)
+    maps=[os.path.join(args.clust_dir, "pvs_within_{}_cerebral_white_matter.nii".format(h)) for h in HEMIS]
+    maps=[f for f in maps if os.path.exists(f) or os.path.exists(sparse_maps.sparse_path(f))]
+    df=regional_counts(maps, args.seg)
+    df.to_csv(args.out, index=False)
+    print("Saving PVS counts for {} regions to {}.".format(len(df), args.out))
+
+
+def parse_args(argv):
+    """
+
+    Parameters
+    ----------
+    argv : list
+        command line arguments.
+
+    Returns
+    -------
+    args : argparse.Namespace
+        parsed arguments.
+
+    """
+
+    parser=argparse.ArgumentParser(description="Per-label PVS count and volume from one contingency pass.")
+    parser.add_argument("clust_dir", help="subject cluster dir holding pvs_within_*.nii")
+    parser.add_argument("seg", help="FreeSurfer segmentation (aseg.mgz or wmparc.mgz)")
+    parser.add_argument("out", help="output CSV")
+    return parser.parse_args(argv)
+
+
+def label_names():
+    """
+
+    Returns
+    -------
+    dict
+        label -> name from $FREESURFER_HOME/FreeSurferColorLUT.txt, else the built-in aseg names.
+
+    """
+
+    lut=os.path.join(os.environ.get("FREESURFER_HOME", ""), "FreeSurferColorLUT.txt")
+    if not os.path.exists(lut):
+        return ASEG_NAMES
+    names={}
+    with open(lut, "r") as f:
+        for line in f:
+            parts=line.split()
+            if len(parts)>=2 and parts[0].isdigit():
+                names[int(parts[0])]=parts[1]
+    return names
+
+
+def lookup_labels(sp, seg_img):
+    """
+
+    Parameters
+    ----------
+    sp : SparseMap
+        cluster map.
+    seg_img : nibabel image
+        segmentation; cluster voxel centres are mapped onto its grid through both affines.
+
+    Returns
+    -------
+    array
+        segmentation label at each cluster voxel (0 outside the segmentation grid).
+
+    """
+
+    labels=np.zeros(len(sp.index), dtype=np.int64)
+    if len(sp.index)==0:
+        return labels
+    ijk=np.stack(np.unravel_index(sp.index, sp.shape, order="F"), axis=1)
+    t=np.rint(nib.affines.apply_affine(np.linalg.inv(seg_img.affine)@np.asarray(sp.affine), ijk)).astype(np.int64)
+    inside=np.all((t>=0) & (t<np.asarray(seg_img.shape[:3])), axis=1)
+    if not inside.any():
+        return labels
+
+
+    #Read only the clusters' bounding box of the segmentation
+    lo=t[inside].min(axis=0)
+    hi=t[inside].max(axis=0)+1
+    crop=read_slab(seg_img, lo[2], hi[2], (lo[0], hi[0]), (lo[1], hi[1]))
+    local=t[inside]-lo
+    labels[inside]=crop[local[:, 0], local[:, 1], local[:, 2]]
+    return labels
+
+
+def contingency(cluster_ids, labels):
+    """
+
+    Parameters
+    ----------
+    cluster_ids : array
+        cluster id per voxel.
+    labels : array
+        segmentation label per voxel.
+
+    Returns
+    -------
+    clusters : array
+        cluster ids (rows).
+    regions : array
+        labels (columns).
+    table : array
+        voxels of each cluster in each label, from one bincount of the combined index.
+
+    """
+
+    clusters, c_rank=np.unique(cluster_ids, return_inverse=True)
+    regions, r_rank=np.unique(labels, return_inverse=True)
+    table=np.bincount(c_rank*len(regions)+r_rank, minlength=len(clusters)*len(regions))
+    return clusters, regions, table.reshape(len(clusters), len(regions))
+
+
+def regional_counts(cluster_maps, seg):
+    """
+
+    Parameters
+    ----------
+    cluster_maps : list
+        pvs_within_* cluster maps (cluster ids are made unique across maps).
+    seg : str
+        path to aseg.mgz/wmparc.mgz.
+
+    Returns
+    -------
+    df : df
+        'Label', 'Region', 'PVS Count' (clusters whose majority of voxels is in the label) and 'PVS Volume'
+        (cluster voxels in the label), for every label touched by a cluster.
+
+    """
+
+    seg_img=nib.load(seg)
+    ids=[]
+    labels=[]
+    offset=0
+    for f in cluster_maps:
+        sp=sparse_maps.load_or_build(f)
+        ids.append(sp.label.astype(np.int64)+offset)
+        labels.append(lookup_labels(sp, seg_img))
+        offset+=int(sp.label.max()) if len(sp.label) else 0
+
+    columns=["Label", "Region", "PVS Count", "PVS Volume"]
+    if len(ids)==0 or sum(len(i) for i in ids)==0:
+        return pd.DataFrame(columns=columns)
+
+    _, regions, table=contingency(np.concatenate(ids), np.concatenate(labels))
+    count=np.bincount(table.argmax(axis=1), minlength=len(regions))
+    volume=table.sum(axis=0)
+    names=label_names()
+    return pd.DataFrame({"Label": regions,
+                         "Region": [names.get(int(r), "Label {}".format(r)) for r in regions],
+                         "PVS Count": count,
+                         "PVS Volume": volume}, columns=columns)
+
+
+def region_group_stats(df):
+    """
+
+    Parameters
+    ----------
+    df : df
+        output of regional_counts (or its CSV).
+
+    Returns
+    -------
+    dict
+        '<Group> PVS Count' and '<Group> PVS Volume' for each of REGION_GROUPS.
+
+    """
+
+    stats={}
+    for group, labels in REGION_GROUPS.items():
+        rows=df[df["Label"].isin(labels)]
+        stats["{} PVS Count".format(group)]=int(rows["PVS Count"].sum())
+        stats["{} PVS Volume".format(group)]=int(rows["PVS Volume"].sum())
+    return stats
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,525 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Thu Oct 22 15:37:52 2026
+@author: Leela Srinivasan
+
+Run history for capacity planning.
+Every pipeline run writes one row to a local SQLite database (PVS_HISTORY_DB, default ~/.pvs/run_history.sqlite):
+subject, options, wall time, input grid dims and resolution, clusters per hemisphere, peak memory and bytes written,
+plus per-stage timings and peak memory. The stage runner records stages itself; find_PVS.sh runs each stage
+through `pvs history stage`, which appends one line per stage to a TSV that `record --stages` reads. The report
+fits wall time against voxel count and predicts a queued batch, optionally spread over several concurrent slots.
+
+Syntax:       pvs history record SUBJ --seconds S [--mode seg] [--classifier 3dseg] [--tiled] [--bytes-before B]
+                                     [--stages TSV]
+              pvs history stage TSV NAME -- CMD [ARGS ...]   (exits with CMD's status)
+              pvs history size DIR                           (bytes below DIR, for --bytes-before)
+              pvs history report [--queue SUBJ_LIST] [--slots N] [--mode seg] [--tiled | --untiled]
+
+Dependencies: NumPy, NiBabel (report and record only)
+"""
+
+import os
+import sys
+import time
+import socket
+import sqlite3
+import argparse
+import subprocess
+
+
+DEFAULT_DB=os.environ.get("PVS_HISTORY_DB", os.path.join(os.path.expanduser("~"), ".pvs", "run_history.sqlite"))
+
+SCHEMA="""
+CREATE TABLE IF NOT EXISTS runs (
+    run_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    subject TEXT NOT NULL,
+    started TEXT NOT NULL,
+    host TEXT,
+    mode TEXT,
+    classifier TEXT,
+    tiled INTEGER,
+    jobs INTEGER,
+    status TEXT,
+    wall_seconds REAL,
+    nx INTEGER, ny INTEGER, nz INTEGER,
+    dx REAL, dy REAL, dz REAL,
+    n_voxels INTEGER,
+    left_clusters INTEGER,
+    right_clusters INTEGER,
+    peak_rss_mb REAL,
+    bytes_written INTEGER
+);
+CREATE TABLE IF NOT EXISTS stages (
+    run_id INTEGER NOT NULL REFERENCES runs(run_id),
+    stage TEXT NOT NULL,
+    status TEXT,
+    seconds REAL,
+    peak_rss_mb REAL
+);
+CREATE INDEX IF NOT EXISTS runs_subject ON runs(subject);
+"""
+
+
+def main(argv=None):
+
+    args=parse_args(sys.argv[1:] if argv is None else argv)
+    if args.command=="record":
+        from .stage_runner import subject_paths
+        paths=subject_paths(args.subject)
+        stage_results=read_stage_log(args.stages) if args.stages else None
+        run_id=record_run(paths, args.seconds, mode=args.mode, classifier=args.classifier, tiled=args.tiled,
+                          jobs=1, status=args.status, stage_results=stage_results, bytes_before=args.bytes_before,
+                          db=args.db)
+        print("Recorded run {} for {} in {}.".format(run_id, args.subject, args.db))
+
+    elif args.command=="stage":
+        cmd=args.cmd[1:] if args.cmd[:1]==["--"] else args.cmd
+        sys.exit(run_stage(args.log, args.name, cmd))
+
+    elif args.command=="size":
+        print(dir_size(args.dir))
+
+    elif args.command=="report":
+        report(args.db, queue=args.queue, slots=args.slots, mode=args.mode, tiled=args.tiled)
+
+
+def parse_args(argv):
+    """
+
+    Parameters
+    ----------
+    argv : list
+        command line arguments.
+
+    Returns
+    -------
+    args : argparse.Namespace
+        parsed arguments.
+
+    """
+
+    parser=argparse.ArgumentParser(description="Pipeline run history and batch wall time prediction.")
+    parser.add_argument("--db", default=DEFAULT_DB, help="path to history database")
+    sub=parser.add_subparsers(dest="command", required=True)
+
+    p=sub.add_parser("record", help="record a finished find_PVS.sh run")
+    p.add_argument("subject")
+    p.add_argument("--seconds", type=float, required=True, help="wall time of the run")
+    p.add_argument("--mode", default="seg")
+    p.add_argument("--classifier", default="3dseg")
+    p.add_argument("--tiled", action="store_true")
+    p.add_argument("--status", default="done")
+    p.add_argument("--bytes-before", type=int, default=0, help="subject dir size before the run")
+    p.add_argument("--stages", default=None, help="stage TSV written by pvs history stage")
+
+    p=sub.add_parser("stage", help="run one stage command, appending its wall time and peak memory to a TSV")
+    p.add_argument("log", help="stage TSV")
+    p.add_argument("name", help="stage name")
+    p.add_argument("cmd", nargs=argparse.REMAINDER, help="-- command and arguments")
+
+    p=sub.add_parser("size", help="print the bytes in all files below a directory")
+    p.add_argument("dir")
+
+    p=sub.add_parser("report", help="fit runtime against volume size and predict a queued batch")
+    p.add_argument("--queue", default=None, help="file with one subject per line to predict")
+    p.add_argument("--slots", type=int, default=1, help="subjects processed concurrently (nodes x per node)")
+    p.add_argument("--mode", default=None, help="only fit runs in this mode")
+    p.add_argument("--tiled", dest="tiled", action="store_const", const=True, default=None,
+                   help="only fit tiled runs")
+    p.add_argument("--untiled", dest="tiled", action="store_const", const=False, help="only fit untiled runs")
+    return parser.parse_args(argv)
+
+
+def connect(db=DEFAULT_DB):
+    """
+
+    Parameters
+    ----------
+    db : str
+        path to history database; created with its schema on first use.
+
+    Returns
+    -------
+    sqlite3.Connection
+        open connection.
+
+    """
+
+    os.makedirs(os.path.dirname(os.path.abspath(db)), exist_ok=True)
+    con=sqlite3.connect(db, timeout=30)
+    con.executescript(SCHEMA)
+    return con
+
+
+def rss_mb(maxrss):
+    """
+
+    Parameters
+    ----------
+    maxrss : int
+        ru_maxrss from getrusage/wait4.
+
+    Returns
+    -------
+    float
+        peak resident memory in MB (ru_maxrss is KB on Linux, bytes on macOS).
+
+    """
+
+    return maxrss/1024.0**2 if sys.platform=="darwin" else maxrss/1024.0
+
+
+def dir_size(path):
+    """
+
+    Parameters
+    ----------
+    path : str
+        directory.
+
+    Returns
+    -------
+    int
+        bytes in all files below path (0 if missing).
+
+    """
+
+    total=0
+    for root, _, files in os.walk(path):
+        for f in files:
+            fp=os.path.join(root, f)
+            if os.path.isfile(fp) and not os.path.islink(fp):
+                total+=os.path.getsize(fp)
+    return total
+
+
+def run_stage(log, name, cmd):
+    """
+
+    Parameters
+    ----------
+    log : str
+        stage TSV; one 'name status seconds peak_rss_mb' line is appended.
+    name : str
+        stage name.
+    cmd : list
+        argv; stdin, stdout and stderr are inherited.
+
+    Returns
+    -------
+    int
+        exit code of the command.
+
+    """
+
+    start=time.perf_counter()
+    proc=subprocess.Popen(cmd)
+    _, status, usage=os.wait4(proc.pid, 0)
+    code=os.waitstatus_to_exitcode(status)
+    os.makedirs(os.path.dirname(os.path.abspath(log)), exist_ok=True)
+    with open(log, "a") as f:
+        f.write("{}\t{}\t{:.3f}\t{:.1f}\n".format(name, "done" if code==0 else "failed", time.perf_counter()-start,
+                                                rss_mb(usage.ru_maxrss)))
+    return code
+
+
+def read_stage_log(log):
+    """
+
+    Parameters
+    ----------
+    log : str
+        stage TSV from run_stage.
+
+    Returns
+    -------
+    dict
+        stage name -> (status, seconds, peak_rss_mb), as stage_runner.run_graph returns (empty if no log).
+
+    """
+
+    results={}
+    if not os.path.exists(log):
+        return results
+    with open(log, "r") as f:
+        for line in f:
+            fields=line.rstrip("\n").split("\t")
+            if len(fields)==4:
+                results[fields[0]]=(fields[1], float(fields[2]), float(fields[3]))
+    return results
+
+
+def grid_info(t1):
+    """
+
+    Parameters
+    ----------
+    t1 : str or None
+        path to the acquired input (see input_image).
+
+    Returns
+    -------
+    dims : tuple
+        (nx, ny, nz), or Nones if unavailable.
+    zooms : tuple
+        voxel size in mm, or Nones.
+
+    """
+
+    if t1 is None or not os.path.exists(t1):
+        return (None,)*3, (None,)*3
+    import nibabel as nib
+    img=nib.load(t1)
+    return tuple(int(n) for n in img.shape[:3]), tuple(float(z) for z in img.header.get_zooms()[:3])
+
+
+def input_image(paths):
+    """
+
+    Parameters
+    ----------
+    paths : dict
+        from stage_runner.subject_paths.
+
+    Returns
+    -------
+    str or None
+        the acquired volume whose size drives runtime: the research t1 if there is one, else the clinical t1 as
+        FreeSurfer received it (mri/orig/001.mgz), else the axialized T2w. The SurfVol is not used; it is always
+        FreeSurfer's conformed 256^3 1 mm grid, so every run would get the same size.
+
+    """
+
+    candidates=[paths.get("research_t1_src")]
+    if paths.get("fs_mri"):
+        candidates.append(os.path.join(paths["fs_mri"], "orig", "001.mgz"))
+    candidates.append(paths.get("t2"))
+    for f in candidates:
+        if f and os.path.exists(f):
+            return f
+    return None
+
+
+def cluster_count(csv):
+    """
+
+    Parameters
+    ----------
+    csv : str
+        pvs_within_*.csv.
+
+    Returns
+    -------
+    int or None
+        clusters (data rows), None if not written.
+
+    """
+
+    if not os.path.exists(csv):
+        return None
+    with open(csv, "r") as f:
+        return max(0, sum(1 for line in f if line.strip())-1)
+
+
+def record_run(paths, wall_seconds, mode="seg", classifier="3dseg", tiled=False, jobs=1, status="done",
+               stage_results=None, bytes_before=0, db=DEFAULT_DB):
+    """
+
+    Parameters
+    ----------
+    paths : dict
+        from stage_runner.subject_paths.
+    wall_seconds : float
+        wall time of the run.
+    mode, classifier : str
+        detection options.
+    tiled : bool
+        tiled stages used.
+    jobs : int
+        concurrent stages.
+    status : str
+        done or failed.
+    stage_results : dict
+        stage name -> (status, seconds, peak_rss_mb) from stage_runner.run_graph.
+    bytes_before : int
+        subject dir size before the run.
+    db : str
+        path to history database.
+
+    Returns
+    -------
+    int
+        run_id.
+
+    """
+
+    (nx, ny, nz), (dx, dy, dz)=grid_info(input_image(paths))
+    counts=[cluster_count(os.path.join(paths["csv"], "pvs_within_{}_cerebral_white_matter.csv".format(h)))
+            for h in ["left", "right"]]
+    peaks=[r[2] for r in (stage_results or {}).values() if r[2] is not None]
+
+    con=connect(db)
+    try:
+        with con:
+            cur=con.execute("INSERT INTO runs (subject, started, host, mode, classifier, tiled, jobs, status, "
+                            "wall_seconds, nx, ny, nz, dx, dy, dz, n_voxels, left_clusters, right_clusters, "
+                            "peak_rss_mb, bytes_written) VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)",
+                            (paths["subj"], time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(time.time()-wall_seconds)),
+                             socket.gethostname(), mode, classifier, int(tiled), jobs, status, wall_seconds,
+                             nx, ny, nz, dx, dy, dz, nx*ny*nz if nx else None, counts[0], counts[1],
+                             max(peaks) if peaks else None, dir_size(paths["pvs_dir"])-bytes_before))
+            run_id=cur.lastrowid
+            con.executemany("INSERT INTO stages (run_id, stage, status, seconds, peak_rss_mb) VALUES (?,?,?,?,?)",
+                            [(run_id, name, r[0], r[1], r[2]) for name, r in (stage_results or {}).items()])
+    finally:
+        con.close()
+    return run_id
+
+
+def fit_runtime(db=DEFAULT_DB, mode=None, tiled=None):
+    """
+
+    Parameters
+    ----------
+    db : str
+        path to history database.
+    mode : str
+        only fit runs in this mode.
+    tiled : bool or None
+        only fit tiled (True) or untiled (False) runs; None fits all.
+
+    Returns
+    -------
+    dict
+        least squares wall_seconds = intercept + slope * n_voxels over successful runs, with R^2, residual SD
+        and the number of runs; slope is NaN when fewer than two distinct sizes are recorded.
+
+    """
+
+    import numpy as np
+    query="SELECT n_voxels, wall_seconds FROM runs WHERE status='done' AND n_voxels IS NOT NULL"
+    params=[]
+    if mode is not None:
+        query+=" AND mode=?"
+        params.append(mode)
+    if tiled is not None:
+        query+=" AND tiled=?"
+        params.append(int(tiled))
+    con=connect(db)
+    try:
+        rows=np.asarray(con.execute(query, params).fetchall(), dtype=float).reshape(-1, 2)
+    finally:
+        con.close()
+
+    x, y=rows[:, 0], rows[:, 1]
+    fit={"runs": len(rows), "intercept": np.nan, "slope": np.nan, "r2": np.nan, "resid_sd": np.nan}
+    if len(rows)==0:
+        return fit
+    if len(np.unique(x))<2:
+        fit.update(intercept=float(y.mean()), slope=0.0, resid_sd=float(y.std()))
+        return fit
+
+    slope, intercept=np.polyfit(x, y, 1)
+    resid=y-(intercept+slope*x)
+    ss_tot=((y-y.mean())**2).sum()
+    fit.update(intercept=float(intercept), slope=float(slope),
+               r2=float(1-(resid**2).sum()/ss_tot) if ss_tot>0 else np.nan,
+               resid_sd=float(resid.std(ddof=2)) if len(rows)>2 else np.nan)
+    return fit
+
+
+def predict_batch(subjects, fit, slots=1):
+    """
+
+    Parameters
+    ----------
+    subjects : list
+        queued p-numbers.
+    fit : dict
+        from fit_runtime.
+    slots : int
+        subjects processed concurrently.
+
+    Returns
+    -------
+    per_subject : dict
+        subject -> predicted seconds (None if none of its input images can be found).
+    serial : float
+        sum of predictions.
+    makespan : float
+        wall time with longest-first assignment to the least loaded slot.
+
+    """
+
+    from .stage_runner import subject_paths
+    per_subject={}
+    for subj in subjects:
+        try:
+            (nx, ny, nz), _=grid_info(input_image(subject_paths(subj)))
+        except Exception:
+            nx=None
+        per_subject[subj]=fit["intercept"]+fit["slope"]*nx*ny*nz if nx else None
+
+    known=sorted((s for s in per_subject.values() if s is not None), reverse=True)
+    loads=[0.0]*max(1, slots)
+    for seconds in known:
+        loads[loads.index(min(loads))]+=seconds
+    return per_subject, float(sum(known)), max(loads)
+
+
+def report(db=DEFAULT_DB, queue=None, slots=1, mode=None, tiled=None):
+    """
+    Print the runtime fit, the slowest stages on record and, with a queue, the predicted batch wall time.
+
+    Parameters
+    ----------
+    db : str
+        path to history database.
+    queue : str
+        file with one subject per line.
+    slots : int
+        subjects processed concurrently.
+    mode : str
+        only fit runs in this mode.
+    tiled : bool or None
+        only fit tiled (True) or untiled (False) runs; None fits all.
+
+    Returns
+    -------
+    None.
+
+    """
+
+    fit=fit_runtime(db, mode=mode, tiled=tiled)
+    print("Runs fitted: {}".format(fit["runs"]))
+    if fit["runs"]==0:
+        print("No successful runs with grid info in {}.".format(db))
+        return
+    print("Wall seconds = {:.1f} + {:.3g} x voxels (R^2 {:.3f}, residual SD {:.1f} s)".format(
+        fit["intercept"], fit["slope"], fit["r2"], fit["resid_sd"]))
+
+    con=connect(db)
+    try:
+        rows=con.execute("SELECT stage, COUNT(*), AVG(seconds), MAX(peak_rss_mb) FROM stages WHERE status='done' "
+                         "GROUP BY stage ORDER BY AVG(seconds) DESC LIMIT 10").fetchall()
+    finally:
+        con.close()
+    if rows:
+        print("\n{:<40} {:>5} {:>10} {:>10}".format("Stage", "Runs", "Mean s", "Peak MB"))
+        for stage, n, mean, peak in rows:
+            print("{:<40} {:>5} {:>10.1f} {:>10}".format(stage, n, mean, "" if peak is None else round(peak)))
+
+    if queue is not None:
+        with open(queue, "r") as f:
+            subjects=[line.strip() for line in f if line.strip()]
+        per_subject, serial, makespan=predict_batch(subjects, fit, slots)
+        missing=[s for s, v in per_subject.items() if v is None]
+        print("\nQueued subjects: {} ({} without an input image to size)".format(len(subjects), len(missing)))
+        print("Predicted serial wall time: {:.2f} h".format(serial/3600))
+        print("Predicted wall time on {} slot(s): {:.2f} h".format(max(1, slots), makespan/3600))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,442 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 13:40:18 2026
+@author: Leela Srinivasan
+
+Sparse voxel-list format for PVS cluster maps and clinician masks.
+A map is stored next to its NIfTI as <name>.sparse.npz holding the grid shape, affine, sorted linear voxel
+indices (NIfTI/Fortran order, so a z-slab is one contiguous index range) and one label per voxel.
+Overlap, union and intensity gathers then cost time proportional to PVS voxels rather than brain volume.
+
+Syntax:       pvs sparse convert MAP.nii [MAP.nii ...]
+              pvs sparse merge CLUST_DIR
+
+Dependencies: NumPy, NiBabel
+"""
+
+import os
+import sys
+import argparse
+import numpy as np
+from collections import namedtuple
+from .profiling import timed
+from .tiling import DEFAULT_MAX_MEM_MB, plan_slab_depth, slab_bounds, read_slab, open_nifti_writer, write_slab, \
+    load_image
+
+
+SparseMap=namedtuple("SparseMap", ["shape", "affine", "index", "label"])
+
+
+def main(argv=None):
+
+    args=parse_args(sys.argv[1:] if argv is None else argv)
+    if args.command=="convert":
+        for f in args.maps:
+            sp=load_or_build(f)
+            print("Wrote {} ({} voxels).".format(sparse_path(f), len(sp.index)))
+
+    elif args.command=="merge":
+        create_verification_map(args.clust_dir)
+
+
+def parse_args(argv):
+    """
+
+    Parameters
+    ----------
+    argv : list
+        command line arguments.
+
+    Returns
+    -------
+    args : argparse.Namespace
+        parsed arguments.
+
+    """
+
+    parser=argparse.ArgumentParser(description="Sparse voxel-list format for PVS cluster maps and clinician masks.")
+    sub=parser.add_subparsers(dest="command", required=True)
+
+    p=sub.add_parser("convert", help="write (or refresh) the sparse companion of each map")
+    p.add_argument("maps", nargs="+", help="label or mask NIfTIs")
+
+    p=sub.add_parser("merge", help="merged_pvs.nii from detected and clinician maps")
+    p.add_argument("clust_dir", help="cluster PVS dir with pvs_within_*.nii and manpvs.nii")
+    return parser.parse_args(argv)
+
+
+def sparse_path(nifti):
+    """
+
+    Parameters
+    ----------
+    nifti : str
+        path to .nii or .nii.gz.
+
+    Returns
+    -------
+    str
+        path to the sparse companion file.
+
+    """
+
+    base=nifti[:-7] if nifti.endswith(".nii.gz") else os.path.splitext(nifti)[0]
+    return base+".sparse.npz"
+
+
+def from_nifti(nifti, max_mem_mb=DEFAULT_MAX_MEM_MB):
+    """
+
+    Parameters
+    ----------
+    nifti : str
+        path to label or mask volume.
+    max_mem_mb : int
+        memory cap in MB.
+
+    Returns
+    -------
+    SparseMap
+        nonzero voxels of the volume.
+
+    """
+
+    img=load_image(nifti)
+    shape=tuple(int(x) for x in img.shape[:3])
+    depth=plan_slab_depth(shape[:2], 16, max_mem_mb)
+    plane=shape[0]*shape[1]
+
+    index=[]
+    label=[]
+    for (z0, z1), _ in slab_bounds(0, shape[2], depth):
+        flat=read_slab(img, z0, z1).ravel(order="F")
+        nz=np.flatnonzero(flat)
+        index.append(nz+z0*plane)
+        label.append(flat[nz])
+
+    index=np.concatenate(index).astype(np.int64)
+    label=np.concatenate(label)
+
+    #Cluster ids and binary masks often arrive as float/short from AFNI; store them compactly
+    if np.all(label==np.round(label)) and (len(label)==0 or label.min()>=0):
+        label=label.astype(label_dtype(int(label.max()) if len(label) else 0))
+    else:
+        label=label.astype(np.float32)
+    return SparseMap(shape, img.affine, index, label)
+
+
+def label_dtype(max_label):
+    """
+
+    Parameters
+    ----------
+    max_label : int
+        largest label value.
+
+    Returns
+    -------
+    numpy dtype
+        smallest unsigned dtype holding max_label.
+
+    """
+
+    for dtype in (np.uint8, np.uint16, np.uint32):
+        if max_label<=np.iinfo(dtype).max:
+            return dtype
+    return np.int64
+
+
+def save(sp, path):
+    """
+
+    Parameters
+    ----------
+    sp : SparseMap
+        map to save.
+    path : str
+        output .sparse.npz path.
+
+    Returns
+    -------
+    None.
+
+    """
+
+    np.savez_compressed(path, shape=np.asarray(sp.shape), affine=sp.affine, index=sp.index, label=sp.label)
+
+
+def load(path):
+    """
+
+    Parameters
+    ----------
+    path : str
+        .sparse.npz path.
+
+    Returns
+    -------
+    SparseMap
+        loaded map.
+
+    """
+
+    with np.load(path) as z:
+        return SparseMap(tuple(int(x) for x in z["shape"]), z["affine"], z["index"], z["label"])
+
+
+@timed
+def load_or_build(nifti, max_mem_mb=DEFAULT_MAX_MEM_MB):
+    """
+
+    Parameters
+    ----------
+    nifti : str
+        path to label or mask volume.
+    max_mem_mb : int
+        memory cap in MB.
+
+    Returns
+    -------
+    SparseMap
+        cached sparse map if it is newer than the NIfTI, otherwise rebuilt and written next to it.
+
+    """
+
+    path=sparse_path(nifti)
+    if os.path.exists(path) and (not os.path.exists(nifti) or os.path.getmtime(path)>=os.path.getmtime(nifti)):
+        return load(path)
+    sp=from_nifti(nifti, max_mem_mb)
+    save(sp, path)
+    return sp
+
+
+def check_grid(*maps):
+    """
+
+    Parameters
+    ----------
+    *maps : SparseMap
+        maps that must share a grid.
+
+    Raises
+    ------
+    Exception
+        shapes differ.
+
+    Returns
+    -------
+    None.
+
+    """
+
+    shapes={m.shape for m in maps}
+    if len(shapes)>1:
+        raise Exception("Sparse maps are on different grids: {}. Exiting...".format(shapes))
+
+
+def overlap_count(a, b):
+    """
+
+    Parameters
+    ----------
+    a : SparseMap
+    b : SparseMap
+
+    Returns
+    -------
+    int
+        number of voxels nonzero in both.
+
+    """
+
+    check_grid(a, b)
+    return len(np.intersect1d(a.index, b.index, assume_unique=True))
+
+
+def union(maps, weights=None):
+    """
+    Sparse equivalent of 3dcalc 'step(a)+step(b)+...', optionally weighted ('step(a)+2*step(b)').
+
+    Parameters
+    ----------
+    maps : list
+        SparseMaps on one grid.
+    weights : list
+        per-map integer weights (default 1).
+
+    Returns
+    -------
+    SparseMap
+        union of voxels, labelled with the sum of weights of the maps covering each voxel.
+
+    """
+
+    check_grid(*maps)
+    weights=[1]*len(maps) if weights is None else weights
+    index=np.concatenate([m.index for m in maps])
+    value=np.concatenate([np.full(len(m.index), w, dtype=np.int64) for m, w in zip(maps, weights)])
+    uniq, inverse=np.unique(index, return_inverse=True)
+    label=np.bincount(inverse, weights=value, minlength=len(uniq)).astype(np.int64)
+    return SparseMap(maps[0].shape, maps[0].affine, uniq, label.astype(label_dtype(label.max() if len(label) else 0)))
+
+
+def restrict(sp, index):
+    """
+
+    Parameters
+    ----------
+    sp : SparseMap
+        map to restrict.
+    index : array
+        sorted linear indices to keep.
+
+    Returns
+    -------
+    SparseMap
+        voxels of sp that are also in index.
+
+    """
+
+    keep=np.isin(sp.index, index, assume_unique=True)
+    return SparseMap(sp.shape, sp.affine, sp.index[keep], sp.label[keep])
+
+
+def label_overlap(a, b):
+    """
+
+    Parameters
+    ----------
+    a : SparseMap
+        cluster map.
+    b : SparseMap
+        cluster or manual map.
+
+    Returns
+    -------
+    pairs : array
+        (n, 2) label pairs (a, b) that share voxels.
+    counts : array
+        shared voxels per pair.
+
+    """
+
+    check_grid(a, b)
+    _, ia, ib=np.intersect1d(a.index, b.index, assume_unique=True, return_indices=True)
+    if len(ia)==0:
+        return np.zeros((0, 2), dtype=np.int64), np.zeros(0, dtype=np.int64)
+    pairs, counts=np.unique(np.stack([a.label[ia], b.label[ib]], axis=1).astype(np.int64), axis=0, return_counts=True)
+    return pairs, counts
+
+
+def gather(values, index, shape=None, max_mem_mb=DEFAULT_MAX_MEM_MB):
+    """
+
+    Parameters
+    ----------
+    values : str
+        path to intensity volume (or a mask, which may be archived; see archive.py).
+    index : array
+        sorted linear voxel indices (NIfTI order).
+    shape : tuple
+        expected grid shape, checked against the volume if given.
+    max_mem_mb : int
+        memory cap in MB.
+
+    Raises
+    ------
+    Exception
+        grid mismatch.
+
+    Returns
+    -------
+    array
+        float32 intensities at index. Only slabs that contain indices are read.
+
+    """
+
+    img=load_image(values)
+    vshape=img.shape[:3]
+    if shape is not None and tuple(shape)!=tuple(vshape):
+        raise Exception("{} and sparse map {} are on different grids. Exiting...".format(vshape, shape))
+
+    out=np.zeros(len(index), dtype=np.float32)
+    if len(index)==0:
+        return out
+    plane=vshape[0]*vshape[1]
+    depth=plan_slab_depth(vshape[:2], 8, max_mem_mb)
+    zs=index//plane
+    for (z0, z1), _ in slab_bounds(int(zs[0]), int(zs[-1])+1, depth):
+        lo, hi=np.searchsorted(zs, [z0, z1])
+        if lo==hi:
+            continue
+        flat=read_slab(img, z0, z1).ravel(order="F")
+        out[lo:hi]=flat[index[lo:hi]-z0*plane]
+    return out
+
+
+def to_nifti(sp, out, max_mem_mb=DEFAULT_MAX_MEM_MB):
+    """
+
+    Parameters
+    ----------
+    sp : SparseMap
+        map to densify.
+    out : str
+        path to output NIfTI; written slab by slab.
+    max_mem_mb : int
+        memory cap in MB.
+
+    Returns
+    -------
+    None.
+
+    """
+
+    shape=sp.shape
+    plane=shape[0]*shape[1]
+    dtype=sp.label.dtype
+    depth=plan_slab_depth(shape[:2], 2*np.dtype(dtype).itemsize, max_mem_mb)
+    f=open_nifti_writer(out, shape, sp.affine, dtype)
+    try:
+        for (z0, z1), _ in slab_bounds(0, shape[2], depth):
+            lo, hi=np.searchsorted(sp.index, [z0*plane, z1*plane])
+            flat=np.zeros(plane*(z1-z0), dtype=dtype)
+            flat[sp.index[lo:hi]-z0*plane]=sp.label[lo:hi]
+            write_slab(f, flat.reshape((shape[0], shape[1], z1-z0), order="F"), dtype)
+    finally:
+        f.close()
+
+
+def create_verification_map(clust_dir):
+    """
+    Sparse replacement for the two 3dcalc merges: 1 = detected only, 2 = clinician only, 3 = both.
+
+    Parameters
+    ----------
+    clust_dir : str
+        path to cluster PVS dir containing pvs_within_*.nii and manpvs.nii.
+
+    Returns
+    -------
+    SparseMap
+        merged map; also written to merged_pvs.nii and merged_pvs.sparse.npz.
+
+    """
+
+    detected=[load_or_build(os.path.join(clust_dir, "pvs_within_{}_cerebral_white_matter.nii".format(hemi)))
+              for hemi in ["left", "right"]]
+    manual=load_or_build(os.path.join(clust_dir, "manpvs.nii"))
+
+    both=union(detected)
+    both=SparseMap(both.shape, both.affine, both.index, np.ones(len(both.index), dtype=np.uint8))
+    merged=union([both, manual], weights=[1, 2])
+
+    out=os.path.join(clust_dir, "merged_pvs.nii")
+    to_nifti(merged, out)
+    save(merged, sparse_path(out))
+    return merged
+
+
+if __name__ == "__main__":
+    main()
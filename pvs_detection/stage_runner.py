@@ -0,0 +1,715 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Thu Oct 22 10:14:08 2026
+@author: Leela Srinivasan
+
+find_PVS.sh as a dependency graph of stages run by asyncio.
+Independent stages launch together under a per-subject concurrency limit: the left and right hemisphere chains
+(distance map, erosion, overlap, cluster, parse, compact, sparse, cluster database, depth stats) and the t2 alignment,
+which needs nothing from the t1 side (in ratio mode the candidate stages wait on it). Each stage's stdout/stderr
+goes to <subj>/logs/<stage>.log (3dClusterize reports still go to their .txt). A stage whose outputs already
+exist is skipped, as find_PVS.sh does; a failed stage blocks only its dependents, and the subject fails once
+everything still runnable has finished. The last stage writes <subj>/complete, which marks the subject processed
+(subjects with it are skipped); an interrupted or failed run leaves no marker and is picked up again. Timings,
+peak memory and output sizes are recorded in the run history (see run_history.py). run_batch runs several
+subjects (patients and HVs alike) under one stage limit; see pipeline.py.
+
+Syntax:       pvs subject [-m seg|vessel|ratio] [-c 3dseg|gmm] [-u 3dunifize|poly] [-t] [-j N] SUBJ [SUBJ ...]
+Dependencies: FreeSurfer (recon-all run), AFNI
+"""
+
+import os
+import sys
+import glob
+import time
+import shutil
+import asyncio
+import subprocess
+import argparse
+import traceback
+from collections import namedtuple
+from .run_history import DEFAULT_DB, record_run, dir_size, rss_mb
+from . import manifest, staging
+
+
+#Masks written by create_fs_masks.py
+STRUCTS=["left_cerebral_white_matter", "right_cerebral_white_matter"]
+
+
+Stage=namedtuple("Stage", ["name", "cmd", "deps", "outputs", "stdout", "when"],
+                 defaults=[(), (), None, None])
+
+
+def main(argv=None):
+
+    args=parse_args(sys.argv[1:] if argv is None else argv)
+    for subj in args.subjects:
+        status=asyncio.run(run_subject(subj, jobs=args.jobs, history=args.history, mode=args.mode,
+                                       classifier=args.classifier, unifize=args.unifize, tiled=args.tiled))
+        if status=="failed":
+            raise Exception("PVS processing failed for {}. Exiting...".format(subj))
+
+
+def parse_args(argv):
+    """
+
+    Parameters
+    ----------
+    argv : list
+        command line arguments.
+
+    Returns
+    -------
+    args : argparse.Namespace
+        parsed arguments.
+
+    """
+
+    parser=argparse.ArgumentParser(description="Run find_PVS stages concurrently as a dependency graph.")
+    parser.add_argument("subjects", nargs="+", help="p-numbers to process")
+    parser.add_argument("-m", "--mode", default="seg", choices=["seg", "vessel", "ratio"])
+    parser.add_argument("-c", "--classifier", default="3dseg", choices=["3dseg", "gmm"])
+    parser.add_argument("-u", "--unifize", default="3dunifize", choices=["3dunifize", "poly"])
+    parser.add_argument("-t", "--tiled", action="store_true")
+    parser.add_argument("-j", "--jobs", type=int, default=int(os.environ.get("PVS_SUBJECT_JOBS", 2)),
+                        help="concurrent stages per subject")
+    parser.add_argument("--history", default=DEFAULT_DB, help="run history database ('' to skip)")
+    return parser.parse_args(argv)
+
+
+async def run_subject(subj, jobs=2, limit=None, history=DEFAULT_DB, mode="seg", classifier="3dseg",
+                      unifize="3dunifize", tiled=False):
+    """
+
+    Parameters
+    ----------
+    subj : str
+        p-number or hv code.
+    jobs : int
+        stages allowed to run at once (recorded in the run history; the limit when none is shared).
+    limit : asyncio.Semaphore
+        stage limit shared with other subjects of a batch (see run_batch).
+    history : str
+        run history database ('' to skip).
+    mode, classifier, unifize, tiled :
+        detection options, as build_subject_graph.
+
+    Returns
+    -------
+    str
+        done, skipped (already complete) or failed (setup raised or a stage failed; reported, not raised, so a
+        batch carries on).
+
+    """
+
+    print("++ Working on {} ++".format(subj))
+    loop=asyncio.get_running_loop()
+    start=time.perf_counter()
+    try:
+        paths=subject_paths(subj)
+        if os.path.exists(paths["complete"]):
+            print("++ PVS processing complete for {}. Delete {} to rerun. ++".format(subj, paths["complete"]))
+            return "skipped"
+        bytes_before=dir_size(paths["pvs_dir"])
+        await loop.run_in_executor(None, prepare_subject, paths)
+        stages=build_subject_graph(paths, mode=mode, classifier=classifier, unifize=unifize, tiled=tiled)
+    except Exception as e:
+        print("++ {}: {} ++".format(subj, e))
+        return "failed"
+    results=await run_graph(stages, paths["logs"], jobs=jobs, limit=limit)
+    report(results)
+    failed=[name for name, result in results.items() if result[0]=="failed"]
+
+
+    #Keep timings, grid size and outputs for capacity planning (pvs history report)
+    if history:
+        record_run(paths, time.perf_counter()-start, mode=mode, classifier=classifier, tiled=tiled, jobs=jobs,
+                   status="failed" if failed else "done", stage_results=results, bytes_before=bytes_before,
+                   db=history)
+    if failed:
+        print("++ Stages failed for {}: {}. See {}. ++".format(subj, ", ".join(failed), paths["logs"]))
+        return "failed"
+    print("++ Launch output maps from {} and load csv data from {}. ++".format(paths["clusters"], paths["csv"]))
+    return "done"
+
+
+async def run_batch(subjects, jobs=4, subject_jobs=2, **options):
+    """
+
+    Parameters
+    ----------
+    subjects : list
+        p-numbers and hv codes, in any mix.
+    jobs : int
+        stages allowed to run at once across the whole batch.
+    subject_jobs : int
+        subjects in flight at once; a subject waiting on a long stage leaves its share of jobs to the others.
+    **options :
+        history and detection options, as run_subject.
+
+    Returns
+    -------
+    dict
+        subject -> done/skipped/failed.
+
+    """
+
+    limit=asyncio.Semaphore(max(1, jobs))
+    slots=asyncio.Semaphore(max(1, subject_jobs))
+
+    async def run(subj):
+        async with slots:
+            return await run_subject(subj, jobs=jobs, limit=limit, **options)
+
+    statuses=await asyncio.gather(*[run(subj) for subj in subjects])
+    return dict(zip(subjects, statuses))
+
+
+def subject_paths(subj):
+    """
+
+    Parameters
+    ----------
+    subj : str
+        p-number.
+
+    Raises
+    ------
+    Exception
+        FreeSurfer recon-all not run.
+
+    Returns
+    -------
+    dict
+        subject, session and every path find_PVS.sh derives for the subject, from the cohort manifest
+        (see manifest.py).
+
+    """
+
+    paths=manifest.lookup(subj)
+    if not paths["ses"]:
+        raise Exception("Freesurfer directory not found. Run freesurfer_proc.sh.")
+    return paths
+
+
+def prepare_subject(paths):
+    """
+    Directory setup and input staging (links where possible, t2 read in place), done up front as find_PVS.sh does.
+
+    Parameters
+    ----------
+    paths : dict
+        from subject_paths.
+
+    Raises
+    ------
+    Exception
+        SurfVol/T2w missing.
+
+    Returns
+    -------
+    None.
+
+    """
+
+    for key in ["t1_dir", "masks", "eroded", "distance", "logs", "overlap", "clusters", "csv"]:
+        os.makedirs(paths[key], exist_ok=True)
+
+
+    #Research t1 if one exists, otherwise the FreeSurfer SurfVol
+    paths["research_t1"]=None
+    inputs=staging.load_manifest(paths["inputs"])
+    if paths["research_t1_src"]:
+        f=paths["research_t1_src"]
+        paths["research_t1"]=os.path.join(paths["t1_dir"], os.path.basename(f))
+        inputs["research_t1"]=staging.stage_file(f, paths["research_t1"], inputs.get("research_t1"))
+
+    surfvol=paths["surfvol_src"]
+    if not os.path.exists(surfvol):
+        shutil.rmtree(paths["pvs_dir"])
+        raise Exception("SurfVol not found in FreeSurfer directory. Exiting...")
+    inputs["surfvol"]=staging.stage_file(surfvol, paths["surfvol"], inputs.get("surfvol"))
+
+    if not os.path.exists(paths["t2"]):
+        raise Exception("T2w image not found in BIDS anat directory. Exiting...")
+    inputs["t2"]=staging.in_place(paths["t2"], inputs.get("t2"))
+    staging.save_manifest(paths["inputs"], inputs)
+
+
+def pvs_cmd(*args):
+    """
+
+    Parameters
+    ----------
+    *args : str
+        pvs subcommand and its arguments.
+
+    Returns
+    -------
+    list
+        argv running the subcommand in a fresh interpreter (stages run concurrently, so not in this one).
+
+    """
+
+    return [sys.executable, "-m", __package__]+[str(a) for a in args]
+
+
+def build_subject_graph(paths, mode="seg", classifier="3dseg", unifize="3dunifize", tiled=False):
+    """
+
+    Parameters
+    ----------
+    paths : dict
+        from subject_paths/prepare_subject.
+    mode : str
+        seg, vessel or ratio.
+    classifier : str
+        3dseg or gmm.
+    unifize : str
+        3dunifize or poly.
+    tiled : bool
+        use the memory-capped tiled stages.
+
+    Returns
+    -------
+    list
+        Stage graph for one subject.
+
+    """
+
+    nn=os.environ.get("PVS_NN", "1")
+    clust_nvox=os.environ.get("PVS_CLUST_NVOX", "2")
+    erode_mm=os.environ.get("PVS_ERODE_MM", "2")
+    report_depths=os.environ.get("PVS_REPORT_DEPTHS", "1,2,3,4")
+    ratio_z=os.environ.get("PVS_RATIO_Z", "2")
+    ratio_within=os.environ.get("PVS_RATIO_INTERSECT", "0")=="1"
+    t1_dir=paths["t1_dir"]
+    unifized=os.path.join(t1_dir, "unifized_t1.nii")
+    stages=[]
+
+
+    #t1 preparation
+    t1=paths["surfvol"]
+    t1_deps=()
+    if paths["research_t1"]:
+        t1=os.path.join(t1_dir, "aligned_t1.nii")
+        stages.append(Stage("align_t1", ["3dAllineate", "-base", paths["surfvol"], "-source", paths["research_t1"],
+                                         "-prefix", t1], outputs=(t1,)))
+        t1_deps=("align_t1",)
+
+    if unifize=="poly":
+        cmd=pvs_cmd("unifize", "correct", t1, unifized, "--aseg", paths["aseg"])
+    else:
+        cmd=["3dUnifize", "-input", t1, "-GM", "-prefix", unifized]
+    stages.append(Stage("unifize", cmd, t1_deps, outputs=(unifized,)))
+
+
+    #Tissue classes for seg mode (and ratio mode intersected with the GM candidates)
+    classes=os.path.join(paths["classification"], "Classes+orig.HEAD")
+    class_deps=()
+    use_classes=mode=="seg" or (mode=="ratio" and ratio_within)
+    if use_classes and classifier=="3dseg":
+        stages.append(Stage("segment", ["3dSeg", "-anat", unifized, "-mask", "AUTO", "-classes", "CSF ; GM ; WM",
+                                        "-prefix", paths["classification"]],
+                            ("unifize",), outputs=(classes,)))
+        class_deps=("segment",)
+    elif use_classes:
+        classes=os.path.join(paths["classification"], "Classes.nii")
+        masks=[os.path.join(paths["masks"], "{}.nii".format(s)) for s in STRUCTS]
+        os.makedirs(paths["classification"], exist_ok=True)
+        stages.append(Stage("classify", pvs_cmd("tissue", "classify", unifized, classes, *masks),
+                            ("unifize", "masks"), outputs=(classes,)))
+        class_deps=("classify",)
+
+
+    #FreeSurfer masks for both hemispheres
+    masks_cmd=pvs_cmd("masks", paths["subj"], *(["--tiled"] if tiled else []),
+                      *(["--session", paths["session"]] if paths.get("session") else []))
+    stages.append(Stage("masks", masks_cmd,
+                        outputs=tuple(os.path.join(paths["masks"], "{}.nii".format(s)) for s in STRUCTS)))
+
+
+    #Independent per-hemisphere chains
+    aligned_t2=os.path.join(t1_dir, "aligned_t2.nii")
+    ratio=(t1, t1_deps, aligned_t2, ratio_z, ratio_within) if mode=="ratio" else None
+    for struct in STRUCTS:
+        stages.extend(hemisphere_stages(paths, struct, mode, tiled, classes, class_deps, unifized,
+                                        nn, clust_nvox, erode_mm, report_depths, ratio))
+
+
+    #Per-label PVS counts once both hemispheres are clustered
+    regional=os.path.join(paths["csv"], "regional_pvs.csv")
+    seg=os.path.join(paths["fs_dir"], "mri", os.environ.get("PVS_REGION_SEG", "aseg.mgz"))
+    stages.append(Stage("regions", pvs_cmd("regions", paths["clusters"], seg, regional),
+                        tuple("sparse_{}".format(s) for s in STRUCTS), outputs=(regional,)))
+
+
+    #t2 alignment only needs the SurfVol
+    stages.append(Stage("align_t2", ["3dAllineate", "-base", paths["surfvol"], "-source", paths["t2"],
+                                     "-prefix", aligned_t2], outputs=(aligned_t2,)))
+
+
+    #Move exams for manual verification once everything has finished
+    stages.append(Stage("finalize", lambda: finalize(paths), tuple(s.name for s in stages)))
+
+
+    #Overlay montage for QC, from the niftis finalize moved into clusters (primary run only)
+    if not paths.get("session"):
+        pvs_root=os.path.dirname(paths["pvs_dir"])
+        stages.append(Stage("qc", pvs_cmd("qc", paths["subj"], "--pvs-root", pvs_root, "--workers", "1"),
+                            ("finalize",)))
+
+
+    #Completion marker, only reached when every other stage succeeded
+    stages.append(Stage("complete", lambda: mark_complete(paths), tuple(s.name for s in stages),
+                        outputs=(paths["complete"],)))
+    return stages
+
+
+def hemisphere_stages(paths, struct, mode, tiled, classes, class_deps, unifized, nn, clust_nvox, erode_mm,
+                      report_depths, ratio=None):
+    """
+
+    Parameters
+    ----------
+    paths : dict
+        from subject_paths.
+    struct : str
+        mask name.
+    mode : str
+        seg, vessel or ratio.
+    tiled : bool
+        use the memory-capped tiled stages.
+    classes : str
+        path to the Classes volume.
+    class_deps : tuple
+        stages producing classes.
+    unifized : str
+        path to unifized t1.
+    nn, clust_nvox, erode_mm, report_depths : str
+        PVS_NN, PVS_CLUST_NVOX, PVS_ERODE_MM and PVS_REPORT_DEPTHS.
+    ratio : tuple
+        ratio mode only: (t1, stages producing t1, aligned t2, PVS_RATIO_Z, intersect with the GM candidates).
+
+    Returns
+    -------
+    list
+        erosion, candidate, cluster and report stages for one mask; stage names end in _<struct>.
+
+    """
+
+    nii="{}.nii".format(struct)
+    eroded=os.path.join(paths["eroded"], "eroded_{}".format(nii))
+    distance=os.path.join(paths["distance"], "distance_{}".format(nii))
+    cluster_map=os.path.join(paths["clusters"], "pvs_within_{}".format(nii))
+    report_txt=os.path.join(paths["clusters"], "pvs_within_{}.txt".format(struct))
+    csv=os.path.join(paths["csv"], "pvs_within_{}.csv".format(struct))
+    name=lambda s: "{}_{}".format(s, struct)
+    stages=[]
+
+    stages.append(Stage(name("distance"), pvs_cmd("erosion", "distance", paths["masks"], paths["distance"],
+                                                  "--mask", nii), ("masks",)))
+    stages.append(Stage(name("erode"), pvs_cmd("erosion", "erode", paths["masks"], paths["distance"],
+                                               paths["eroded"], erode_mm, "--mask", nii),
+                        (name("distance"),), outputs=(eroded,)))
+
+
+    #Candidate voxels within the eroded mask; in ratio mode the GM candidates are only built to intersect with
+    gm_stage=name("gm") if mode=="ratio" else name("candidate")
+    use_gm=mode=="seg" or (mode=="ratio" and ratio[4])
+    if mode=="vessel":
+        candidate=os.path.join(paths["overlap"], "vessel_within_{}".format(nii))
+        stages.append(Stage(name("candidate"), pvs_cmd("vessel", unifized, eroded, candidate),
+                            (name("erode"), "unifize"), outputs=(candidate,)))
+    elif use_gm and tiled:
+        candidate=os.path.join(paths["overlap"], "gm_within_{}".format(nii))
+        stages.append(Stage(gm_stage, pvs_cmd("tiled", "overlap", eroded, classes, candidate),
+                            (name("erode"),)+class_deps, outputs=(candidate,)))
+    elif use_gm:
+        overlap=os.path.join(paths["overlap"], "overlap_{}".format(nii))
+        candidate=os.path.join(paths["overlap"], "gm_within_{}".format(nii))
+        stages.append(Stage(name("overlap"), ["3dcalc", "-a", eroded, "-b", classes, "-expr", "step(a)*b",
+                                              "-datum", "byte", "-prefix", overlap],
+                            (name("erode"),)+class_deps, outputs=(overlap,)))
+        stages.append(Stage(gm_stage, ["3dcalc", "-a", overlap, "-expr", "equals(a,2)", "-datum", "byte",
+                                       "-prefix", candidate],
+                            (name("overlap"),), outputs=(candidate,)))
+
+    if mode=="ratio":
+        t1, t1_deps, aligned_t2, ratio_z, ratio_within=ratio
+        ratio_map=os.path.join(paths["overlap"], "ratio_within_{}".format(nii))
+        cmd=["ratio", t1, aligned_t2, eroded, ratio_map, "--z", ratio_z]
+        deps=(name("erode"), "align_t2")+t1_deps
+        if ratio_within:
+            cmd+=["--within", candidate]
+            deps+=(gm_stage,)
+        candidate=ratio_map
+        stages.append(Stage(name("candidate"), pvs_cmd(*cmd), deps, outputs=(candidate,)))
+
+
+    #Cluster and report
+    if tiled:
+        stages.append(Stage(name("cluster"), pvs_cmd("clusters", candidate, cluster_map, csv, "--nn", nn,
+                                                     "--min-size", clust_nvox, "--threshold", "0.5"),
+                            (name("candidate"),), outputs=(csv,)))
+        sparse_deps=(name("cluster"),)
+    else:
+        stages.append(Stage(name("cluster"), ["3dClusterize", "-inset", candidate, "-NN", nn,
+                                              "-1sided", "RIGHT", "0.5", "-ithr", "0", "-idat", "0",
+                                              "-clust_nvox", clust_nvox, "-pref_map", cluster_map],
+                            (name("candidate"),), outputs=(report_txt,), stdout=report_txt))
+        stages.append(Stage(name("parse"), pvs_cmd("parse", report_txt, csv), (name("cluster"),)))
+
+        #3dClusterize writes short maps; rewrite at the smallest dtype (uint8 for up to 255 clusters)
+        stages.append(Stage(name("compact"), pvs_cmd("archive", "compact", cluster_map), (name("cluster"),),
+                            when=lambda: os.path.exists(cluster_map)))
+        sparse_deps=(name("parse"), name("compact"))
+
+    stages.append(Stage(name("sparse"), pvs_cmd("sparse", "convert", cluster_map), sparse_deps,
+                        when=lambda: os.path.exists(cluster_map)))
+    if not paths.get("session"):
+        stages.append(Stage(name("clusterdb"), pvs_cmd("clusterdb", "add", paths["subj"], "--hemi",
+                                                       struct.split("_")[0],
+                                                       "--pvs-root", os.path.dirname(paths["pvs_dir"])),
+                            (name("sparse"),), when=lambda: os.path.exists(cluster_map)))
+
+    depth_src=[candidate] if mode in ["vessel", "ratio"] else [classes, "--label", "2"]
+    stages.append(Stage(name("depth"), pvs_cmd("erosion", "depth-stats", distance, *depth_src,
+                                               os.path.join(paths["csv"], "depth_stats_{}.csv".format(struct)),
+                                               "--depths", report_depths),
+                        (name("distance"), name("candidate"))))
+    return stages
+
+
+def finalize(paths):
+    """
+    Move t1-level niftis into clusters for manual verification.
+
+    Parameters
+    ----------
+    paths : dict
+        from subject_paths.
+
+    Returns
+    -------
+    None.
+
+    """
+
+    for f in glob.glob(os.path.join(paths["t1_dir"], "*.nii*")):
+        if os.path.isfile(f):
+            shutil.move(f, os.path.join(paths["clusters"], os.path.basename(f)))
+
+
+def mark_complete(paths):
+    """
+
+    Parameters
+    ----------
+    paths : dict
+        from subject_paths.
+
+    Returns
+    -------
+    None. Writes the completion marker (manifest 'processed', watch 'done').
+
+    """
+
+    with open(paths["complete"], "w") as f:
+        f.write(time.strftime("%Y-%m-%d %H:%M:%S\n"))
+
+
+def check_graph(stages):
+    """
+
+    Parameters
+    ----------
+    stages : list
+        Stage graph.
+
+    Raises
+    ------
+    Exception
+        Duplicate stage names, unknown dependencies or a cycle (which would otherwise hang the runner).
+
+    Returns
+    -------
+    None.
+
+    """
+
+    names=[s.name for s in stages]
+    if len(set(names))!=len(names):
+        raise Exception("Duplicate stage names in graph.")
+    deps={s.name: set(s.deps) for s in stages}
+    for name, d in deps.items():
+        if not d<=deps.keys():
+            raise Exception("Stage {} depends on unknown stages {}.".format(name, sorted(d-deps.keys())))
+
+    done=set()
+    while len(done)<len(deps):
+        ready=[n for n, d in deps.items() if n not in done and d<=done]
+        if len(ready)==0:
+            raise Exception("Stage graph has a cycle among {}.".format(sorted(deps.keys()-done)))
+        done.update(ready)
+
+
+async def run_graph(stages, log_dir, jobs=2, limit=None):
+    """
+
+    Parameters
+    ----------
+    stages : list
+        Stage graph.
+    log_dir : str
+        dir for per-stage logs.
+    jobs : int
+        stages allowed to run at once.
+    limit : asyncio.Semaphore
+        shared stage limit, used instead of jobs (see run_batch).
+
+    Returns
+    -------
+    dict
+        stage name -> (status, seconds, peak_rss_mb); status is done, skipped, failed or blocked (a dependency
+        failed).
+
+    """
+
+    check_graph(stages)
+    os.makedirs(log_dir, exist_ok=True)
+    limit=limit or asyncio.Semaphore(max(1, jobs))
+    tasks={}
+    results={}
+
+    async def run(stage):
+        for dep in stage.deps:
+            await tasks[dep]
+        if any(results[dep][0] in ["failed", "blocked"] for dep in stage.deps):
+            results[stage.name]=("blocked", 0.0, None)
+        elif (stage.outputs and all(os.path.exists(f) for f in stage.outputs)) or \
+                (stage.when is not None and not stage.when()):
+            results[stage.name]=("skipped", 0.0, None)
+        else:
+            async with limit:
+                results[stage.name]=await run_stage(stage, os.path.join(log_dir, "{}.log".format(stage.name)))
+
+    for stage in stages:
+        tasks[stage.name]=asyncio.ensure_future(run(stage))
+    await asyncio.gather(*tasks.values())
+    return {s.name: results[s.name] for s in stages}
+
+
+async def run_stage(stage, log):
+    """
+
+    Parameters
+    ----------
+    stage : Stage
+        command list, or a callable run in a worker thread.
+    log : str
+        path to the stage log (stdout and stderr, unless stdout is redirected).
+
+    Returns
+    -------
+    tuple
+        (status, seconds, peak_rss_mb); peak memory is only known for commands.
+
+    """
+
+    print("++ Starting {} ++".format(stage.name))
+    start=time.perf_counter()
+    peak=None
+    loop=asyncio.get_running_loop()
+    with open(log, "wb") as log_f:
+        if callable(stage.cmd):
+            try:
+                await loop.run_in_executor(None, stage.cmd)
+                code=0
+            except Exception:
+                log_f.write(traceback.format_exc().encode())
+                code=1
+        else:
+            log_f.write("{}\n".format(" ".join(stage.cmd)).encode())
+            log_f.flush()
+            out_f=open(stage.stdout, "wb") if stage.stdout else log_f
+            try:
+                code, peak=await loop.run_in_executor(None, run_command, stage.cmd, out_f, log_f)
+            except OSError:
+                log_f.write(traceback.format_exc().encode())
+                code=127
+            finally:
+                if stage.stdout:
+                    out_f.close()
+
+    seconds=time.perf_counter()-start
+    status="done" if code==0 else "failed"
+    print("++ {} {} in {:.1f} s{} ++".format(stage.name, status, seconds,
+                                              "" if code==0 else " (see {})".format(log)))
+    return status, seconds, peak
+
+
+def run_command(cmd, out_f, log_f):
+    """
+
+    Parameters
+    ----------
+    cmd : list
+        argv.
+    out_f, log_f : file
+        stdout and stderr targets.
+
+    Returns
+    -------
+    code : int
+        exit code.
+    peak : float
+        peak resident memory of the command in MB; reaped with wait4 in a worker thread so its own rusage is
+        available, which asyncio's child watcher would discard.
+
+    """
+
+    proc=subprocess.Popen(cmd, stdout=out_f, stderr=log_f, env=stage_env())
+    _, status, usage=os.wait4(proc.pid, 0)
+    proc.returncode=os.waitstatus_to_exitcode(status)
+    return proc.returncode, rss_mb(usage.ru_maxrss)
+
+
+def stage_env():
+    """
+
+    Returns
+    -------
+    dict
+        environment with this package importable, for pvs subcommand stages.
+
+    """
+
+    env=dict(os.environ)
+    root=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env["PYTHONPATH"]=os.pathsep.join([root]+([env["PYTHONPATH"]] if env.get("PYTHONPATH") else []))
+    return env
+
+
+def report(results):
+    """
+
+    Parameters
+    ----------
+    results : dict
+        from run_graph.
+
+    Returns
+    -------
+    None.
+
+    """
+
+    for name, (status, seconds, peak) in results.items():
+        print("{:<40} {:<8} {:>8.1f} s {:>8}".format(name, status, seconds, "" if peak is None else
+                                                     "{:.0f} MB".format(peak)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,282 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Wed Oct 28 10:05:17 2026
+@author: Leela Srinivasan
+
+Copy-free input staging.
+Inputs that are only read (the t2 before 3dAllineate) are used in place from BIDS. Inputs kept with the subject
+for manual verification (SurfVol, research t1) are staged into the t1 dir as a reflink (copy-on-write clone),
+else a hardlink, and only copied when the filesystem supports neither. Pipeline stages never write to their
+inputs, so a linked file is never modified through the subject dir. A destination that already holds the same
+file (same inode, or same size and SHA-256) is left alone. Every input is recorded in <subj>/inputs.json with its
+source, how it was staged, size, mtime and checksum; checksums are reused while size and mtime are unchanged.
+
+Syntax:       pvs stage SRC [DEST] --manifest <subj>/inputs.json [--role NAME]
+              (no DEST records SRC as read in place)
+Dependencies: None
+"""
+
+import os
+import sys
+import json
+import time
+import fcntl
+import shutil
+import hashlib
+import argparse
+import platform
+import subprocess
+
+
+#Linux FICLONE ioctl (btrfs, xfs, ...)
+FICLONE=0x40049409
+
+#Read size for checksums
+CHUNK=1<<20
+
+
+def main(argv=None):
+
+    args=parse_args(sys.argv[1:] if argv is None else argv)
+    if not os.path.exists(args.src):
+        raise Exception("Input {} not found. Exiting...".format(args.src))
+    manifest=load_manifest(args.manifest)
+    role=args.role or os.path.basename(args.dest or args.src)
+    if args.dest:
+        entry=stage_file(args.src, args.dest, manifest.get(role))
+    else:
+        entry=in_place(args.src, manifest.get(role))
+    manifest[role]=entry
+    save_manifest(args.manifest, manifest)
+    print("Staged {} ({}).".format(entry["path"], entry["method"]))
+
+
+def parse_args(argv):
+    """
+
+    Parameters
+    ----------
+    argv : list
+        command line arguments.
+
+    Returns
+    -------
+    args : argparse.Namespace
+        parsed arguments.
+
+    """
+
+    parser=argparse.ArgumentParser(description="Stage an input by reflink/hardlink/checksum-skipped copy.")
+    parser.add_argument("src", help="input file")
+    parser.add_argument("dest", nargs="?", default=None, help="staged path (omit to read src in place)")
+    parser.add_argument("--manifest", required=True, help="provenance JSON (e.g. <subj>/inputs.json)")
+    parser.add_argument("--role", default=None, help="manifest key (default: basename of the staged path)")
+    return parser.parse_args(argv)
+
+
+def load_manifest(manifest):
+    """
+
+    Parameters
+    ----------
+    manifest : str
+        path to inputs.json.
+
+    Returns
+    -------
+    dict
+        role -> entry, empty if the manifest doesn't exist yet.
+
+    """
+
+    if not os.path.exists(manifest):
+        return {}
+    with open(manifest, "r") as f:
+        return json.load(f)
+
+
+def save_manifest(manifest, entries):
+    """
+
+    Parameters
+    ----------
+    manifest : str
+        path to inputs.json; written to a temporary file and renamed over.
+    entries : dict
+        role -> entry.
+
+    Returns
+    -------
+    None.
+
+    """
+
+    os.makedirs(os.path.dirname(os.path.abspath(manifest)), exist_ok=True)
+    tmp=manifest+".tmp"
+    with open(tmp, "w") as f:
+        json.dump(entries, f, indent=2, sort_keys=True)
+    os.replace(tmp, manifest)
+
+
+def checksum(path):
+    """
+
+    Parameters
+    ----------
+    path : str
+        file to hash.
+
+    Returns
+    -------
+    str
+        SHA-256 hex digest, read in 1 MB chunks.
+
+    """
+
+    h=hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(CHUNK), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def file_state(path, previous=None, key="path"):
+    """
+
+    Parameters
+    ----------
+    path : str
+        file to describe.
+    previous : dict
+        earlier manifest entry; its checksum is reused if size and mtime still match.
+    key : str
+        'path' or 'source', the previous entry's fields to compare against.
+
+    Returns
+    -------
+    dict
+        size, mtime and sha256.
+
+    """
+
+    st=os.stat(path)
+    prefix="" if key=="path" else "source_"
+    if previous and previous.get(key)==path and previous.get(prefix+"size")==st.st_size \
+            and previous.get(prefix+"mtime")==st.st_mtime:
+        digest=previous[prefix+"sha256"]
+    else:
+        digest=checksum(path)
+    return {"size": st.st_size, "mtime": st.st_mtime, "sha256": digest}
+
+
+def reflink(src, dest):
+    """
+
+    Parameters
+    ----------
+    src : str
+        source file.
+    dest : str
+        clone to create (must not exist).
+
+    Returns
+    -------
+    bool
+        True if a copy-on-write clone was made (FICLONE on Linux, clonefile through cp -c on macOS).
+
+    """
+
+    if platform.system()=="Darwin":
+        return subprocess.run(["cp", "-c", src, dest], stderr=subprocess.DEVNULL).returncode==0
+    try:
+        with open(src, "rb") as s, open(dest, "wb") as d:
+            fcntl.ioctl(d.fileno(), FICLONE, s.fileno())
+        return True
+    except OSError:
+        if os.path.exists(dest):
+            os.remove(dest)
+        return False
+
+
+def stage_file(src, dest, previous=None):
+    """
+
+    Parameters
+    ----------
+    src : str
+        input file.
+    dest : str
+        staged path.
+    previous : dict
+        earlier manifest entry for this input.
+
+    Returns
+    -------
+    dict
+        manifest entry: source, path, method (linked/verified/reflink/hardlink/copy), staged time, and size,
+        mtime and sha256 of both the source and the staged file.
+
+    """
+
+    entry=in_place(src, previous)
+    src=entry["source"]
+    dest=os.path.abspath(dest)
+    entry["path"]=dest
+
+
+    #Already the same file, or an identical copy
+    method=None
+    if os.path.exists(dest):
+        if os.path.samefile(src, dest):
+            method="linked"
+        elif os.path.getsize(dest)==entry["source_size"] and \
+                file_state(dest, previous)["sha256"]==entry["source_sha256"]:
+            method="verified"
+        else:
+            os.remove(dest)
+
+
+    #Clone, else link, else copy
+    if method is None:
+        os.makedirs(os.path.dirname(dest), exist_ok=True)
+        if reflink(src, dest):
+            method="reflink"
+        else:
+            try:
+                os.link(src, dest)
+                method="hardlink"
+            except OSError:
+                shutil.copyfile(src, dest)
+                method="copy"
+    st=os.stat(dest)
+    entry.update({"method": method, "size": st.st_size, "mtime": st.st_mtime, "sha256": entry["source_sha256"]})
+    return entry
+
+
+def in_place(src, previous=None):
+    """
+
+    Parameters
+    ----------
+    src : str
+        input read where it is.
+    previous : dict
+        earlier manifest entry for this input.
+
+    Returns
+    -------
+    dict
+        manifest entry with method 'in place' and the source's size, mtime and sha256.
+
+    """
+
+    src=os.path.abspath(src)
+    source=file_state(src, previous, key="source")
+    return {"source": src, "path": os.path.abspath(src), "method": "in place",
+            "source_size": source["size"], "source_mtime": source["mtime"], "source_sha256": source["sha256"],
+            "staged": time.strftime("%Y-%m-%d %H:%M:%S")}
+
+
+if __name__ == "__main__":
+    main()
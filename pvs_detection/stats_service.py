@@ -0,0 +1,687 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Fri Nov 13 10:05:17 2026
+@author: Leela Srinivasan
+
+Local read-only HTTP query service over the compiled PVS statistics and the cohort cluster database.
+compile_stats.py writes each subject's summary row (WM volumes, PVS count/volume/mean per hemisphere, regional
+groups, MRI date and age) to a SQLite store (PVS_STATS_DB, default summary/pvs_stats.sqlite) alongside the
+spreadsheets, stamping the row with its update time; `import` seeds the store from existing spreadsheets.
+The service answers from the stats store and cluster_db.py, so nobody has to open integrated_pvs_project.xlsx for
+a number. Responses are JSON and sit in an LRU cache. Before each request the service checks which subjects were
+updated (stats rows and cluster maps) since it last looked; entries for those subjects and every cohort-wide
+entry are dropped, the rest are still served from the cache. Binds to localhost by default.
+`test DIR` builds a small fixture stats store and cluster database in DIR, serves them on a free port and checks
+every endpoint, including what is re-read after update_subject and a replaced cluster map.
+
+Endpoints:    GET /subjects                               subjects, group and last update
+              GET /subjects/<subj>                        summary row plus per-hemisphere cluster counts
+              GET /cohort[?group=hv|patient]              n, mean, sd, median, min, max of every statistic
+              GET /clusters?[subject=][&hemi=][&group=][&min_voxels=][&max_voxels=][&box=x0,x1,y0,y1,z0,z1]
+                            [&near=x,y,z[&radius=10]][&limit=1000]   filtered cluster list (MNI mm)
+              GET /health                                 store paths and cache statistics (never cached)
+
+Syntax:       pvs service serve [--host 127.0.0.1] [--port 8765] [--cache-size 1024] [--stats-db DB]
+                                [--cluster-db DB]
+              pvs service import [--stats-db DB] [XLSX ...]   (default: the integrated and HV spreadsheets)
+              pvs service test DIR
+Dependencies: pandas, NumPy
+"""
+
+import os
+import sys
+import json
+import math
+import time
+import sqlite3
+import argparse
+import threading
+import urllib.error
+import urllib.request
+import numpy as np
+from collections import OrderedDict
+from urllib.parse import urlparse, parse_qs, unquote
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from . import manifest
+
+
+DEFAULT_DB=os.environ.get("PVS_STATS_DB", os.path.join(manifest.SUMMARY_DIR, "pvs_stats.sqlite"))
+
+SCHEMA="""
+CREATE TABLE IF NOT EXISTS subject_stats (
+    subject TEXT PRIMARY KEY,
+    grp TEXT,
+    stats TEXT NOT NULL,
+    updated REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS subject_stats_updated ON subject_stats(updated);
+"""
+
+#Spreadsheet columns kept in the store (no names or DOB), as compile_stats.py builds them
+STAT_COLUMNS=["Left WM Volume", "Right WM Volume", "Left PVS Count", "Left PVS Volume", "Left PVS Mean Volume",
+              "Right PVS Count", "Right PVS Volume", "Right PVS Mean Volume"]
+DATE_COLUMNS=["mri_date", "age_at_mri"]
+
+#Filters /clusters accepts, passed to cluster_db as keyword arguments
+CLUSTER_FILTERS={"hemi": str, "group": str, "subject": str, "min_voxels": int, "max_voxels": int}
+
+#Fixture cohort for `test`: subject -> group
+FIXTURE_SUBJECTS={"p001": "patient", "p002": "patient", "hv001": "hv"}
+
+
+def main(argv=None):
+
+    args=parse_args(sys.argv[1:] if argv is None else argv)
+    if args.command=="import":
+        con=connect(args.stats_db)
+        try:
+            files=args.xlsx or [os.path.join(manifest.SUMMARY_DIR, "integrated_pvs_project.xlsx"),
+                                os.path.join(manifest.SUMMARY_DIR, "hv_stats.xlsx")]
+            n=sum(import_excel(con, f) for f in files)
+        finally:
+            con.close()
+        print("Imported {} subjects into {}.".format(n, args.stats_db))
+        return
+    if args.command=="test":
+        run_test(args.dir)
+        return
+
+    from .cluster_db import DEFAULT_DB as cluster_db
+    store=Store(args.stats_db, args.cluster_db or cluster_db, args.cache_size)
+    server=ThreadingHTTPServer((args.host, args.port), make_handler(store))
+    print("Serving PVS statistics on http://{}:{} (stats {}, clusters {}).".format(
+        args.host, server.server_address[1], store.stats_db, store.cluster_db))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+def parse_args(argv):
+    """
+
+    Parameters
+    ----------
+    argv : list
+        command line arguments.
+
+    Returns
+    -------
+    args : argparse.Namespace
+        parsed arguments.
+
+    """
+
+    parser=argparse.ArgumentParser(description="Local read-only query service over compiled PVS statistics.")
+    sub=parser.add_subparsers(dest="command", required=True)
+
+    p=sub.add_parser("serve", help="answer JSON queries over HTTP")
+    p.add_argument("--host", default="127.0.0.1", help="address to bind (localhost only by default)")
+    p.add_argument("--port", type=int, default=8765, help="port (0 picks a free one)")
+    p.add_argument("--cache-size", type=int, default=1024, help="responses kept in the LRU cache")
+    p.add_argument("--stats-db", default=DEFAULT_DB, help="subject stats store")
+    p.add_argument("--cluster-db", default=None, help="cluster database (default PVS_CLUSTER_DB)")
+
+    p=sub.add_parser("import", help="seed the stats store from compiled spreadsheets")
+    p.add_argument("xlsx", nargs="*", help="integrated_pvs_project.xlsx / hv_stats.xlsx style spreadsheets")
+    p.add_argument("--stats-db", default=DEFAULT_DB, help="subject stats store")
+
+    p=sub.add_parser("test", help="serve fixture databases and check every endpoint")
+    p.add_argument("dir", help="scratch dir for the fixture databases (replaced)")
+    return parser.parse_args(argv)
+
+
+def connect(db=DEFAULT_DB):
+    """
+
+    Parameters
+    ----------
+    db : str
+        path to stats store; created with its schema on first use.
+
+    Returns
+    -------
+    sqlite3.Connection
+        open connection.
+
+    """
+
+    os.makedirs(os.path.dirname(os.path.abspath(db)), exist_ok=True)
+    con=sqlite3.connect(db, timeout=60)
+    con.executescript(SCHEMA)
+    return con
+
+
+def stat_value(value):
+    """
+
+    Parameters
+    ----------
+    value : object
+        spreadsheet cell.
+
+    Returns
+    -------
+    float, str or None
+        numbers as float, empty cells and NaN as None, anything else (dates) as str.
+
+    """
+
+    if value is None or (isinstance(value, str) and not value.strip()):
+        return None
+    try:
+        value=float(value)
+    except (TypeError, ValueError):
+        return str(value)
+    return None if math.isnan(value) else value
+
+
+def subject_stats(row):
+    """
+
+    Parameters
+    ----------
+    row : dict or pd.Series
+        one subject's spreadsheet row.
+
+    Returns
+    -------
+    dict
+        the statistics columns of the row (STAT_COLUMNS, DATE_COLUMNS and regional '<Group> PVS Count/Volume').
+
+    """
+
+    return {col: stat_value(row[col]) for col in dict(row) if col in STAT_COLUMNS+DATE_COLUMNS or
+            (isinstance(col, str) and col.endswith((" PVS Count", " PVS Volume")))}
+
+
+def update_subject(con, subj, group, row):
+    """
+
+    Parameters
+    ----------
+    con : sqlite3.Connection
+        open stats store.
+    subj : str
+        p-number or hv code.
+    group : str
+        hv or patient.
+    row : dict or pd.Series
+        subject's spreadsheet row; only its statistics columns are stored.
+
+    Returns
+    -------
+    None.
+
+    """
+
+    con.execute("INSERT OR REPLACE INTO subject_stats VALUES (?, ?, ?, ?)",
+                (subj, group, json.dumps(subject_stats(row)), time.time()))
+    con.commit()
+
+
+def import_excel(con, xlsx):
+    """
+
+    Parameters
+    ----------
+    con : sqlite3.Connection
+        open stats store.
+    xlsx : str
+        compiled spreadsheet with a pnum column (subject) per row.
+
+    Raises
+    ------
+    Exception
+        spreadsheet written before compile_stats.py added pnum to the HV sheet.
+
+    Returns
+    -------
+    int
+        subjects imported.
+
+    """
+
+    import pandas as pd
+    if not os.path.exists(xlsx):
+        print("{} not found. Continuing...".format(xlsx))
+        return 0
+    from .template_density import subject_group
+    df=pd.read_excel(xlsx)
+    if "pnum" not in df.columns:
+        raise Exception("{} has no pnum column; rerun pvs stats to rebuild it. Exiting...".format(xlsx))
+    rows=[(str(r["pnum"]), r) for _, r in df.iterrows() if stat_value(r["pnum"]) is not None]
+    for subj, row in rows:
+        update_subject(con, subj, subject_group(subj), row)
+    return len(rows)
+
+
+def summarize(values):
+    """
+
+    Parameters
+    ----------
+    values : list
+        numeric values (None skipped).
+
+    Returns
+    -------
+    dict
+        n, mean, sd (sample), median, min and max.
+
+    """
+
+    v=np.asarray([x for x in values if isinstance(x, float)], dtype=float)
+    if len(v)==0:
+        return {"n": 0}
+    return {"n": int(len(v)), "mean": float(v.mean()), "sd": float(v.std(ddof=1)) if len(v)>1 else None,
+            "median": float(np.median(v)), "min": float(v.min()), "max": float(v.max())}
+
+
+class LRUCache:
+    """
+    Response cache keyed by (subject or None, endpoint, query); None marks cohort-wide entries.
+    """
+
+    def __init__(self, size):
+        self.size=size
+        self.entries=OrderedDict()
+        self.hits=self.misses=0
+        self.lock=threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                self.hits+=1
+                return self.entries[key]
+            self.misses+=1
+            return None
+
+    def put(self, key, value):
+        with self.lock:
+            self.entries[key]=value
+            self.entries.move_to_end(key)
+            while len(self.entries)>self.size:
+                self.entries.popitem(last=False)
+
+    def invalidate(self, subjects):
+        with self.lock:
+            for key in [k for k in self.entries if k[0] is None or k[0] in subjects]:
+                del self.entries[key]
+
+
+class Store:
+    """
+    Stats store and cluster database behind the service, with per-thread connections and the response cache.
+    """
+
+    def __init__(self, stats_db, cluster_db, cache_size=1024):
+        self.stats_db=stats_db
+        self.cluster_db=cluster_db
+        self.cache=LRUCache(cache_size)
+        self.local=threading.local()
+        self.lock=threading.Lock()
+        self.seen_stats=0.0
+        self.seen_maps={}
+        self.refresh()
+
+    def connections(self):
+        """
+
+        Returns
+        -------
+        tuple
+            this thread's (stats, clusters) connections; the cluster one is None until its database exists.
+
+        """
+
+        if getattr(self.local, "stats", None) is None:
+            self.local.stats=connect(self.stats_db)
+        if getattr(self.local, "clusters", None) is None and os.path.exists(self.cluster_db):
+            from .cluster_db import connect as connect_clusters
+            self.local.clusters=connect_clusters(self.cluster_db)
+        return self.local.stats, getattr(self.local, "clusters", None)
+
+    def refresh(self):
+        """
+        Drop cache entries of subjects whose stats row or cluster maps changed since the last check.
+
+        Returns
+        -------
+        set
+            changed subjects.
+
+        """
+
+        stats, clusters=self.connections()
+        with self.lock:
+            rows=stats.execute("SELECT subject, updated FROM subject_stats WHERE updated>?", (self.seen_stats,))
+            rows=rows.fetchall()
+            changed={s for s, _ in rows}
+            self.seen_stats=max([self.seen_stats]+[u for _, u in rows])
+            if clusters is not None:
+                maps={(s, h): m for s, h, m in clusters.execute("SELECT subject, hemi, mtime FROM maps")}
+                changed|={s for (s, h) in set(maps)^set(self.seen_maps)}
+                changed|={s for (s, h), m in maps.items() if self.seen_maps.get((s, h), m)!=m}
+                self.seen_maps=maps
+            if changed:
+                self.cache.invalidate(changed)
+        return changed
+
+    def answer(self, path, query):
+        """
+
+        Parameters
+        ----------
+        path : str
+            request path.
+        query : dict
+            query parameters (first value of each).
+
+        Raises
+        ------
+        KeyError
+            unknown endpoint or subject.
+        ValueError
+            malformed parameter.
+
+        Returns
+        -------
+        bytes
+            JSON response body, from the cache when still valid (/health is always answered fresh).
+
+        """
+
+        self.refresh()
+        parts=[unquote(p) for p in path.strip("/").split("/") if p]
+        if parts==["health"]:
+            return json.dumps(self.route(parts, query)).encode()
+        subject=parts[1] if len(parts)==2 and parts[0]=="subjects" else query.get("subject")
+        key=(subject, "/".join(parts), tuple(sorted(query.items())))
+        body=self.cache.get(key)
+        if body is None:
+            body=json.dumps(self.route(parts, query)).encode()
+            self.cache.put(key, body)
+        return body
+
+    def route(self, parts, query):
+        stats, clusters=self.connections()
+        if parts==["health"]:
+            return {"stats_db": self.stats_db, "cluster_db": self.cluster_db, "cached": len(self.cache.entries),
+                    "hits": self.cache.hits, "misses": self.cache.misses}
+        if parts==["subjects"]:
+            return [{"subject": s, "group": g, "updated": u} for s, g, u in
+                    stats.execute("SELECT subject, grp, updated FROM subject_stats ORDER BY subject")]
+        if len(parts)==2 and parts[0]=="subjects":
+            return self.subject_summary(stats, clusters, parts[1])
+        if parts==["cohort"]:
+            return self.cohort(stats, query.get("group"))
+        if parts==["clusters"]:
+            return self.clusters(clusters, query)
+        raise KeyError("/"+"/".join(parts))
+
+    def subject_summary(self, stats, clusters, subj):
+        row=stats.execute("SELECT grp, stats, updated FROM subject_stats WHERE subject=?", (subj,)).fetchone()
+        if row is None:
+            raise KeyError(subj)
+        summary={"subject": subj, "group": row[0], "updated": row[2], "stats": json.loads(row[1])}
+        if clusters is not None:
+            summary["clusters"]={h: {"n": n, "voxels": v, "volume_mm3": vol} for h, n, v, vol in clusters.execute(
+                "SELECT hemi, COUNT(*), SUM(voxels), SUM(volume_mm3) FROM clusters WHERE subject=? GROUP BY hemi",
+                (subj,))}
+        return summary
+
+    def cohort(self, stats, group=None):
+        sql="SELECT grp, stats FROM subject_stats"+(" WHERE grp=?" if group else "")
+        rows=[(g, json.loads(s)) for g, s in stats.execute(sql, (group,) if group else ())]
+        groups=sorted({g for g, _ in rows})
+        columns=sorted({col for _, s in rows for col, v in s.items() if isinstance(v, float)})
+        return {g: {"subjects": sum(gr==g for gr, _ in rows),
+                    "stats": {col: summarize([s.get(col) for gr, s in rows if gr==g]) for col in columns}}
+                for g in groups}
+
+    def clusters(self, clusters, query):
+        from .cluster_db import query_clusters, clusters_near
+        if clusters is None:
+            return []
+        filters={k: cast(query[k]) for k, cast in CLUSTER_FILTERS.items() if k in query}
+        limit=int(query.get("limit", 1000))
+        if "near" in query:
+            point=[float(x) for x in query["near"].split(",")]
+            if len(point)!=3:
+                raise ValueError("near needs x,y,z")
+            df=clusters_near(clusters, point, radius=float(query.get("radius", 10.0)), **filters)
+        else:
+            box=[float(x) for x in query["box"].split(",")] if "box" in query else None
+            if box is not None and len(box)!=6:
+                raise ValueError("box needs x0,x1,y0,y1,z0,z1")
+            df=query_clusters(clusters, box=box, **filters)
+        return json.loads(df.head(limit).to_json(orient="records"))
+
+
+def make_handler(store):
+    """
+
+    Parameters
+    ----------
+    store : Store
+        stores and cache to answer from.
+
+    Returns
+    -------
+    class
+        request handler bound to store.
+
+    """
+
+    class QueryHandler(BaseHTTPRequestHandler):
+
+        def do_GET(self):
+            url=urlparse(self.path)
+            query={k: v[0] for k, v in parse_qs(url.query).items()}
+            try:
+                status, body=200, store.answer(url.path, query)
+            except KeyError as e:
+                status, body=404, json.dumps({"error": "not found: {}".format(e.args[0])}).encode()
+            except ValueError as e:
+                status, body=400, json.dumps({"error": str(e)}).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            return
+
+    return QueryHandler
+
+
+def fixture_map(hemi, extra=0):
+    """
+
+    Parameters
+    ----------
+    hemi : str
+        left/right; right clusters sit 10 mm further along x.
+    extra : int
+        single-voxel clusters added after the two fixed ones.
+
+    Returns
+    -------
+    SparseMap
+        1 mm identity-affine cluster map: a 4 voxel cluster centred on (2.5, 5.5, 5) (left) and one voxel at
+        (2, 15, 15) (left), plus the extras.
+
+    """
+
+    from .sparse_maps import SparseMap
+    x0=2 if hemi=="left" else 12
+    voxels=[(x0, 5, 5, 1), (x0+1, 5, 5, 1), (x0, 6, 5, 1), (x0+1, 6, 5, 1), (x0, 15, 15, 2)]
+    voxels+=[(x0, 10, 2*i, 3+i) for i in range(extra)]
+    shape=(20, 20, 20)
+    index=np.ravel_multi_index(tuple(np.asarray([v[:3] for v in voxels]).T), shape, order="F")
+    order=np.argsort(index)
+    return SparseMap(shape, np.eye(4), index[order], np.asarray([v[3] for v in voxels], dtype=np.uint8)[order])
+
+
+def build_fixture(test_dir):
+    """
+
+    Parameters
+    ----------
+    test_dir : str
+        scratch dir; pvs_stats.sqlite and pvs_clusters.sqlite in it are replaced.
+
+    Returns
+    -------
+    stats_db : str
+        fixture stats store: FIXTURE_SUBJECTS with Left/Right PVS Count 10+i/20+i and an MRI date.
+    cluster_db : str
+        fixture cluster database: fixture_map for each subject and hemisphere (MNI = RAS).
+
+    """
+
+    from . import cluster_db
+    stats_db=os.path.join(test_dir, "pvs_stats.sqlite")
+    clusters_db=os.path.join(test_dir, "pvs_clusters.sqlite")
+    for f in [stats_db, clusters_db]:
+        if os.path.exists(f):
+            os.remove(f)
+
+    con=connect(stats_db)
+    clusters=cluster_db.connect(clusters_db)
+    try:
+        for i, (subj, group) in enumerate(sorted(FIXTURE_SUBJECTS.items())):
+            update_subject(con, subj, group, {"Left PVS Count": 10+i, "Right PVS Count": 20+i,
+                                              "mri_date": "2026-01-0{}".format(i+1)})
+            with clusters:
+                for hemi in ["left", "right"]:
+                    cluster_db.insert_map(clusters, subj, group, hemi,
+                                          cluster_db.cluster_rows(fixture_map(hemi), np.eye(4)), "fixture", 1.0)
+    finally:
+        con.close()
+        clusters.close()
+    return stats_db, clusters_db
+
+
+def fetch(port, path):
+    """
+
+    Parameters
+    ----------
+    port : int
+        local service port.
+    path : str
+        request path and query.
+
+    Returns
+    -------
+    status : int
+        HTTP status.
+    body : object
+        decoded JSON response.
+
+    """
+
+    try:
+        with urllib.request.urlopen("http://127.0.0.1:{}{}".format(port, path)) as r:
+            return r.status, json.loads(r.read())
+    except urllib.error.HTTPError as e:
+        return e.code, json.loads(e.read())
+
+
+def run_test(test_dir):
+    """
+
+    Parameters
+    ----------
+    test_dir : str
+        scratch dir for the fixture databases.
+
+    Raises
+    ------
+    Exception
+        any check failed.
+
+    Returns
+    -------
+    None. Prints one line per check.
+
+    """
+
+    from . import cluster_db
+    stats_db, clusters_db=build_fixture(test_dir)
+    store=Store(stats_db, clusters_db)
+    server=ThreadingHTTPServer(("127.0.0.1", 0), make_handler(store))
+    port=server.server_address[1]
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    checks=[]
+    def check(name, ok):
+        checks.append(ok)
+        print("++ {} {} ++".format("ok    " if ok else "FAILED", name))
+
+    try:
+        status, body=fetch(port, "/subjects")
+        check("/subjects lists the fixture cohort", status==200 and
+              {r["subject"]: r["group"] for r in body}==FIXTURE_SUBJECTS)
+        status, body=fetch(port, "/subjects/p001")
+        check("/subjects/p001 stats and clusters", status==200 and body["stats"]["Left PVS Count"]==11 and
+              body["clusters"]["left"]["n"]==2 and body["clusters"]["left"]["voxels"]==5)
+        check("/subjects/<unknown> is 404", fetch(port, "/subjects/nobody")[0]==404)
+        status, body=fetch(port, "/cohort")
+        check("/cohort per group", status==200 and body["patient"]["subjects"]==2 and
+              body["patient"]["stats"]["Left PVS Count"]["mean"]==11.5 and body["hv"]["subjects"]==1)
+        status, body=fetch(port, "/cohort?group=hv")
+        check("/cohort?group=hv", status==200 and list(body)==["hv"] and body["hv"]["stats"]["Left PVS Count"]["n"]==1)
+        status, body=fetch(port, "/clusters?hemi=left&min_voxels=2")
+        check("/clusters filters", status==200 and len(body)==3 and all(r["voxels"]==4 for r in body))
+        status, body=fetch(port, "/clusters?near=2.5,5.5,5&radius=1&group=patient")
+        check("/clusters near", status==200 and sorted(r["subject"] for r in body)==["p001", "p002"])
+        status, body=fetch(port, "/clusters?box=0,4,0,8,0,8")
+        check("/clusters box", status==200 and len(body)==3 and {r["hemi"] for r in body}=={"left"})
+        check("/clusters malformed box is 400", fetch(port, "/clusters?box=0,4")[0]==400)
+        check("/clusters limit", len(fetch(port, "/clusters?limit=2")[1])==2)
+
+        hits=fetch(port, "/health")[1]["hits"]
+        fetch(port, "/cohort")
+        fetch(port, "/subjects/p002")
+        check("repeated requests are cached and /health is fresh", fetch(port, "/health")[1]["hits"]==hits+1)
+
+        con=connect(stats_db)
+        try:
+            update_subject(con, "p001", "patient", {"Left PVS Count": 31, "Right PVS Count": 21})
+        finally:
+            con.close()
+        check("update_subject invalidates /subjects/p001",
+              fetch(port, "/subjects/p001")[1]["stats"]["Left PVS Count"]==31)
+        check("update_subject invalidates /cohort",
+              fetch(port, "/cohort")[1]["patient"]["stats"]["Left PVS Count"]["mean"]==21.5)
+
+        con=cluster_db.connect(clusters_db)
+        try:
+            with con:
+                cluster_db.insert_map(con, "p002", "patient", "left",
+                                      cluster_db.cluster_rows(fixture_map("left", extra=2), np.eye(4)), "fixture", 2.0)
+        finally:
+            con.close()
+        check("a replaced cluster map invalidates /subjects/p002",
+              fetch(port, "/subjects/p002")[1]["clusters"]["left"]["n"]==4)
+        check("a replaced cluster map invalidates /clusters",
+              len(fetch(port, "/clusters?subject=p002&hemi=left")[1])==4)
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    if not all(checks):
+        raise Exception("{} of {} service checks failed. Exiting...".format(checks.count(False), len(checks)))
+    print("All {} service checks passed.".format(len(checks)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,464 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Fri Oct 23 14:05:17 2026
+@author: Leela Srinivasan
+
+Cohort PVS frequency maps in template space, accumulated one subject at a time.
+Each subject's cluster maps and eroded WM masks are read as sparse voxel lists (see sparse_maps.py) and their voxel
+centres are carried into MNI305 space through FreeSurfer's talairach.xfm (the SurfVol grid shares scanner RAS with
+orig.mgz). They are then binned onto a 2 mm template grid. Per group (patient/hv) the running state is
+two volumes: subjects with PVS at a voxel and subjects whose WM covers it. Frequency is their ratio. Memory is
+bounded by the template grid plus one subject, whatever the cohort size.
+The state is replaced atomically after every subject and lists the subjects it holds, so rerunning only adds new
+subjects. A subject whose maps changed has its previous contribution (kept in contributions/) subtracted first.
+
+Syntax:       pvs density [--pvs-root DIR] [--out-dir DIR] [--template NII] [SUBJ ...]
+Dependencies: NumPy, NiBabel
+"""
+
+import os
+import sys
+import argparse
+import numpy as np
+import nibabel as nib
+from . import manifest, sparse_maps
+
+
+HEMIS=["left", "right"]
+GROUPS=["patient", "hv"]
+
+#MNI 2 mm grid (91 x 109 x 91), used unless a template image is given
+TEMPLATE_SHAPE=(91, 109, 91)
+TEMPLATE_AFFINE=np.array([[-2.0, 0.0, 0.0, 90.0],
+                          [0.0, 2.0, 0.0, -126.0],
+                          [0.0, 0.0, 2.0, -72.0],
+                          [0.0, 0.0, 0.0, 1.0]])
+
+
+def main(argv=None):
+
+    args=parse_args(sys.argv[1:] if argv is None else argv)
+    subjects=args.subjects or find_subjects(args.pvs_root)
+    shape, affine=template_grid(args.template)
+    added=update_density(args.out_dir, subjects, args.pvs_root, shape, affine)
+    write_frequency_maps(args.out_dir)
+    print("Added or refreshed {} of {} subjects; frequency maps in {}.".format(added, len(subjects), args.out_dir))
+
+
+def parse_args(argv):
+    """
+
+    Parameters
+    ----------
+    argv : list
+        command line arguments.
+
+    Returns
+    -------
+    args : argparse.Namespace
+        parsed arguments.
+
+    """
+
+    parser=argparse.ArgumentParser(description="Streaming cohort PVS frequency maps in template space.")
+    parser.add_argument("subjects", nargs="*", help="subjects to add (default: all with cluster maps)")
+    parser.add_argument("--pvs-root", default=manifest.PVS_ROOT, help="PVS project root")
+    parser.add_argument("--out-dir", default=os.path.join(manifest.SUMMARY_DIR, "template_density"),
+                        help="state and frequency map dir")
+    parser.add_argument("--template", default=None, help="template image defining the grid (default MNI 2 mm)")
+    return parser.parse_args(argv)
+
+
+def template_grid(template=None):
+    """
+
+    Parameters
+    ----------
+    template : str
+        path to a template image in MNI space, or None.
+
+    Returns
+    -------
+    shape : tuple
+        template grid shape.
+    affine : array
+        template voxel to MNI affine.
+
+    """
+
+    if template is None:
+        return TEMPLATE_SHAPE, TEMPLATE_AFFINE
+    img=nib.load(template)
+    return tuple(int(n) for n in img.shape[:3]), img.affine
+
+
+def cluster_maps(pvs_dir):
+    """
+
+    Parameters
+    ----------
+    pvs_dir : str
+        path to subject PVS dir.
+
+    Returns
+    -------
+    list
+        pvs_within_* cluster maps present (NIfTI or sparse only).
+
+    """
+
+    clust_dir=os.path.join(pvs_dir, "t1", "clusters")
+    maps=[]
+    for hemi in HEMIS:
+        f=os.path.join(clust_dir, "pvs_within_{}_cerebral_white_matter.nii".format(hemi))
+        if os.path.exists(f) or os.path.exists(sparse_maps.sparse_path(f)):
+            maps.append(f)
+    return maps
+
+
+def find_subjects(pvs_root):
+    """
+
+    Parameters
+    ----------
+    pvs_root : str
+        PVS project root.
+
+    Returns
+    -------
+    list
+        subjects with at least one cluster map.
+
+    """
+
+    return sorted(s for s in os.listdir(pvs_root) if len(cluster_maps(os.path.join(pvs_root, s))))
+
+
+def subject_group(subj):
+    """
+
+    Parameters
+    ----------
+    subj : str
+        p-number or hv code.
+
+    Returns
+    -------
+    str or None
+        hv or patient, from the cohort lists recorded in the manifest (see manifest.py); None for a subject on
+        neither list.
+
+    """
+
+    return manifest.lookup(subj)["group"]
+
+
+def read_xfm(xfm):
+    """
+
+    Parameters
+    ----------
+    xfm : str
+        path to an MNI .xfm linear transform (FreeSurfer talairach.xfm).
+
+    Raises
+    ------
+    Exception
+        No Linear_Transform block.
+
+    Returns
+    -------
+    array
+        4x4 scanner RAS to MNI305 matrix.
+
+    """
+
+    with open(xfm, "r") as f:
+        text=f.read()
+    if "Linear_Transform" not in text:
+        raise Exception("No Linear_Transform in {}.".format(xfm))
+    values=text.split("Linear_Transform", 1)[1].split("=", 1)[1].split(";", 1)[0].split()
+    mat=np.eye(4)
+    mat[:3, :]=np.asarray(values[:12], dtype=float).reshape(3, 4)
+    return mat
+
+
+def talairach_xfm(subj):
+    """
+
+    Parameters
+    ----------
+    subj : str
+        p-number or hv code.
+
+    Raises
+    ------
+    Exception
+        No FreeSurfer talairach.xfm for the subject.
+
+    Returns
+    -------
+    str
+        path to talairach.xfm of the subject's manifest session.
+
+    """
+
+    row=manifest.lookup(subj)
+    if not row["has_talairach"]:
+        raise Exception("No FreeSurfer talairach.xfm found for {}.".format(subj))
+    return row["talairach"]
+
+
+def to_template(sp, xfm, shape, affine):
+    """
+
+    Parameters
+    ----------
+    sp : SparseMap
+        subject map.
+    xfm : array
+        4x4 scanner RAS to MNI matrix.
+    shape : tuple
+        template grid shape.
+    affine : array
+        template voxel to MNI affine.
+
+    Returns
+    -------
+    array
+        unique linear (Fortran order) template voxels hit by the map's voxel centres.
+
+    """
+
+    if len(sp.index)==0:
+        return np.zeros(0, dtype=np.int64)
+    ijk=np.stack(np.unravel_index(sp.index, sp.shape, order="F"), axis=1)
+    to_grid=np.linalg.inv(affine)@xfm@np.asarray(sp.affine)
+    t=np.rint(nib.affines.apply_affine(to_grid, ijk)).astype(np.int64)
+    inside=np.all((t>=0) & (t<np.asarray(shape)), axis=1)
+    return np.unique(np.ravel_multi_index(tuple(t[inside].T), shape, order="F"))
+
+
+def subject_contribution(subj, pvs_root, shape, affine):
+    """
+
+    Parameters
+    ----------
+    subj : str
+        p-number or hv code.
+    pvs_root : str
+        PVS project root.
+    shape : tuple
+        template grid shape.
+    affine : array
+        template voxel to MNI affine.
+
+    Returns
+    -------
+    pvs : array
+        template voxels holding PVS.
+    wm : array
+        template voxels covered by the eroded WM masks (PVS voxels included).
+
+    """
+
+    pvs_dir=os.path.join(pvs_root, subj)
+    xfm=read_xfm(talairach_xfm(subj))
+    pvs=[to_template(sparse_maps.load_or_build(f), xfm, shape, affine) for f in cluster_maps(pvs_dir)]
+    wm=[]
+    for hemi in HEMIS:
+        f=os.path.join(pvs_dir, "eroded_masks", "eroded_{}_cerebral_white_matter.nii".format(hemi))
+        if os.path.exists(f):
+            wm.append(to_template(sparse_maps.from_nifti(f), xfm, shape, affine))
+    pvs=np.unique(np.concatenate(pvs)) if len(pvs) else np.zeros(0, dtype=np.int64)
+    wm=np.union1d(np.concatenate(wm), pvs) if len(wm) else pvs
+    return pvs, wm
+
+
+def source_mtime(pvs_dir):
+    """
+
+    Parameters
+    ----------
+    pvs_dir : str
+        path to subject PVS dir.
+
+    Returns
+    -------
+    float
+        newest modification time among the subject's cluster maps (NIfTI or sparse).
+
+    """
+
+    times=[0.0]
+    for f in cluster_maps(pvs_dir):
+        for g in [f, sparse_maps.sparse_path(f)]:
+            if os.path.exists(g):
+                times.append(os.path.getmtime(g))
+    return max(times)
+
+
+def load_state(out_dir, shape, affine):
+    """
+
+    Parameters
+    ----------
+    out_dir : str
+        state dir.
+    shape : tuple
+        template grid shape.
+    affine : array
+        template voxel to MNI affine.
+
+    Raises
+    ------
+    Exception
+        Existing state is on a different template grid.
+
+    Returns
+    -------
+    dict
+        'pvs_<group>' and 'wm_<group>' uint32 flat volumes, and 'subjects' -> (group, source mtime).
+
+    """
+
+    path=os.path.join(out_dir, "density_state.npz")
+    n=int(np.prod(shape))
+    if not os.path.exists(path):
+        state={"{}_{}".format(k, g): np.zeros(n, dtype=np.uint32) for k in ["pvs", "wm"] for g in GROUPS}
+        state["subjects"]={}
+        return state
+
+    with np.load(path) as z:
+        if tuple(z["shape"])!=tuple(shape) or not np.allclose(z["affine"], affine):
+            raise Exception("Density state in {} is on a different template grid. Exiting...".format(out_dir))
+        state={k: z[k] for k in z.files if k.startswith(("pvs_", "wm_"))}
+        state["subjects"]={s: (g, float(t)) for s, g, t in zip(z["subjects"], z["groups"], z["mtimes"])}
+    return state
+
+
+def save_state(out_dir, state, shape, affine):
+    """
+    Write the state to a temporary file and move it over the old one, so an interrupted run leaves either the
+    previous or the new state.
+
+    Parameters
+    ----------
+    out_dir : str
+        state dir.
+    state : dict
+        from load_state.
+    shape : tuple
+        template grid shape.
+    affine : array
+        template voxel to MNI affine.
+
+    Returns
+    -------
+    None.
+
+    """
+
+    subjects=sorted(state["subjects"])
+    tmp=os.path.join(out_dir, "density_state.tmp.npz")
+    np.savez(tmp, shape=np.asarray(shape), affine=np.asarray(affine),
+             subjects=np.asarray(subjects, dtype=str),
+             groups=np.asarray([state["subjects"][s][0] for s in subjects], dtype=str),
+             mtimes=np.asarray([state["subjects"][s][1] for s in subjects], dtype=float),
+             **{k: v for k, v in state.items() if k!="subjects"})
+    os.replace(tmp, os.path.join(out_dir, "density_state.npz"))
+
+
+def update_density(out_dir, subjects, pvs_root, shape=TEMPLATE_SHAPE, affine=TEMPLATE_AFFINE):
+    """
+
+    Parameters
+    ----------
+    out_dir : str
+        state and frequency map dir.
+    subjects : list
+        subjects to add; ones already in the state with unchanged maps are skipped.
+    pvs_root : str
+        PVS project root.
+    shape : tuple
+        template grid shape.
+    affine : array
+        template voxel to MNI affine.
+
+    Returns
+    -------
+    int
+        subjects added or refreshed.
+
+    """
+
+    contrib_dir=os.path.join(out_dir, "contributions")
+    os.makedirs(contrib_dir, exist_ok=True)
+    state=load_state(out_dir, shape, affine)
+    added=0
+    for subj in subjects:
+        if subj in state["subjects"] and state["subjects"][subj][1]>=source_mtime(os.path.join(pvs_root, subj)):
+            continue
+        group=subject_group(subj)
+        if group not in ["hv", "patient"]:
+            print("Skipping {}: not on a cohort list.".format(subj))
+            continue
+        try:
+            pvs, wm=subject_contribution(subj, pvs_root, shape, affine)
+        except Exception as e:
+            print("Skipping {}: {}".format(subj, e))
+            continue
+
+        #Taken after loading, which may have just written the sparse lists
+        mtime=source_mtime(os.path.join(pvs_root, subj))
+
+
+        #Replace a previous contribution rather than counting the subject twice
+        contrib=os.path.join(contrib_dir, "{}.npz".format(subj))
+        if subj in state["subjects"] and os.path.exists(contrib):
+            with np.load(contrib) as old:
+                g=state["subjects"][subj][0]
+                np.subtract.at(state["pvs_{}".format(g)], old["pvs"], 1)
+                np.subtract.at(state["wm_{}".format(g)], old["wm"], 1)
+
+        state["pvs_{}".format(group)][pvs]+=1
+        state["wm_{}".format(group)][wm]+=1
+        state["subjects"][subj]=(group, mtime)
+        np.savez(contrib, pvs=pvs, wm=wm)
+        save_state(out_dir, state, shape, affine)
+        added+=1
+        print("Added {} ({}): {} PVS and {} WM template voxels.".format(subj, group, len(pvs), len(wm)))
+    return added
+
+
+def write_frequency_maps(out_dir):
+    """
+
+    Parameters
+    ----------
+    out_dir : str
+        state dir.
+
+    Returns
+    -------
+    None. Writes frequency_<group>.nii (fraction of subjects with PVS among those whose WM covers the voxel)
+    and coverage_<group>.nii (that denominator) for each group.
+
+    """
+
+    with np.load(os.path.join(out_dir, "density_state.npz")) as z:
+        shape=tuple(int(n) for n in z["shape"])
+        affine=z["affine"]
+        for group in GROUPS:
+            pvs=z["pvs_{}".format(group)].astype(np.float32)
+            wm=z["wm_{}".format(group)]
+            freq=np.divide(pvs, wm, out=np.zeros_like(pvs), where=wm>0)
+            nib.save(nib.Nifti1Image(freq.reshape(shape, order="F"), affine),
+                     os.path.join(out_dir, "frequency_{}.nii".format(group)))
+            nib.save(nib.Nifti1Image(wm.reshape(shape, order="F"), affine),
+                     os.path.join(out_dir, "coverage_{}.nii".format(group)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,702 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 11:02:47 2026
+@author: Leela Srinivasan
+
+Bounded-memory z-slab processing for high resolution volumes.
+NIfTI data is stored x-fastest, so a z-slab is one contiguous run of bytes: inputs are read slab by slab through
+NiBabel's array proxies and outputs are streamed to disk in z order. Nothing larger than one slab (plus halo) is
+held at once, and the slab depth is chosen from a memory cap (PVS_MAX_MEM_MB or --max-mem).
+
+Subcommands:
+    binarize  aseg label(s) -> binary mask (replaces mri_binarize + mri_convert)
+    overlap   eroded mask x 3dSeg classes -> binary class-within-mask (replaces both 3dcalc steps)
+    cluster   binary map -> cluster map + CSV, components merged across slab boundaries (replaces 3dClusterize)
+
+Dependencies: NumPy, SciPy, NiBabel, pandas
+"""
+
+import os
+import sys
+import gzip
+import argparse
+import numpy as np
+import nibabel as nib
+from scipy import ndimage
+from .profiling import timed
+
+
+#Memory cap per stage in MB, overridable per node so several subjects can share it
+DEFAULT_MAX_MEM_MB=int(os.environ.get("PVS_MAX_MEM_MB", 2048))
+
+
+def main(argv=None):
+
+    args=parse_args(sys.argv[1:] if argv is None else argv)
+    if args.command=="binarize":
+        matches=[int(x) for x in args.match.split(",")]
+        binarize_tiled(args.input, matches, args.out, max_mem_mb=args.max_mem)
+
+    elif args.command=="overlap":
+        overlap_tiled(args.mask, args.classes, args.out, label=args.label, max_mem_mb=args.max_mem)
+
+    elif args.command=="cluster":
+        df=label_tiled(args.input, args.out, nn=args.nn, min_size=args.min_size,
+                       threshold=args.threshold, max_mem_mb=args.max_mem)
+        if len(df)==0:
+            print("No clusters found in {}. Continuing...".format(args.input))
+        else:
+            print("Total PVS voxels for {}: {}.".format(args.input, int(df["#Volume"].sum())))
+            df.to_csv(args.csv)
+
+
+def parse_args(argv):
+    """
+
+    Parameters
+    ----------
+    argv : list
+        command line arguments.
+
+    Returns
+    -------
+    args : argparse.Namespace
+        parsed arguments.
+
+    """
+
+    parser=argparse.ArgumentParser(description="Bounded-memory z-slab mask, overlap and cluster stages.")
+    parser.add_argument("--max-mem", type=int, default=DEFAULT_MAX_MEM_MB, help="memory cap in MB")
+    sub=parser.add_subparsers(dest="command", required=True)
+
+    p=sub.add_parser("binarize", help="binarize FreeSurfer label(s) into a mask")
+    p.add_argument("input", help="path to aseg.mgz (or any label volume)")
+    p.add_argument("match", help="comma separated label values")
+    p.add_argument("out", help="path to output mask nifti")
+
+    p=sub.add_parser("overlap", help="isolate a 3dSeg class within an eroded mask")
+    p.add_argument("mask", help="path to eroded mask")
+    p.add_argument("classes", help="path to 3dSeg Classes dataset")
+    p.add_argument("out", help="path to output binary nifti")
+    p.add_argument("--label", type=int, default=2, help="class value to keep (GM=2)")
+
+    p=sub.add_parser("cluster", help="cluster a binary map and write map + CSV")
+    p.add_argument("input", help="path to binary candidate map")
+    p.add_argument("out", help="path to output cluster map")
+    p.add_argument("csv", help="path to output cluster CSV")
+    p.add_argument("--nn", type=int, default=1, choices=[1, 2, 3], help="AFNI neighbourhood (faces/edges/corners)")
+    p.add_argument("--min-size", type=int, default=2, help="minimum cluster size in voxels")
+    p.add_argument("--threshold", type=float, default=0.5, help="voxels strictly above this are clustered")
+    return parser.parse_args(argv)
+
+
+def plan_slab_depth(shape_xy, bytes_per_voxel, max_mem_mb=DEFAULT_MAX_MEM_MB, halo=0, workers=1):
+    """
+
+    Parameters
+    ----------
+    shape_xy : tuple
+        in-plane size of the volume (or crop).
+    bytes_per_voxel : int
+        bytes the stage holds per slab voxel, summed over all of its working arrays.
+    max_mem_mb : int
+        memory cap across all workers in MB.
+    halo : int
+        halo width in slices on each side.
+    workers : int
+        number of concurrent workers sharing the cap.
+
+    Returns
+    -------
+    depth : int
+        number of core z-slices per slab (at least 1).
+
+    """
+
+    per_worker=max_mem_mb*1024**2/max(1, workers)
+    slice_bytes=shape_xy[0]*shape_xy[1]*bytes_per_voxel
+    depth=int(per_worker//slice_bytes)-2*halo
+    return max(1, depth)
+
+
+def slab_bounds(z0, z1, depth, halo=0, nz=None):
+    """
+
+    Parameters
+    ----------
+    z0 : int
+        first slice to cover.
+    z1 : int
+        one past the last slice to cover.
+    depth : int
+        core slices per slab.
+    halo : int
+        halo slices on each side of the core.
+    nz : int
+        number of slices in the volume; halo is clipped to it (defaults to z1).
+
+    Yields
+    ------
+    core : tuple
+        (start, stop) slices written by the slab.
+    padded : tuple
+        (start, stop) slices read by the slab, including the halo.
+
+    """
+
+    nz=z1 if nz is None else nz
+    for c0 in range(z0, z1, depth):
+        c1=min(c0+depth, z1)
+        yield (c0, c1), (max(0, c0-halo), min(nz, c1+halo))
+
+
+def read_slab(img, z0, z1, x=None, y=None):
+    """
+
+    Parameters
+    ----------
+    img : nibabel image
+        proxy image; only the requested slab is read from disk.
+    z0 : int
+        first slice.
+    z1 : int
+        one past the last slice.
+    x : tuple
+        optional (start, stop) crop along x.
+    y : tuple
+        optional (start, stop) crop along y.
+
+    Returns
+    -------
+    array
+        3D slab (a trailing singleton sub-brick, as in AFNI datasets, is dropped).
+
+    """
+
+    xs=slice(*x) if x else slice(None)
+    ys=slice(*y) if y else slice(None)
+    if len(img.shape)>3:
+        return np.asarray(img.dataobj[xs, ys, z0:z1, 0])
+    return np.asarray(img.dataobj[xs, ys, z0:z1])
+
+
+def load_image(path):
+    """
+
+    Parameters
+    ----------
+    path : str
+        path to nifti.
+
+    Returns
+    -------
+    nibabel image or ArchivedMap
+        the NIfTI proxy, or, if only its <name>.pack.npz archive remains (see archive.py), a lazy reader over that.
+
+    """
+
+    if not os.path.exists(path):
+        from .archive import archive_path, ArchivedMap
+        if os.path.exists(archive_path(path)):
+            return ArchivedMap(archive_path(path))
+    return nib.load(path)
+
+
+def mask_bbox(mask, pad):
+    """
+
+    Parameters
+    ----------
+    mask : str
+        path to mask nifti.
+    pad : int
+        voxels to pad each side of the box by (clipped to the volume).
+
+    Returns
+    -------
+    list or None
+        [(x0, x1), (y0, y1), (z0, z1)] half-open bounds, or None if the mask is empty.
+
+    """
+
+    img=load_image(mask)
+    shape=img.shape[:3]
+    x_any=np.zeros(shape[0], dtype=bool)
+    y_any=np.zeros(shape[1], dtype=bool)
+    z_any=np.zeros(shape[2], dtype=bool)
+
+
+    #Read one z-slice at a time so the mask is never fully materialized
+    for z in range(shape[2]):
+        sl=np.asarray(img.dataobj[..., z])>0
+        if sl.ndim>2:
+            sl=sl.reshape(shape[0], shape[1], -1).any(axis=2)
+        if sl.any():
+            z_any[z]=True
+            x_any|=sl.any(axis=1)
+            y_any|=sl.any(axis=0)
+
+    if not z_any.any():
+        return None
+
+    bounds=[]
+    for axis_any, n in zip([x_any, y_any, z_any], shape):
+        idx=np.flatnonzero(axis_any)
+        bounds.append((max(0, idx[0]-pad), min(n, idx[-1]+1+pad)))
+    return bounds
+
+
+def open_nifti_writer(out, shape, affine, dtype, slope=1.0):
+    """
+
+    Parameters
+    ----------
+    out : str
+        path to output .nii or .nii.gz.
+    shape : tuple
+        3D output shape.
+    affine : array
+        voxel to world affine.
+    dtype : numpy dtype
+        on-disk datatype.
+    slope : float
+        NIfTI scl_slope, for quantized float maps stored as integers.
+
+    Returns
+    -------
+    fileobj
+        open file positioned at the start of the voxel data; slabs must then be written in z order.
+
+    """
+
+    header=nib.Nifti1Header()
+    header.set_data_shape(shape)
+    header.set_data_dtype(dtype)
+    header.set_qform(affine, code=1)
+    header.set_sform(affine, code=1)
+    header.set_slope_inter(slope, 0)
+    header.set_xyzt_units("mm")
+    header["vox_offset"]=352
+    header["magic"]=b"n+1"
+
+    f=gzip.open(out, "wb") if out.endswith(".gz") else open(out, "wb")
+    f.write(header.binaryblock)
+    f.write(b"\x00"*4)
+    return f
+
+
+def write_slab(f, slab, dtype):
+    """
+
+    Parameters
+    ----------
+    f : fileobj
+        writer from open_nifti_writer.
+    slab : array
+        next 3D slab in z order.
+    dtype : numpy dtype
+        on-disk datatype.
+
+    Returns
+    -------
+    None.
+
+    """
+
+    f.write(np.asarray(slab, dtype=dtype).tobytes(order="F"))
+
+
+def binarize_tiled(src, matches, out, max_mem_mb=DEFAULT_MAX_MEM_MB):
+    """
+
+    Parameters
+    ----------
+    src : str
+        path to label volume (aseg.mgz).
+    matches : list
+        label values to set to 1.
+    out : str
+        path to output uint8 mask.
+    max_mem_mb : int
+        memory cap in MB.
+
+    Returns
+    -------
+    nvox : int
+        number of voxels in the mask.
+
+    """
+
+    img=load_image(src)
+    shape=img.shape[:3]
+    depth=plan_slab_depth(shape[:2], 8, max_mem_mb)
+    nvox=0
+
+    f=open_nifti_writer(out, shape, img.affine, np.uint8)
+    try:
+        for (z0, z1), _ in slab_bounds(0, shape[2], depth):
+            m=np.isin(read_slab(img, z0, z1), matches)
+            nvox+=int(m.sum())
+            write_slab(f, m, np.uint8)
+    finally:
+        f.close()
+    return nvox
+
+
+def overlap_tiled(mask, classes, out, label=2, max_mem_mb=DEFAULT_MAX_MEM_MB):
+    """
+    Equivalent to 3dcalc 'step(a)*b' followed by 'equals(a,label)', without the intermediate overlap volume.
+
+    Parameters
+    ----------
+    mask : str
+        path to eroded mask.
+    classes : str
+        path to 3dSeg Classes dataset (e.g. Classes+orig.HEAD).
+    out : str
+        path to output uint8 map.
+    label : int
+        class value to keep.
+    max_mem_mb : int
+        memory cap in MB.
+
+    Raises
+    ------
+    Exception
+        mask and classes are not on the same grid.
+
+    Returns
+    -------
+    nvox : int
+        number of voxels kept.
+
+    """
+
+    mask_img=load_image(mask)
+    class_img=load_image(classes)
+    shape=mask_img.shape[:3]
+    if class_img.shape[:3]!=shape:
+        raise Exception("Mask {} and classes {} are on different grids. Exiting...".format(shape, class_img.shape))
+
+    depth=plan_slab_depth(shape[:2], 12, max_mem_mb)
+    nvox=0
+    f=open_nifti_writer(out, shape, mask_img.affine, np.uint8)
+    try:
+        for (z0, z1), _ in slab_bounds(0, shape[2], depth):
+            m=(read_slab(mask_img, z0, z1)>0) & (read_slab(class_img, z0, z1)==label)
+            nvox+=int(m.sum())
+            write_slab(f, m, np.uint8)
+    finally:
+        f.close()
+    return nvox
+
+
+@timed
+def gather_tiled(values, mask, max_mem_mb=DEFAULT_MAX_MEM_MB, extra_masks=()):
+    """
+    In-memory gather of the masked voxels of a volume. Unlike '3dcalc -a values -b mask -expr a*step(b) -prefix
+    out.1D' + np.genfromtxt, voxels outside the mask are dropped rather than returned as zeros.
+
+    Parameters
+    ----------
+    values : str
+        path to intensity volume.
+    mask : str
+        path to mask; voxels > 0 are gathered.
+    max_mem_mb : int
+        memory cap in MB.
+    extra_masks : tuple
+        further mask paths that must also be > 0.
+
+    Raises
+    ------
+    Exception
+        inputs are not on the same grid.
+
+    Returns
+    -------
+    array
+        float32 intensities at masked voxels, in NIfTI (x-fastest) order.
+
+    """
+
+    val_img=nib.load(values)
+    mask_imgs=[load_image(m) for m in (mask,)+tuple(extra_masks)]
+    shape=val_img.shape[:3]
+    for m in mask_imgs:
+        if m.shape[:3]!=shape:
+            raise Exception("{} and mask {} are on different grids. Exiting...".format(shape, m.shape))
+
+    depth=plan_slab_depth(shape[:2], 8+2*len(mask_imgs), max_mem_mb)
+    out=[]
+    for (z0, z1), _ in slab_bounds(0, shape[2], depth):
+        m=read_slab(mask_imgs[0], z0, z1)>0
+        for extra in mask_imgs[1:]:
+            m&=read_slab(extra, z0, z1)>0
+        if m.any():
+            v=read_slab(val_img, z0, z1).astype(np.float32)
+            out.append(v.transpose(2, 1, 0)[m.transpose(2, 1, 0)])
+    if len(out)==0:
+        return np.zeros(0, dtype=np.float32)
+    return np.concatenate(out)
+
+
+def nn_structure(nn):
+    """
+
+    Parameters
+    ----------
+    nn : int
+        AFNI neighbourhood: 1 faces, 2 faces+edges, 3 faces+edges+corners.
+
+    Returns
+    -------
+    array
+        3x3x3 boolean connectivity structure.
+
+    """
+
+    return ndimage.generate_binary_structure(3, nn)
+
+
+def boundary_edges(prev_last, next_first, structure):
+    """
+
+    Parameters
+    ----------
+    prev_last : array
+        global labels on the last slice of a slab.
+    next_first : array
+        global labels on the first slice of the following slab.
+    structure : array
+        3x3x3 connectivity structure.
+
+    Returns
+    -------
+    array
+        (n, 2) pairs of global labels that touch across the boundary.
+
+    """
+
+    pairs=[]
+    nx, ny=prev_last.shape
+    for dx, dy in np.argwhere(structure[:, :, 2])-1:
+        a=prev_last[max(0, -dx):nx-max(0, dx), max(0, -dy):ny-max(0, dy)]
+        b=next_first[max(0, dx):nx-max(0, -dx), max(0, dy):ny-max(0, -dy)]
+        touch=(a>0) & (b>0)
+        if touch.any():
+            pairs.append(np.stack([a[touch], b[touch]], axis=1))
+    if len(pairs)==0:
+        return np.zeros((0, 2), dtype=np.int64)
+    return np.unique(np.concatenate(pairs), axis=0)
+
+
+def label_tiled(src, out, nn=1, min_size=2, threshold=0.5, max_mem_mb=DEFAULT_MAX_MEM_MB):
+    """
+    Two-pass slab labeling. Pass one (components_tiled) labels each slab and merges labels that touch across
+    slab boundaries. Pass two relabels each slab and streams the final, size-ordered cluster ids to disk.
+    Clusters are numbered largest first, as 3dClusterize does.
+
+    Parameters
+    ----------
+    src : str
+        path to candidate map.
+    out : str
+        path to output cluster map (uint8/uint16/uint32, the smallest that holds the cluster count).
+    nn : int
+        AFNI neighbourhood, as in 3dClusterize -NN.
+    min_size : int
+        minimum cluster size in voxels, as in 3dClusterize -clust_nvox.
+    threshold : float
+        voxels strictly above this are clustered.
+    max_mem_mb : int
+        memory cap in MB.
+
+    Returns
+    -------
+    df : df
+        one row per cluster with '#Volume' and AFNI-style (RAI mm) centre of mass columns.
+
+    """
+
+    img=load_image(src)
+    shape=img.shape[:3]
+    structure=nn_structure(nn)
+    slabs, offsets, comp, comp_sizes, comp_sums=components_tiled(img, structure, threshold, max_mem_mb)
+    n_comp=len(comp_sizes)
+    n_total=len(comp)
+
+
+    #Drop small clusters and number the rest by decreasing size
+    keep=np.flatnonzero(comp_sizes>=min_size)
+    keep=keep[np.argsort(-comp_sizes[keep], kind="stable")]
+    comp_to_final=np.zeros(n_comp, dtype=np.int64)
+    comp_to_final[keep]=np.arange(1, len(keep)+1)
+    lut=np.zeros(n_total+1, dtype=np.int64)
+    lut[1:]=comp_to_final[comp]
+    dtype=np.min_scalar_type(len(keep))
+
+
+    #Pass two: relabel (deterministic) and stream final ids
+    f=open_nifti_writer(out, shape, img.affine, dtype)
+    try:
+        for (z0, z1), offset in zip(slabs, offsets):
+            lab, _=ndimage.label(read_slab(img, z0, z1)>threshold, structure=structure)
+            write_slab(f, lut[np.where(lab>0, lab+offset, 0)], dtype)
+    finally:
+        f.close()
+
+    return cluster_table(comp_sizes[keep], comp_sums[keep], img.affine)
+
+
+def components_tiled(img, structure, threshold=0.5, max_mem_mb=DEFAULT_MAX_MEM_MB, within=None, within_min=0.0,
+                     label=None):
+    """
+    Pass one of the slab labeling: local labels, per-label sums and cross-boundary equivalences, resolved
+    with a connected-components pass over the (tiny) label graph.
+
+    Parameters
+    ----------
+    img : nibabel image
+        candidate map proxy.
+    structure : array
+        3x3x3 connectivity structure.
+    threshold : float
+        voxels strictly above this are labelled.
+    max_mem_mb : int
+        memory cap in MB.
+    within : nibabel image
+        optional second map on the same grid; only voxels where it exceeds within_min are labelled
+        (e.g. a distance map, to cluster at a deeper erosion without writing a new mask).
+    within_min : float
+        cutoff for within.
+    label : int
+        if given, voxels equal to label are labelled instead of voxels above threshold (e.g. 3dSeg GM=2).
+
+    Returns
+    -------
+    slabs : list
+        (z0, z1) slab bounds used.
+    offsets : list
+        global label offset of each slab.
+    comp : array
+        merged component id of each global slab label (global label g maps to comp[g-1]).
+    comp_sizes : array
+        voxels per merged component.
+    comp_sums : array
+        (n, 3) per-component sums of voxel indices.
+
+    """
+
+    shape=img.shape[:3]
+    depth=plan_slab_depth(shape[:2], 24, max_mem_mb)
+    slabs=[core for core, _ in slab_bounds(0, shape[2], depth)]
+
+    offsets=[]
+    sizes=[]
+    sums=[]
+    edges=[]
+    n_total=0
+    prev_last=None
+    for z0, z1 in slabs:
+        data=read_slab(img, z0, z1)
+        candidate=data==label if label is not None else data>threshold
+        if within is not None:
+            candidate&=read_slab(within, z0, z1)>within_min
+        lab, n=ndimage.label(candidate, structure=structure)
+        offsets.append(n_total)
+        glob=np.where(lab>0, lab+n_total, 0)
+
+        idx=np.nonzero(lab)
+        sizes.append(np.bincount(lab[idx], minlength=n+1)[1:])
+        sums.append(np.stack([np.bincount(lab[idx], weights=c+o, minlength=n+1)[1:]
+                              for c, o in zip(idx, (0, 0, z0))], axis=1))
+
+        if prev_last is not None:
+            edges.append(boundary_edges(prev_last, glob[:, :, 0], structure))
+        prev_last=glob[:, :, -1]
+        n_total+=n
+
+
+    #Resolve equivalences; component ids index the merged clusters
+    sizes=np.concatenate(sizes) if n_total else np.zeros(0, dtype=np.int64)
+    sums=np.concatenate(sums) if n_total else np.zeros((0, 3))
+    edges=np.concatenate(edges) if len(edges) else np.zeros((0, 2), dtype=np.int64)
+    from scipy.sparse import coo_matrix
+    from scipy.sparse.csgraph import connected_components
+    graph=coo_matrix((np.ones(len(edges)), (edges[:, 0]-1, edges[:, 1]-1)), shape=(n_total, n_total))
+    n_comp, comp=connected_components(graph, directed=False)
+
+    comp_sizes=np.bincount(comp, weights=sizes, minlength=n_comp).astype(np.int64)
+    comp_sums=np.stack([np.bincount(comp, weights=sums[:, i], minlength=n_comp) for i in range(3)], axis=1)
+    return slabs, offsets, comp, comp_sizes, comp_sums
+
+
+def component_sizes(src, nn=1, threshold=0.5, max_mem_mb=DEFAULT_MAX_MEM_MB, within=None, within_min=0.0, label=None):
+    """
+
+    Parameters
+    ----------
+    src : str
+        path to candidate map.
+    nn : int
+        AFNI neighbourhood.
+    threshold : float
+        voxels strictly above this are labelled.
+    max_mem_mb : int
+        memory cap in MB.
+    within : str
+        optional path to a map restricting labeling to voxels above within_min.
+    within_min : float
+        cutoff for within.
+    label : int
+        if given, voxels equal to label are labelled instead of voxels above threshold.
+
+    Returns
+    -------
+    array
+        voxels per connected component, before any size filtering.
+
+    """
+
+    within=load_image(within) if within is not None else None
+    return components_tiled(load_image(src), nn_structure(nn), threshold, max_mem_mb, within, within_min, label)[3]
+
+
+def cluster_table(sizes, coord_sums, affine):
+    """
+
+    Parameters
+    ----------
+    sizes : array
+        voxels per cluster, in final label order.
+    coord_sums : array
+        (n, 3) per-cluster sums of voxel indices.
+    affine : array
+        voxel to RAS affine.
+
+    Returns
+    -------
+    df : df
+        '#Volume' plus centre of mass in AFNI's RAI convention (RL/AP negated from RAS), matching the
+        columns afnitxt_to_csv.py produces from a 3dClusterize report.
+
+    """
+
+    #pandas is only needed for cluster tables; keep it off the import path of the other stages
+    import pandas as pd
+    df=pd.DataFrame({"#Volume": np.asarray(sizes, dtype=np.int64)})
+    if len(df)==0:
+        return df.assign(**{"CM RL": [], "CM AP": [], "CM IS": []})
+
+    ijk=coord_sums/np.asarray(sizes, dtype=float)[:, None]
+    ras=nib.affines.apply_affine(affine, ijk)
+    df["CM RL"]=np.round(-ras[:, 0], 1)
+    df["CM AP"]=np.round(-ras[:, 1], 1)
+    df["CM IS"]=np.round(ras[:, 2], 1)
+    return df
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,283 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 15:21:09 2026
+@author: Leela Srinivasan
+
+Score detected PVS against clinician drawn manpvs.nii masks for every validated subject.
+Per subject: voxel Dice, cluster-level sensitivity and PPV, and nearest-centroid match distances (KD-tree).
+Subjects are scored in parallel from their sparse voxel lists (see sparse_maps.py) and written to one cohort table.
+
+Syntax:       pvs validate [--pvs-root DIR] [--max-dist MM] [--workers N] [--out CSV]
+Dependencies: NumPy, SciPy, pandas, NiBabel
+"""
+
+import os
+import sys
+import argparse
+import numpy as np
+import pandas as pd
+from scipy import ndimage
+from scipy.spatial import cKDTree
+from concurrent.futures import ProcessPoolExecutor
+from . import manifest, sparse_maps
+
+
+HEMIS=["left", "right"]
+
+
+def main(argv=None):
+
+    args=parse_args(sys.argv[1:] if argv is None else argv)
+    subjects=find_validated_subjects(args.pvs_root)
+    print("Scoring {} subjects with clinician masks.".format(len(subjects)))
+
+    df=score_cohort(args.pvs_root, subjects, max_dist=args.max_dist, workers=args.workers)
+    out=args.out or os.path.join(args.pvs_root, "summary", "validation_metrics.csv")
+    df.to_csv(out, index=False)
+    print("Saving cohort validation table to {}.".format(out))
+
+
+def parse_args(argv):
+    """
+
+    Parameters
+    ----------
+    argv : list
+        command line arguments.
+
+    Returns
+    -------
+    args : argparse.Namespace
+        parsed arguments.
+
+    """
+
+    parser=argparse.ArgumentParser(description="Cohort-wide validation against clinician manpvs.nii masks.")
+    parser.add_argument("--pvs-root", default=manifest.PVS_ROOT, help="PVS project root")
+    parser.add_argument("--max-dist", type=float, default=3.0, help="centroid match distance in mm")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="number of worker processes")
+    parser.add_argument("--out", default=None, help="output CSV (default summary/validation_metrics.csv)")
+    return parser.parse_args(argv)
+
+
+def find_validated_subjects(pvs_root):
+    """
+
+    Parameters
+    ----------
+    pvs_root : str
+        PVS project root.
+
+    Returns
+    -------
+    list
+        subjects with a clinician manpvs.nii in t1/clusters.
+
+    """
+
+    return sorted(s for s in os.listdir(pvs_root)
+                  if os.path.exists(os.path.join(pvs_root, s, "t1", "clusters", "manpvs.nii")))
+
+
+def score_cohort(pvs_root, subjects, max_dist=3.0, workers=1):
+    """
+
+    Parameters
+    ----------
+    pvs_root : str
+        PVS project root.
+    subjects : list
+        subjects to score.
+    max_dist : float
+        centroid match distance in mm.
+    workers : int
+        number of worker processes.
+
+    Returns
+    -------
+    df : df
+        one row per subject.
+
+    """
+
+    jobs=[(os.path.join(pvs_root, s, "t1", "clusters"), max_dist) for s in subjects]
+    with ProcessPoolExecutor(max_workers=max(1, workers)) as pool:
+        rows=list(pool.map(score_job, jobs))
+
+    df=pd.DataFrame(rows)
+    df.insert(0, "pnum", subjects)
+    return df
+
+
+def score_job(job):
+    """
+
+    Parameters
+    ----------
+    job : tuple
+        (clust_dir, max_dist).
+
+    Returns
+    -------
+    dict
+        metrics for one subject, or an error entry so one bad subject doesn't sink the cohort.
+
+    """
+
+    clust_dir, max_dist=job
+    try:
+        return score_subject(clust_dir, max_dist)
+    except Exception as e:
+        return {"error": str(e)}
+
+
+def score_subject(clust_dir, max_dist=3.0):
+    """
+
+    Parameters
+    ----------
+    clust_dir : str
+        path to subject cluster dir containing pvs_within_*.nii and manpvs.nii.
+    max_dist : float
+        centroid match distance in mm.
+
+    Returns
+    -------
+    dict
+        voxel and cluster-level metrics.
+
+    """
+
+    detected=load_detected(clust_dir)
+    manual=sparse_maps.load_or_build(os.path.join(clust_dir, "manpvs.nii"))
+    manual=label_components(manual)
+
+    n_overlap=sparse_maps.overlap_count(detected, manual)
+    n_det_vox=len(detected.index)
+    n_man_vox=len(manual.index)
+    dice=2*n_overlap/(n_det_vox+n_man_vox) if (n_det_vox+n_man_vox)>0 else np.nan
+
+
+    #A cluster pair matches if it shares a voxel or its centroids are within max_dist mm
+    det_ids, det_cm=centroids(detected)
+    man_ids, man_cm=centroids(manual)
+    pairs, _=sparse_maps.label_overlap(detected, manual)
+    man_hit=np.isin(man_ids, pairs[:, 1])
+    det_hit=np.isin(det_ids, pairs[:, 0])
+
+    man_dist=np.full(len(man_ids), np.inf)
+    if len(det_ids) and len(man_ids):
+        man_dist, _=cKDTree(det_cm).query(man_cm, k=1)
+        det_dist, _=cKDTree(man_cm).query(det_cm, k=1)
+        man_hit|=man_dist<=max_dist
+        det_hit|=det_dist<=max_dist
+
+    matched=man_dist[man_hit & np.isfinite(man_dist)]
+    return {"Detected Voxels": n_det_vox,
+            "Manual Voxels": n_man_vox,
+            "Overlap Voxels": n_overlap,
+            "Dice": dice,
+            "Detected Clusters": len(det_ids),
+            "Manual Clusters": len(man_ids),
+            "Sensitivity": man_hit.mean() if len(man_ids) else np.nan,
+            "PPV": det_hit.mean() if len(det_ids) else np.nan,
+            "Mean Match Distance": matched.mean() if len(matched) else np.nan,
+            "Median Match Distance": np.median(matched) if len(matched) else np.nan}
+
+
+def load_detected(clust_dir):
+    """
+
+    Parameters
+    ----------
+    clust_dir : str
+        path to subject cluster dir.
+
+    Returns
+    -------
+    SparseMap
+        left and right cluster maps combined, right labels offset past the left ones so ids stay unique.
+
+    """
+
+    maps=[]
+    for hemi in HEMIS:
+        f=os.path.join(clust_dir, "pvs_within_{}_cerebral_white_matter.nii".format(hemi))
+        if os.path.exists(f) or os.path.exists(sparse_maps.sparse_path(f)):
+            maps.append(sparse_maps.load_or_build(f))
+    if len(maps)==0:
+        raise Exception("No cluster maps found in {}.".format(clust_dir))
+
+    sparse_maps.check_grid(*maps)
+    index=[]
+    label=[]
+    offset=0
+    for m in maps:
+        index.append(m.index)
+        label.append(m.label.astype(np.int64)+offset)
+        offset+=int(m.label.max()) if len(m.label) else 0
+    index=np.concatenate(index)
+    label=np.concatenate(label)
+    order=np.argsort(index, kind="stable")
+    return sparse_maps.SparseMap(maps[0].shape, maps[0].affine, index[order], label[order])
+
+
+def label_components(sp, nn=1):
+    """
+    Clinician masks are binary; split them into clusters by labeling only their bounding box.
+
+    Parameters
+    ----------
+    sp : SparseMap
+        binary sparse mask.
+    nn : int
+        AFNI neighbourhood for connectivity.
+
+    Returns
+    -------
+    SparseMap
+        same voxels, labelled by connected component.
+
+    """
+
+    if len(sp.index)==0:
+        return sp
+    ijk=np.stack(np.unravel_index(sp.index, sp.shape, order="F"), axis=1)
+    lo=ijk.min(axis=0)
+    crop=np.zeros(tuple(ijk.max(axis=0)-lo+1), dtype=bool)
+    local=tuple((ijk-lo).T)
+    crop[local]=True
+    lab, _=ndimage.label(crop, structure=ndimage.generate_binary_structure(3, nn))
+    return sparse_maps.SparseMap(sp.shape, sp.affine, sp.index, lab[local].astype(np.int64))
+
+
+def centroids(sp):
+    """
+
+    Parameters
+    ----------
+    sp : SparseMap
+        labelled sparse map.
+
+    Returns
+    -------
+    ids : array
+        labels present.
+    cm : array
+        (n, 3) centres of mass in scanner mm.
+
+    """
+
+    if len(sp.index)==0:
+        return np.zeros(0, dtype=np.int64), np.zeros((0, 3))
+    ids, inverse, counts=np.unique(sp.label, return_inverse=True, return_counts=True)
+    ijk=np.stack(np.unravel_index(sp.index, sp.shape, order="F"), axis=1).astype(float)
+    sums=np.stack([np.bincount(inverse, weights=ijk[:, i], minlength=len(ids)) for i in range(3)], axis=1)
+    vox=sums/counts[:, None]
+    cm=vox@np.asarray(sp.affine)[:3, :3].T+np.asarray(sp.affine)[:3, 3]
+    return ids.astype(np.int64), cm
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,367 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 09:12:05 2026
+@author: Leela Srinivasan
+
+Alternative PVS detection mode: multi-scale Hessian (Frangi) tubularity filter restricted to an eroded WM mask.
+The volume is cropped to the mask bounding box and filtered in z-slabs with a halo wide enough for the largest
+Gaussian kernel, so each worker only holds one slab in memory. Output is a binary candidate map on the mask grid
+that feeds 3dClusterize and afnitxt_to_csv.py exactly like gm_within_*.nii.
+
+Dependencies: NumPy, SciPy, NiBabel
+"""
+
+import os
+import sys
+import argparse
+import numpy as np
+import nibabel as nib
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from scipy.ndimage import gaussian_filter
+from .tiling import DEFAULT_MAX_MEM_MB, plan_slab_depth, slab_bounds, read_slab, open_nifti_writer, write_slab, \
+    mask_bbox, load_image
+
+
+#Gaussian kernels are truncated at this many standard deviations; sets the halo width
+TRUNCATE=3.0
+
+#Approximate bytes held per slab voxel while filtering (input, six Hessian components, scratch, output)
+BYTES_PER_VOXEL=64
+
+
+def main(argv=None):
+
+    args=parse_args(sys.argv[1:] if argv is None else argv)
+    sigmas_mm=[float(x) for x in args.sigmas.split(",")]
+
+    nvox=detect_vessels(args.t1, args.mask, args.out, sigmas_mm,
+                        threshold=args.threshold,
+                        black_ridges=not args.bright,
+                        workers=args.workers,
+                        max_mem_mb=args.max_mem,
+                        vesselness_out=args.vesselness_out)
+    print("Vesselness candidate voxels for {}: {}.".format(args.mask, nvox))
+
+
+def parse_args(argv):
+    """
+
+    Parameters
+    ----------
+    argv : list
+        command line arguments.
+
+    Returns
+    -------
+    args : argparse.Namespace
+        parsed arguments.
+
+    """
+
+    parser=argparse.ArgumentParser(description="Frangi vesselness PVS candidates within an eroded WM mask.")
+    parser.add_argument("t1", help="path to (unifized) t1 nifti")
+    parser.add_argument("mask", help="path to eroded WM mask on the same grid")
+    parser.add_argument("out", help="path to output binary candidate nifti")
+    parser.add_argument("--sigmas", default="0.5,0.75,1.0", help="comma separated filter scales in mm")
+    parser.add_argument("--threshold", type=float, default=0.15, help="vesselness cutoff in [0, 1]")
+    parser.add_argument("--bright", action="store_true", help="detect bright tubes (T2) instead of dark (T1)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="number of worker processes")
+    parser.add_argument("--max-mem", type=int, default=DEFAULT_MAX_MEM_MB, help="memory cap across all workers in MB")
+    parser.add_argument("--vesselness-out", default=None, help="optional path for the float vesselness map")
+    return parser.parse_args(argv)
+
+
+def detect_vessels(t1, mask, out, sigmas_mm, threshold=0.15, black_ridges=True, workers=1,
+                   max_mem_mb=DEFAULT_MAX_MEM_MB, vesselness_out=None):
+    """
+
+    Parameters
+    ----------
+    t1 : str
+        path to t1 nifti.
+    mask : str
+        path to eroded WM mask nifti on the t1 grid.
+    out : str
+        path to output uint8 candidate map.
+    sigmas_mm : list
+        Gaussian scales in mm.
+    threshold : float
+        vesselness cutoff for the candidate map.
+    black_ridges : bool
+        True to detect dark tubes (PVS on T1), False for bright tubes (PVS on T2).
+    workers : int
+        number of worker processes.
+    max_mem_mb : int
+        memory cap across all workers in MB.
+    vesselness_out : str
+        optional path for the float32 vesselness map.
+
+    Raises
+    ------
+    Exception
+        t1 and mask are not on the same grid.
+
+    Returns
+    -------
+    nvox : int
+        number of candidate voxels.
+
+    """
+
+    img=nib.load(t1)
+    mask_img=load_image(mask)
+    shape=img.shape[:3]
+    if shape!=mask_img.shape[:3]:
+        raise Exception("t1 {} and mask {} are on different grids. Exiting...".format(img.shape, mask_img.shape))
+
+
+    #Convert scales to voxel units so sub-millimetre inputs filter the same anatomy
+    zooms=np.array(img.header.get_zooms()[:3], dtype=float)
+    sigmas_vox=[tuple(s/zooms) for s in sigmas_mm]
+    halo=int(np.ceil(TRUNCATE*max(max(s) for s in sigmas_vox)))+1
+    bbox=mask_bbox(mask, halo)
+    if bbox is None:
+        bbox=[(0, 0), (0, 0), (0, 0)]
+
+
+    #Normalize intensities once so the structureness constant means the same thing in every slab
+    scale=intensity_scale(t1, mask)
+    (x0, x1), (y0, y1), (z0, z1)=bbox
+    depth=plan_slab_depth((max(1, x1-x0), max(1, y1-y0)), BYTES_PER_VOXEL, max_mem_mb, halo=halo, workers=workers)
+    jobs=[(t1, mask, (x0, x1), (y0, y1), core, padded, sigmas_vox, scale, black_ridges, threshold,
+           vesselness_out is not None)
+          for core, padded in slab_bounds(z0, z1, depth, halo, shape[2])]
+
+
+    #Slabs come back in z order, so both maps are streamed straight to disk
+    writers=[(open_nifti_writer(out, shape, img.affine, np.uint8), np.uint8, 1)]
+    if vesselness_out:
+        writers.append((open_nifti_writer(vesselness_out, shape, img.affine, np.float32), np.float32, 2))
+    nvox=0
+    try:
+        write_empty(writers, shape, 0, z0)
+        for (c0, c1), cores in run_slabs(jobs, workers):
+            nvox+=int(cores[0].sum())
+            for f, dtype, i in writers:
+                full=np.zeros((shape[0], shape[1], c1-c0), dtype=dtype)
+                full[x0:x1, y0:y1]=cores[i-1]
+                write_slab(f, full, dtype)
+        write_empty(writers, shape, z1, shape[2])
+    finally:
+        for f, _, _ in writers:
+            f.close()
+    return nvox
+
+
+def run_slabs(jobs, workers):
+    """
+
+    Parameters
+    ----------
+    jobs : list
+        process_slab arguments, in z order.
+    workers : int
+        number of worker processes.
+
+    Yields
+    ------
+    tuple
+        process_slab results, in z order. At most two slabs per worker are in flight, which bounds the
+        results buffered while waiting on a slow slab.
+
+    """
+
+    workers=max(1, workers)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending=deque()
+        for job in jobs:
+            pending.append(pool.submit(process_slab, job))
+            if len(pending)>=2*workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def write_empty(writers, shape, z0, z1):
+    """
+
+    Parameters
+    ----------
+    writers : list
+        (fileobj, dtype, index) output writers.
+    shape : tuple
+        volume shape.
+    z0 : int
+        first empty slice.
+    z1 : int
+        one past the last empty slice.
+
+    Returns
+    -------
+    None. Writes zero slices outside the mask bounding box.
+
+    """
+
+    for z in range(z0, z1):
+        for f, dtype, _ in writers:
+            write_slab(f, np.zeros(shape[:2]+(1,), dtype=dtype), dtype)
+
+
+def intensity_scale(t1, mask, stride=4):
+    """
+
+    Parameters
+    ----------
+    t1 : str
+        path to t1 nifti.
+    mask : str
+        path to mask nifti.
+    stride : int
+        only every stride-th z-slice is sampled.
+
+    Returns
+    -------
+    float
+        99th percentile of t1 intensity within the mask, used to bring slabs to a common [0, 1] range.
+
+    """
+
+    img=nib.load(t1)
+    mask_img=load_image(mask)
+    samples=[]
+    for z in range(0, img.shape[2], stride):
+        m=np.asarray(mask_img.dataobj[..., z])>0
+        if m.any():
+            samples.append(np.asarray(img.dataobj[..., z], dtype=np.float32)[m])
+
+    if len(samples)==0:
+        return 1.0
+    scale=float(np.percentile(np.concatenate(samples), 99))
+    return scale if scale>0 else 1.0
+
+
+def process_slab(job):
+    """
+
+    Parameters
+    ----------
+    job : tuple
+        (t1, mask, x bounds, y bounds, core, padded, sigmas_vox, scale, black_ridges, threshold, keep_vesselness).
+
+    Returns
+    -------
+    core : tuple
+        (start, stop) slices of the result.
+    cores : tuple
+        uint8 candidate map for the core slices, followed by the float32 vesselness if requested.
+
+    """
+
+    t1, mask, (x0, x1), (y0, y1), (c0, c1), (p0, p1), sigmas_vox, scale, black_ridges, threshold, keep_vesselness=job
+    block=read_slab(nib.load(t1), p0, p1, (x0, x1), (y0, y1)).astype(np.float32)/scale
+    m=read_slab(load_image(mask), p0, p1, (x0, x1), (y0, y1))>0
+
+
+    #Only the core is written back; halo slices exist so the filters see real neighbours
+    ves=frangi(block, m, sigmas_vox, black_ridges=black_ridges)
+    ves=ves[:, :, c0-p0:c1-p0]
+    if keep_vesselness:
+        return (c0, c1), ((ves>threshold).astype(np.uint8), ves)
+    return (c0, c1), ((ves>threshold).astype(np.uint8),)
+
+
+def frangi(block, mask, sigmas_vox, alpha=0.5, beta=0.5, c=0.1, black_ridges=True):
+    """
+
+    Parameters
+    ----------
+    block : array
+        float32 intensities, roughly scaled to [0, 1].
+    mask : array
+        boolean mask; vesselness is only evaluated inside it.
+    sigmas_vox : list
+        per-axis Gaussian scales in voxels.
+    alpha : float
+        plate vs line sensitivity.
+    beta : float
+        blob vs line sensitivity.
+    c : float
+        structureness (second-order contrast) sensitivity.
+    black_ridges : bool
+        True for dark tubes on a bright background.
+
+    Returns
+    -------
+    out : array
+        float32 vesselness in [0, 1], maximum over scales, zero outside the mask.
+
+    """
+
+    out=np.zeros(block.shape, dtype=np.float32)
+    idx=np.nonzero(mask)
+    if len(idx[0])==0:
+        return out
+
+
+    for sigma in sigmas_vox:
+        ev=hessian_eigenvalues(block, sigma, idx)
+        l1, l2, l3=np.abs(ev[:, 0]), np.abs(ev[:, 1]), np.abs(ev[:, 2])
+
+
+        #Ra separates lines from plates, Rb lines from blobs, S suppresses background noise
+        ra=np.divide(l2, l3, out=np.zeros_like(l2), where=l3>0)
+        rb=np.divide(l1, np.sqrt(l2*l3), out=np.zeros_like(l1), where=(l2*l3)>0)
+        s=np.sqrt(l1**2+l2**2+l3**2)
+        v=(1-np.exp(-ra**2/(2*alpha**2)))*np.exp(-rb**2/(2*beta**2))*(1-np.exp(-s**2/(2*c**2)))
+
+
+        #Dark tubes curve upward across their cross-section (positive eigenvalues), bright tubes downward
+        if black_ridges:
+            v[(ev[:, 1]<0) | (ev[:, 2]<0)]=0
+        else:
+            v[(ev[:, 1]>0) | (ev[:, 2]>0)]=0
+        out[idx]=np.maximum(out[idx], v)
+
+    return out
+
+
+def hessian_eigenvalues(block, sigma, idx):
+    """
+
+    Parameters
+    ----------
+    block : array
+        float32 intensities.
+    sigma : tuple
+        per-axis Gaussian scale in voxels.
+    idx : tuple
+        np.nonzero indices at which to evaluate.
+
+    Returns
+    -------
+    ev : array
+        (n, 3) scale-normalized Hessian eigenvalues, sorted by increasing magnitude.
+
+    """
+
+    #Scale normalization by sigma^2 keeps responses comparable across scales
+    norm=float(np.mean(sigma))**2
+    hess=np.empty((len(idx[0]), 3, 3), dtype=np.float32)
+    for i in range(3):
+        for j in range(i, 3):
+            order=[0, 0, 0]
+            order[i]+=1
+            order[j]+=1
+            d=gaussian_filter(block, sigma, order=order, truncate=TRUNCATE)[idx]*norm
+            hess[:, i, j]=d
+            hess[:, j, i]=d
+
+    ev=np.linalg.eigvalsh(hess)
+    order=np.argsort(np.abs(ev), axis=1)
+    return np.take_along_axis(ev, order, axis=1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,369 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Thu Oct 29 11:18:40 2026
+@author: Leela Srinivasan
+
+Watch mode: enqueue subjects for find_PVS.sh as soon as their inputs exist.
+The FreeSurfer derivatives dir and the BIDS anat dirs are watched with inotify (Linux, through libc), with a
+polling rescan every --interval seconds as the fallback; network shares don't deliver inotify events for remote
+writes, so the rescan always runs. A subject is ready once its SurfVol and axialized T2w exist and haven't
+changed for --settle seconds, and is done once its completion marker (<subj>/complete, written only when every
+stage succeeded) exists. Ready subjects, patients and HVs alike, run through find_PVS.sh up to --jobs at a time.
+After each successful subject the incremental stats updates run (pvs density SUBJ, then pvs stats). Subjects that
+fail are not retried until the daemon is restarted; a failed run leaves no marker, so a restart retries it.
+
+--test DIR runs against DIR/derivatives/freesurfer-6.0.0, DIR/sub-*/ses-*/anat and DIR/Projects/PVS, and
+replaces find_PVS.sh with writing the subject's completion marker and the stats updates with a log line.
+
+Syntax:       pvs watch [-m seg] [-c 3dseg] [-u 3dunifize] [-t] [--jobs 1] [--interval 60] [--settle 120] [--once]
+              pvs watch --test DIR [--once]
+Dependencies: None (inotify is used where available)
+"""
+
+import os
+import sys
+import time
+import ctypes
+import ctypes.util
+import select
+import argparse
+import platform
+import subprocess
+from collections import deque
+from .stage_runner import pvs_cmd
+from . import manifest
+
+
+#inotify events that can make a subject ready: new entries, finished writes, renames into place
+IN_CLOSE_WRITE=0x008
+IN_MOVED_TO=0x080
+IN_CREATE=0x100
+WATCH_MASK=IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+
+#Stats updates run after each successful subject
+AFTER=[["density", "{subj}"], ["stats"]]
+
+#Poll interval while subjects are running, so completions are picked up promptly
+RUNNING_POLL=10
+
+
+def main(argv=None):
+
+    args=parse_args(sys.argv[1:] if argv is None else argv)
+    if args.test:
+        args.fs_root=os.path.join(args.test, "derivatives", "freesurfer-6.0.0")
+        args.bids_root=args.test
+        args.pvs_root=os.path.join(args.test, "Projects", "PVS")
+        args.settle=0
+    watch(args)
+
+
+def parse_args(argv):
+    """
+
+    Parameters
+    ----------
+    argv : list
+        command line arguments.
+
+    Returns
+    -------
+    args : argparse.Namespace
+        parsed arguments.
+
+    """
+
+    parser=argparse.ArgumentParser(description="Watch for reconstructed subjects and run find_PVS on them.")
+    parser.add_argument("--fs-root", default=manifest.FS_ROOT,
+                        help="FreeSurfer derivatives root")
+    parser.add_argument("--bids-root", default=manifest.BIDS_ROOT, help="BIDS root")
+    parser.add_argument("--pvs-root", default=manifest.PVS_ROOT, help="PVS project root")
+    parser.add_argument("-m", "--mode", default="seg", choices=["seg", "vessel", "ratio"])
+    parser.add_argument("-c", "--classifier", default="3dseg", choices=["3dseg", "gmm"])
+    parser.add_argument("-u", "--unifize", default="3dunifize", choices=["3dunifize", "poly"])
+    parser.add_argument("-t", "--tiled", action="store_true")
+    parser.add_argument("--jobs", type=int, default=1, help="subjects run at once")
+    parser.add_argument("--interval", type=float, default=60, help="seconds between rescans")
+    parser.add_argument("--settle", type=float, default=120, help="seconds inputs must be unchanged")
+    parser.add_argument("--log-dir", default=None, help="per-subject logs (default <pvs-root>/summary/watch_logs)")
+    parser.add_argument("--once", action="store_true", help="scan once, run what is ready and exit")
+    parser.add_argument("--test", default=None, help="local test tree; find_PVS and stats are not run")
+    return parser.parse_args(argv)
+
+
+class Inotify:
+    """
+    Minimal inotify wrapper through libc; raises OSError where inotify isn't available.
+    """
+
+    def __init__(self):
+        if platform.system()!="Linux":
+            raise OSError("inotify is Linux only")
+        self.libc=ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self.fd=self.libc.inotify_init1(os.O_NONBLOCK)
+        if self.fd<0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self.watched=set()
+
+    def add(self, path):
+        """
+
+        Parameters
+        ----------
+        path : str
+            directory to watch; ignored if already watched or missing.
+
+        Returns
+        -------
+        None.
+
+        """
+
+        if path in self.watched or not os.path.isdir(path):
+            return
+        if self.libc.inotify_add_watch(self.fd, os.fsencode(path), WATCH_MASK)>=0:
+            self.watched.add(path)
+
+    def wait(self, timeout):
+        """
+
+        Parameters
+        ----------
+        timeout : float
+            seconds to wait for an event.
+
+        Returns
+        -------
+        bool
+            True if any event arrived (all pending events are drained).
+
+        """
+
+        ready, _, _=select.select([self.fd], [], [], timeout)
+        if not ready:
+            return False
+        try:
+            while os.read(self.fd, 65536):
+                pass
+        except BlockingIOError:
+            pass
+        return True
+
+    def close(self):
+        os.close(self.fd)
+
+
+def subject_paths(subj, ses, args):
+    """
+
+    Parameters
+    ----------
+    subj : str
+        p-number or hv code.
+    ses : str
+        preferred session of the recon-all dir (see manifest.fs_sessions).
+    args : argparse.Namespace
+        watch options (roots).
+
+    Returns
+    -------
+    dict
+        manifest.subject_paths under the watched roots.
+
+    """
+
+    return manifest.subject_paths(subj, ses, fs_root=args.fs_root, bids_root=args.bids_root, pvs_root=args.pvs_root)
+
+
+def subject_state(paths, settle, now=None):
+    """
+
+    Parameters
+    ----------
+    paths : dict
+        subject_paths of the subject.
+    settle : float
+        seconds inputs must be unchanged.
+    now : float
+        current time (default time.time()).
+
+    Returns
+    -------
+    str
+        done (completion marker exists), ready (SurfVol and axialized T2w present and settled) or waiting.
+
+    """
+
+    if os.path.exists(paths["complete"]):
+        return "done"
+    now=time.time() if now is None else now
+    for f in [paths["surfvol_src"], paths["t2"]]:
+        if not os.path.exists(f) or now-os.path.getmtime(f)<settle:
+            return "waiting"
+    return "ready"
+
+
+def watch_dirs(paths):
+    """
+
+    Parameters
+    ----------
+    paths : dict
+        subject_paths of the subject.
+
+    Returns
+    -------
+    list
+        directories whose changes can make the subject ready (missing ones are skipped by Inotify.add).
+
+    """
+
+    anat=os.path.dirname(paths["t2"])
+    ses_dir=os.path.dirname(anat)
+    return [paths["fs_dir"], os.path.dirname(paths["surfvol_src"]), os.path.dirname(ses_dir), ses_dir, anat]
+
+
+def subject_command(paths, args):
+    """
+
+    Parameters
+    ----------
+    paths : dict
+        subject_paths of the subject.
+    args : argparse.Namespace
+        watch options.
+
+    Returns
+    -------
+    list
+        argv processing the subject: find_PVS.sh (patients and HVs alike), or in test mode writing the
+        completion marker.
+
+    """
+
+    if args.test:
+        return ["sh", "-c", 'mkdir -p "$1" && date > "$2"', "sh", paths["pvs_dir"], paths["complete"]]
+    scripts_dir=os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+    cmd=["bash", os.path.join(scripts_dir, "find_PVS.sh"), "-m", args.mode, "-c", args.classifier, "-u", args.unifize]
+    if args.tiled:
+        cmd.append("-t")
+    return cmd+[paths["subj"]]
+
+
+def after_subject(subj, args, log):
+    """
+    Incremental stats updates after a successful subject.
+
+    Parameters
+    ----------
+    subj : str
+        p-number or hv code.
+    args : argparse.Namespace
+        watch options.
+    log : fileobj
+        subject log.
+
+    Returns
+    -------
+    None. Failures are logged; the daemon keeps running.
+
+    """
+
+    for step in AFTER:
+        step=[s.format(subj=subj) for s in step]
+        if args.test:
+            print("++ [test] pvs {} ++".format(" ".join(step)))
+            continue
+        code=subprocess.run(pvs_cmd(*step), stdout=log, stderr=subprocess.STDOUT).returncode
+        if code!=0:
+            print("++ pvs {} failed after {} (exit {}). ++".format(" ".join(step), subj, code))
+
+
+def watch(args):
+    """
+
+    Parameters
+    ----------
+    args : argparse.Namespace
+        watch options.
+
+    Returns
+    -------
+    None. Runs until interrupted (or, with --once, until everything ready at the first scan has finished).
+
+    """
+
+    log_dir=args.log_dir or os.path.join(args.pvs_root, "summary", "watch_logs")
+    os.makedirs(log_dir, exist_ok=True)
+    try:
+        notify=Inotify()
+        notify.add(args.fs_root)
+        notify.add(args.bids_root)
+    except OSError:
+        notify=None
+        print("++ inotify unavailable; polling every {} s. ++".format(args.interval))
+
+    queue=deque()
+    running={}
+    seen=set()
+    scanned=False
+    try:
+        while True:
+
+
+            #Rescan for newly ready subjects (--once only scans once)
+            if not (args.once and scanned):
+                for subj, sessions in sorted(manifest.fs_sessions(args.fs_root).items()):
+                    if subj in seen:
+                        continue
+                    paths=subject_paths(subj, sessions[0], args)
+                    state=subject_state(paths, args.settle)
+                    if state=="ready":
+                        queue.append(paths)
+                        seen.add(subj)
+                        print("++ Enqueued {} ++".format(subj))
+                    elif state=="done":
+                        seen.add(subj)
+                    elif notify:
+                        for d in watch_dirs(paths):
+                            notify.add(d)
+                scanned=True
+
+
+            #Collect finished subjects and update stats
+            for subj, (proc, log, start) in list(running.items()):
+                if proc.poll() is None:
+                    continue
+                del running[subj]
+                if proc.returncode==0:
+                    print("++ Finished {} in {:.0f} s ++".format(subj, time.time()-start))
+                    after_subject(subj, args, log)
+                else:
+                    print("++ {} failed (exit {}); see {}. ++".format(subj, proc.returncode, log.name))
+                log.close()
+
+
+            #Start queued subjects up to --jobs
+            while queue and len(running)<max(1, args.jobs):
+                paths=queue.popleft()
+                subj=paths["subj"]
+                log=open(os.path.join(log_dir, "{}.log".format(subj)), "a")
+                running[subj]=(subprocess.Popen(subject_command(paths, args), stdout=log, stderr=subprocess.STDOUT,
+                                                stdin=subprocess.DEVNULL), log, time.time())
+                print("++ Started {} ++".format(subj))
+
+            if args.once and not queue and not running:
+                break
+            timeout=min(args.interval, RUNNING_POLL) if running else args.interval
+            if notify:
+                notify.wait(timeout)
+            else:
+                time.sleep(timeout)
+    finally:
+        if notify:
+            notify.close()
+
+
+if __name__ == "__main__":
+    main()